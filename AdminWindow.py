@@ -1,4 +1,3 @@
-import gc
 import platform
 
 from PyQt5 import QtWidgets as qtw
@@ -6,8 +5,8 @@ from PyQt5 import QtCore as qtc
 from PyQt5 import QtGui as qtg
 
 from gui.Ui_AdminWindow import Ui_AdminWindow
-from DatabaseManager import DatabaseManager
-from GoogleSheetManager import GoogleSheetManager
+from DatabaseWorker import DatabaseWorker
+from UploadWorker import UploadWorker
 
 
 class AdminWindow(qtw.QWidget, Ui_AdminWindow):
@@ -18,7 +17,7 @@ class AdminWindow(qtw.QWidget, Ui_AdminWindow):
     window_closed = qtc.pyqtSignal(str)
 
     # def __init__(self, parent: qtw.QWidget, db_filename: str, barcode: str):
-    def __init__(self, parent: qtw.QWidget, db_manager: DatabaseManager):
+    def __init__(self, parent: qtw.QWidget, db_worker: DatabaseWorker, upload_worker: UploadWorker):
         super().__init__(parent)
         self.setupUi(self)
 
@@ -27,8 +26,20 @@ class AdminWindow(qtw.QWidget, Ui_AdminWindow):
         self.setWindowFlag(qtc.Qt.Dialog)                # dialog box without min or max buttons
         self.setWindowFlag(qtc.Qt.FramelessWindowHint)   # borderless window that cannot be resized
 
-        self.__db_manager = db_manager
-        self.__gsm = GoogleSheetManager(self.__db_manager)
+        self.__db_worker = db_worker
+
+        # The upload runs on its own thread, so this window and the Main window keep working during the upload.
+        # The status of the upload is shown below the buttons.
+        self.__upload_worker = upload_worker
+        self.__upload_worker.progress.connect(self.upload_progress)
+        self.__upload_worker.upload_finished.connect(self.upload_finished)
+
+        self.__upload_status = qtw.QLabel(self)
+        font = qtg.QFont()
+        font.setPointSize(18)
+        self.__upload_status.setFont(font)
+        self.__upload_status.setAlignment(qtc.Qt.AlignCenter)
+        self.AdminVerticalLayout.insertWidget(self.AdminVerticalLayout.count() - 1, self.__upload_status)
 
         self.__checked_in_list = []
         self.__checked_in_model = qtc.QStringListModel(self.__checked_in_list)
@@ -70,7 +81,12 @@ class AdminWindow(qtw.QWidget, Ui_AdminWindow):
         else:
             self.set_button_state(self.checkOutAllButton, 'Check Out ALL students that are currently Checked In', True)
 
-        self.set_button_state(self.uploadDataButton, 'Upload Data to Google Sheets', True)
+        if self.__upload_worker.isRunning():
+            self.uploadDataButton.setText('Cancel Upload')
+            self.set_button_state(self.uploadDataButton, 'Stop the upload after the current stage', True)
+        else:
+            self.uploadDataButton.setText('Upload Data')
+            self.set_button_state(self.uploadDataButton, 'Upload Data to Google Sheets', True)
 
     def show_window(self, checked_in_list: list):
         self.__checked_in_list = checked_in_list
@@ -96,24 +112,76 @@ class AdminWindow(qtw.QWidget, Ui_AdminWindow):
             self.__clean_up()
 
         elif button_name == 'Upload Data':
-            success, title, message = self.__gsm.upload_data()
-            if success:
-                text = 'The data was uploaded successfully to the Google Sheet.'
-                self.__display('Upload Success', text)
-            else:
-                self.__display(title, message)
+            # The same button starts the upload and cancels it.
+            if self.__upload_worker.isRunning():
+                self.__upload_worker.cancel()
+                self.__upload_status.setText('Cancelling the upload...')
+                self.set_button_state(self.uploadDataButton, 'The upload is being cancelled', False)
 
-            self.set_button_state(self.uploadDataButton, 'Data already uploaded', False)
+            elif self.__upload_worker.start_upload('admin'):
+                self.__upload_status.setText('Starting the upload...')
+                self.uploadDataButton.setText('Cancel Upload')
+                self.set_button_state(self.uploadDataButton, 'Stop the upload after the current stage', True)
 
         elif button_name == 'Check Out ALL':
-            # "data" is a list of tuples: [('id', 'firstname', 'lastname'), ... ]
-            # NOTE: this is not the same format as self.__checked_in_list
-            success, message, data = self.__db_manager.get_checked_in_list()
-            for tup in data:
-                self.__db_manager.checkout_student(tup[0])
-
+            # Check out every student at the current time, all at once.
+            # The check out is queued on the database thread, after any check in or check out still waiting,
+            # so this window keeps working. The list is only cleared once the check out has succeeded.
+            self.set_button_state(self.checkOutAllButton, 'Checking Out ALL students', False)
+            if not self.__db_worker.submit('checkout_all', ('now', ), self.__checkout_all_finished):
+                self.set_button_state(self.checkOutAllButton, 'Check Out ALL students that are currently Checked In', True)
+                self.__display('Check Out ALL', 'Database busy. Try Again.')
+
+    def __checkout_all_finished(self, result: tuple) -> None:
+        # "result" is a 4-tuple: (success, message, number of students checked out, seconds taken)
+        # If the request raised an exception on the database thread, "result" is only (False, error message).
+        if result[0]:
             self.__checked_in_model.setStringList([])
             self.set_button_state(self.checkOutAllButton, 'No students currently Checked In', False)
+        else:
+            self.set_button_state(self.checkOutAllButton, 'Check Out ALL students that are currently Checked In', True)
+            if self.isVisible():
+                self.__display('Check Out ALL Failed', result[1])
+
+    @qtc.pyqtSlot(str, int, int)
+    def upload_progress(self, stage: str, stage_number: int, stages: int) -> None:
+        """
+        This slot is called when the upload starts a new stage.
+
+        :param stage: the description of the stage
+        :param stage_number: the number of the stage, starting at 1
+        :param stages: the number of stages
+        :return: None
+        """
+
+        if self.__upload_status.text() != 'Cancelling the upload...':
+            self.__upload_status.setText(f'{stage}... ({stage_number} of {stages})')
+
+    @qtc.pyqtSlot(bool, str, str)
+    def upload_finished(self, success: bool, title: str, message: str) -> None:
+        """
+        This slot is called when the upload has finished, was cancelled, or failed.
+
+        :param success: was the upload successful?
+        :param title: the title of the message
+        :param message: explanation of success or failure
+        :return: None
+        """
+
+        self.__upload_status.setText(message)
+        self.uploadDataButton.setText('Upload Data')
+
+        if success:
+            self.set_button_state(self.uploadDataButton, 'Data already uploaded', False)
+        else:
+            self.set_button_state(self.uploadDataButton, 'Upload Data to Google Sheets', True)
+
+        # Only interrupt the Admin if they are waiting for the upload.
+        if self.isVisible():
+            if success:
+                self.__display('Upload Success', message)
+            else:
+                self.__display(title, message)
 
     def set_button_state(self, button: qtw.QPushButton, tool_tip: str, is_enabled: bool) -> None:
         """
@@ -138,10 +206,8 @@ class AdminWindow(qtw.QWidget, Ui_AdminWindow):
             button.setFont(font)
 
     def __clean_up(self):
-        gc.enable()
         self.__checked_in_list.clear()
         self.__checked_in_model.setStringList([])
-        gc.collect()
 
     def __display(self, title: str, text: str, informative_text: str = '', detailed_text: str = '',
                   buttons: qtw.QMessageBox.StandardButton = qtw.QMessageBox.Ok) -> int:
@@ -1,66 +1,168 @@
-import gc
 import sqlite3
 import os
+import re
+import time
+import bisect
+import logging
+import threading
 import bcrypt
 
 from sqlite3 import Error
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+# These settings are applied once to every new database connection.
+# Any of them can be changed in the "database config" section of the config.json file.
+DEFAULT_DATABASE_CONFIG = {
+    'foreign keys': True,
+    'journal mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache size': -8000,        # negative values are in KiB, so this is about 8 MB
+    'mmap size': 67108864,      # 64 MB
+    'temp store': 'MEMORY'
+}
+
+# The format of the checkin and checkout times: YYYY-MM-DD HH:MM:SS
+DATE_TIME_PATTERN = re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}')
+
+# The database schema version is stored in PRAGMA user_version.
+# Increase this number whenever a new step is added to the upgrade_steps in DatabaseManager.__upgrade_database().
+SCHEMA_VERSION = 8
+
 
 class DatabaseManager:
     """This class manages all database operations."""
 
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, database_config: dict = None):
+        database_config = database_config or {}
+
         self.__filename = filename
+        self.__connection_pragmas = self.__get_connection_pragmas(database_config)
+
+        # The logout policy is used by logout_all(), which runs at 1 AM and with the --logout option.
+        # See checkout_all() for the allowed values.
+        self.__logout_policy = str(database_config.get('logout policy', 'zero'))
+        self.__logout_cap_hours = database_config.get('logout cap hours', 0.0)
         self.__db_tables = ('student', 'activity', 'admin')
         self.__db_indexes = ('activity_id', )
         self.__db_triggers = ('insert_activity', 'update_activity',
                               'insert_student', 'update_student',
                               'insert_admin', 'update_admin', 'delete_admin')
 
+        # Opening a connection for every query is slow, so each thread keeps one long-lived connection
+        # that is opened on first use and reused after that. Every connection is also kept in a list
+        # so that close() can close all of them, including those opened by other threads.
+        self.__thread_data = threading.local()
+        self.__connections = []
+        self.__connections_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """This method closes all the database connections. A new connection is opened on the next query."""
+
+        with self.__connections_lock:
+            connections = self.__connections
+            self.__connections = []
+
+        for db_conn in connections:
+            try:
+                db_conn.close()
+            except Error:
+                pass
+
+    def close_thread_connection(self) -> None:
+        """
+        This method closes the database connection of the thread that calls it.
+        A thread that is about to end, such as the upload thread, calls this so its connection is not left open.
+        """
+
+        db_conn = getattr(self.__thread_data, 'db_conn', None)
+        if db_conn:
+            self.__drop_connection(db_conn)
+
     def logout_all(self) -> tuple:
-        """This method will logout all active accounts with 0 hours."""
+        """
+        This method will logout all active accounts using the "logout policy" from the database config
+        (by default, with 0 hours).
 
-        success = False
-        message = ''
-        count = 0
-        data = list()
+        :return: (1) was this successful? (2) explanation of success or failure
+        """
 
-        # Get a list
-        db_conn, cursor = self.__create_connection()
-        if not db_conn or not cursor:
-            return False, 'Database connection error or cursor error'
+        success, message, count, seconds = self.checkout_all()
 
-        sql = '''SELECT id, checkin, checkout
-                    FROM activity
-                    WHERE checkout IS NULL'''
+        return success, message
 
-        success, message = self.__sql_execute(cursor, sql)
-        if success:
-            # data is a list of tuples: [('id', 'checkin', 'checkout'), .... ]
-            #   where 'checkout' should be None
-            success, message, data = self.__sql_fetchall(cursor)
+    def checkout_all(self, policy: str = '', cap_hours: float = None) -> tuple:
+        """
+        This method checks out every student that is still checked in, with one sql statement in one transaction.
+
+        :param policy: how the checkout time is set for each open session (default is the "logout policy")
+            'zero' - the checkout time is the same as the checkin time, so the session counts 0 hours
+            'cap'  - the checkout time is cap_hours after the checkin time, but not later than the current time
+            'now'  - the checkout time is the current time
+        :param cap_hours: the most hours a session can count when the policy is 'cap'
+            (default is the "logout cap hours")
+        :return: a 4-tuple: (success, message, number of students checked out, seconds taken)
+        """
 
-        if success and len(data) > 0:
-            for tpl in data:
-                # success, message = self.checkout_student(tpl[0], tpl[1])
-                sql = '''UPDATE activity SET checkout=?
-                                WHERE id=? AND checkout IS NULL'''
-                parameters = (tpl[1], tpl[0])
-                success, message = self.__sql_execute(cursor, sql, parameters)
+        start_time = time.perf_counter()
 
-                if success:
-                    count = count + 1
+        policy = (policy or self.__logout_policy).lower()
+        if cap_hours is None:
+            cap_hours = self.__logout_cap_hours
+
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        if policy == 'zero':
+            sql = 'UPDATE activity SET checkout=checkin WHERE checkout IS NULL'
+            parameters = None
+        elif policy == 'cap':
+            try:
+                cap_seconds = int(float(cap_hours) * 3600)
+            except (TypeError, ValueError):
+                return False, 'Invalid logout cap hours: ' + str(cap_hours), 0, 0.0
 
-            message = 'Logged out ' + str(count) + ' / ' + str(len(data)) + ' accounts'
-            if count < len(data):
-                message = 'FAIL: ' + message
+            # The MAX() keeps the checkout time from being earlier than the checkin time.
+            sql = '''UPDATE activity SET checkout=MAX(checkin, MIN(?, DATETIME(checkin, ?)))
+                    WHERE checkout IS NULL'''
+            parameters = (current_time, f'+{cap_seconds} seconds')
+        elif policy == 'now':
+            sql = 'UPDATE activity SET checkout=MAX(checkin, ?) WHERE checkout IS NULL'
+            parameters = (current_time, )
+        else:
+            return False, 'Invalid logout policy: ' + policy, 0, 0.0
+
+        db_conn, cursor = self.__create_connection()
+        if not db_conn or not cursor:
+            return False, 'Database connection error or cursor error', 0, 0.0
+
+        count = 0
+        success, message = self.__sql_execute(cursor, 'BEGIN IMMEDIATE')
+        if success:
+            success, message = self.__sql_execute(cursor, sql, parameters)
+            if success:
+                count = cursor.rowcount
+                success, message = self.__sql_execute(cursor, 'COMMIT')
             else:
-                message = 'SUCCESS: ' + message
+                self.__sql_execute(cursor, 'ROLLBACK')
 
-        self.__delete_connection(cursor, db_conn)
+        self.__release_connection(cursor, db_conn)
 
-        return success, message
+        seconds = time.perf_counter() - start_time
+
+        if success:
+            message = f'SUCCESS: Logged out {count} accounts in {1000 * seconds:.1f} ms'
+        else:
+            count = 0
+            message = 'FAIL: ' + message
+
+        return success, message, count, seconds
 
     def checkin_student(self, barcode: str, checkin: str = 'NOW') -> tuple:
         """
@@ -94,7 +196,7 @@ class DatabaseManager:
         else:
             message = 'NOT Checked In.'
 
-        self.__delete_connection(cursor, db_conn)
+        self.__release_connection(cursor, db_conn)
 
         return success, message
 
@@ -125,7 +227,7 @@ class DatabaseManager:
             success, message, total_hours = self.__total_hours(cursor, barcode)
             message = f'NOT Checked out. Total hours: {total_hours:.2f}'
 
-        self.__delete_connection(cursor, db_conn)
+        self.__release_connection(cursor, db_conn)
 
         return success, message
 
@@ -162,10 +264,353 @@ class DatabaseManager:
         parameters = record
 
         success, message = self.__sql_execute(cursor, sql, parameters)
-        self.__delete_connection(cursor, db_conn)
+        self.__release_connection(cursor, db_conn)
 
         return success, message
 
+    def import_records(self, table: str, records, progress_callback=None, chunk_size: int = 500,
+                       historical: bool = False) -> tuple:
+        """
+        This method adds many new records into a table, such as the records read from a csv file.
+        The records are read in chunks and each chunk is inserted with one executemany(), all in a single
+        transaction. If a chunk fails, then that chunk is inserted one record at a time, so only the records
+        that fail are skipped and each of them is added to the list of errors.
+
+        :param table: the name of the table in the database
+        :param records: an iterable of records (tuples or lists), each without a rowid, e.g. a csv.reader
+        :param progress_callback: a function that is called after each chunk with the number of records read so far
+        :param chunk_size: the number of records inserted by each executemany()
+        :param historical: for activity records, check all the records at once and skip the per-record triggers,
+            which is much faster for a large import of past sessions (see __import_activity_history())
+        :return: a 5-tuple: (success, message, number of records imported, list of errors, seconds taken)
+            where each error is a 3-tuple: (row number, record, explanation of failure)
+        """
+
+        start_time = time.perf_counter()
+        table = table.lower()
+
+        if not (table in self.__db_tables):
+            return False, 'Invalid table', 0, [], 0.0
+
+        if historical and table == 'activity':
+            return self.__import_activity_history(records, progress_callback, chunk_size)
+
+        sql = ''
+        if table == 'student':
+            sql = 'INSERT INTO student (id, firstname, lastname) VALUES (?, ?, ?)'
+        elif table == 'activity':
+            sql = 'INSERT INTO activity (id, checkin, checkout) VALUES (?, ?, ?)'
+        elif table == 'admin':
+            sql = 'INSERT INTO admin (id, firstname, lastname, pin) VALUES (?, ?, ?, ?)'
+
+        chunk_size = max(1, int(chunk_size))
+
+        db_conn, cursor = self.__create_connection()
+        if not db_conn or not cursor:
+            return False, 'Database connection error or cursor error', 0, [], 0.0
+
+        success, message = self.__sql_execute(cursor, 'BEGIN IMMEDIATE')
+        if not success:
+            self.__release_connection(cursor, db_conn)
+            return False, 'FAIL: ' + message, 0, [], time.perf_counter() - start_time
+
+        imported = 0
+        errors = []
+        chunk = []
+        row_number = 0
+
+        for row_number, record in enumerate(records, start=1):
+            valid, error, record = self.__validate_record(table, record)
+            if valid:
+                chunk.append((row_number, record))
+            elif error:
+                errors.append((row_number, record, error))
+
+            if len(chunk) >= chunk_size:
+                success, message, count = self.__import_chunk(cursor, sql, chunk, errors)
+                if not success:
+                    break
+                imported += count
+                chunk = []
+
+                if progress_callback:
+                    progress_callback(row_number)
+
+        if success and chunk:
+            success, message, count = self.__import_chunk(cursor, sql, chunk, errors)
+            imported += count
+
+        if success:
+            success, message = self.__sql_execute(cursor, 'COMMIT')
+        else:
+            self.__sql_execute(cursor, 'ROLLBACK')
+
+        self.__release_connection(cursor, db_conn)
+
+        if progress_callback:
+            progress_callback(row_number)
+
+        errors.sort(key=lambda error: error[0])
+
+        seconds = time.perf_counter() - start_time
+
+        if success:
+            message = (f'SUCCESS: Imported {imported} {table} records in {1000 * seconds:.1f} ms'
+                       f' ({len(errors)} records skipped)')
+        else:
+            imported = 0
+            message = 'FAIL: ' + message
+
+        return success, message, imported, errors, seconds
+
+    def __import_chunk(self, cursor: sqlite3.Cursor, sql: str, chunk: list, errors: list) -> tuple:
+        """
+        This *private* method inserts a chunk of records for import_records().
+        The chunk is inserted with one executemany() inside a savepoint. If any record fails, the savepoint
+        is rolled back and the records are inserted one at a time, and the records that fail are added to errors.
+
+        :param cursor: the cursor object used to execute sql statements
+        :param sql: the INSERT statement
+        :param chunk: a list of (row number, record)
+        :param errors: the list of (row number, record, explanation of failure) to add to
+        :return: (1) was this successful? (2) explanation of failure (3) number of records inserted
+        """
+
+        success, message = self.__sql_execute(cursor, 'SAVEPOINT import_chunk')
+        if not success:
+            return success, message, 0
+
+        success, message = self.__sql_executemany(cursor, sql, [record for _, record in chunk])
+        if success:
+            success, message = self.__sql_execute(cursor, 'RELEASE import_chunk')
+            return success, message, len(chunk) if success else 0
+
+        # Only constraint and trigger errors are caused by the records. Any other error stops the import.
+        if getattr(self.__thread_data, 'reconnect', False):
+            return False, message, 0
+
+        success, message = self.__sql_execute(cursor, 'ROLLBACK TO import_chunk')
+        if not success:
+            return success, message, 0
+
+        count = 0
+        for row_number, record in chunk:
+            success, message = self.__sql_execute(cursor, sql, record)
+            if success:
+                count += 1
+            elif getattr(self.__thread_data, 'reconnect', False):
+                return False, message, 0
+            else:
+                errors.append((row_number, record, message))
+
+        success, message = self.__sql_execute(cursor, 'RELEASE import_chunk')
+        return success, message, count if success else 0
+
+    def __import_activity_history(self, records, progress_callback=None, chunk_size: int = 500) -> tuple:
+        """
+        This *private* method is the fast way for import_records() to add a large number of activity records.
+        Instead of letting the triggers check each record as it is inserted, all the records are checked at once:
+        they are sorted by student and checkin time, and a record is skipped if its student does not exist or
+        if its session overlaps another session for the same student (a session that is still checked in
+        lasts forever). The insert triggers for the activity table are dropped while the records are inserted,
+        then they are created again, the totals are rebuilt, and the activity table is checked before the
+        transaction is committed.
+
+        :param records: an iterable of activity records (tuples or lists), each without a rowid
+        :param progress_callback: a function that is called after each chunk with the number of records inserted
+        :param chunk_size: the number of records inserted by each executemany()
+        :return: a 5-tuple: (success, message, number of records imported, list of errors, seconds taken)
+            where each error is a 3-tuple: (row number, record, explanation of failure)
+        """
+
+        start_time = time.perf_counter()
+        chunk_size = max(1, int(chunk_size))
+        open_checkout = '9999-12-31 23:59:59'
+
+        errors = []
+        new_records = []
+        for row_number, record in enumerate(records, start=1):
+            valid, error, record = self.__validate_record('activity', record)
+            if valid:
+                new_records.append((record[0], record[1], record[2] or open_checkout, row_number))
+            elif error:
+                errors.append((row_number, record, error))
+
+        db_conn, cursor = self.__create_connection()
+        if not db_conn or not cursor:
+            return False, 'Database connection error or cursor error', 0, [], 0.0
+
+        success, message = self.__sql_execute(cursor, 'BEGIN IMMEDIATE')
+        if not success:
+            self.__release_connection(cursor, db_conn)
+            return False, 'FAIL: ' + message, 0, [], time.perf_counter() - start_time
+
+        # Read the students and their existing sessions in the same transaction that inserts the records.
+        success, message = self.__sql_execute(cursor, 'SELECT id FROM student')
+        if success:
+            success, message, data = self.__sql_fetchall(cursor)
+            student_ids = {row[0] for row in data}
+
+        if success:
+            sql = '''SELECT id, checkin, COALESCE(checkout, ?) FROM activity ORDER BY id, checkin'''
+            success, message = self.__sql_execute(cursor, sql, (open_checkout, ))
+        if success:
+            success, message, data = self.__sql_fetchall(cursor)
+
+        # Merge the existing sessions of each student into a sorted list of separate (start, end) intervals.
+        existing = {}
+        if success:
+            for barcode, checkin, checkout in data:
+                intervals = existing.setdefault(barcode, ([], []))
+                if intervals[0] and checkin < intervals[1][-1]:
+                    intervals[1][-1] = max(intervals[1][-1], checkout)
+                else:
+                    intervals[0].append(checkin)
+                    intervals[1].append(checkout)
+
+        # Sort and sweep: the checkin and checkout strings sort in time order, so a session overlaps if it starts
+        #   before the previous session for the same student ends, or if it overlaps an existing session.
+        accepted = []
+        if success:
+            previous_barcode = None
+            previous_checkout = ''
+            for barcode, checkin, checkout, row_number in sorted(new_records):
+                record = (barcode, checkin, None if checkout == open_checkout else checkout)
+
+                if barcode not in student_ids:
+                    errors.append((row_number, record, 'The barcode is not in the Student Table.'))
+                    continue
+
+                if barcode == previous_barcode and checkin < previous_checkout:
+                    errors.append((row_number, record, 'The session overlaps another imported session.'))
+                    continue
+
+                starts, ends = existing.get(barcode, ((), ()))
+                i = bisect.bisect_right(starts, checkin) - 1
+                if (i >= 0 and checkin < ends[i]) or (i + 1 < len(starts) and starts[i + 1] < checkout):
+                    errors.append((row_number, record, 'The session overlaps an existing session.'))
+                    continue
+
+                accepted.append(record)
+                previous_barcode = barcode
+                previous_checkout = checkout
+
+        # The records have already been checked, so the per-record triggers are not needed during the insert.
+        #   Dropping a trigger is part of the transaction, so a ROLLBACK also puts the triggers back.
+        if success:
+            for name in ('insert_activity', 'insert_activity_totals', 'insert_activity_rollups'):
+                success, message = self.__sql_execute(cursor, f'DROP TRIGGER IF EXISTS {name}')
+                if not success:
+                    break
+
+        imported = 0
+        if success:
+            sql = 'INSERT INTO activity (id, checkin, checkout) VALUES (?, ?, ?)'
+            for i in range(0, len(accepted), chunk_size):
+                success, message = self.__sql_executemany(cursor, sql, accepted[i:i + chunk_size])
+                if not success:
+                    break
+                imported += len(accepted[i:i + chunk_size])
+
+                if progress_callback:
+                    progress_callback(imported)
+
+        if success:
+            for sql in (self.__create_insert_activity_trigger(),
+                        self.__create_insert_activity_totals_trigger(),
+                        self.__create_insert_activity_rollups_trigger()):
+                success, message = self.__sql_execute(cursor, sql)
+                if not success:
+                    break
+
+        if success:
+            success, message = self.__rebuild_totals(cursor)
+
+        # Check the activity table before the import is committed.
+        if success:
+            success, message = self.__sql_execute(cursor, 'PRAGMA foreign_key_check(activity)')
+            if success:
+                success, message, data = self.__sql_fetchall(cursor)
+                if success and data:
+                    success, message = False, 'The activity table has records for students that do not exist.'
+
+        if success:
+            sql = '''SELECT id FROM activity WHERE checkout IS NULL GROUP BY id HAVING COUNT(*) >1'''
+            success, message = self.__sql_execute(cursor, sql)
+            if success:
+                success, message, data = self.__sql_fetchall(cursor)
+                if success and data:
+                    success, message = False, 'A student would be checked in more than once.'
+
+        if success:
+            success, message = self.__sql_execute(cursor, 'COMMIT')
+        else:
+            self.__sql_execute(cursor, 'ROLLBACK')
+
+        self.__release_connection(cursor, db_conn)
+
+        errors.sort(key=lambda error: error[0])
+        seconds = time.perf_counter() - start_time
+
+        if success:
+            message = (f'SUCCESS: Imported {imported} activity records in {1000 * seconds:.1f} ms'
+                       f' ({len(errors)} records skipped)')
+        else:
+            imported = 0
+            message = 'FAIL: ' + message
+
+        return success, message, imported, errors, seconds
+
+    def __validate_record(self, table: str, record) -> tuple:
+        """
+        This *private* method checks a record before it is imported and puts it in the form used by the table.
+        Blank rows are skipped without an error. Admin pins are encrypted.
+
+        :param table: the name of the table in the database
+        :param record: a tuple or list containing the record, but without a rowid
+        :return: (1) is the record valid? (2) explanation of failure (3) the record as a tuple
+        """
+
+        record = tuple(str(field).strip() if field is not None else '' for field in record)
+
+        if not any(record):
+            return False, '', record
+
+        if table == 'student':
+            if len(record) != 3 or not all(record):
+                return False, 'A student record must be: barcode,first_name,last_name', record
+
+        elif table == 'activity':
+            # The checkout time is optional, which means the student is still checked in.
+            if len(record) == 2:
+                record = record + ('', )
+            if len(record) != 3 or not record[0] or not record[1]:
+                return False, 'An activity record must be: barcode,checkin,checkout', record
+
+            # The pattern is checked first because fromisoformat() also accepts other formats.
+            #   It is much faster than strptime(), which matters when a whole season of records is imported.
+            try:
+                for field in record[1:]:
+                    if field and not (DATE_TIME_PATTERN.fullmatch(field) and datetime.fromisoformat(field)):
+                        raise ValueError
+            except ValueError:
+                return False, 'The checkin and checkout must use the format: YYYY-MM-DD HH:MM:SS', record
+
+            # Dates and times in this format sort in time order, so they can be compared as strings.
+            if record[2] and record[2] < record[1]:
+                return False, 'The checkout is earlier than the checkin.', record
+
+            record = (record[0], record[1], record[2] or None)
+
+        elif table == 'admin':
+            if len(record) != 4 or not all(record):
+                return False, 'An admin record must be: barcode,first_name,last_name,pin', record
+
+            # encrypt the pin, then replace the pin with the encrypted pin in the record
+            record = record[0:3] + (self.__encrypt_pin(record[3]), )
+
+        return True, '', record
+
     def check_barcode(self, barcode: str) -> tuple:
         """
         This method checks if a barcode is valid.
@@ -201,10 +646,88 @@ class DatabaseManager:
                 if len(data) > 0:
                     barcode_type = 'Admin'
 
-        self.__delete_connection(cursor, db_conn)
+        self.__release_connection(cursor, db_conn)
 
         return success, message, barcode_type
 
+    def get_scan_snapshot(self, barcode: str) -> tuple:
+        """
+        This method returns everything needed when a barcode is scanned, using one sql statement.
+        It replaces calling check_barcode(), get_student_data(), and get_student_hours_table() one after another.
+
+        :param barcode: the barcode scanned
+        :return: a 6-tuple: ( success, message, barcode_type, (firstname, lastname, status, checkin),
+                              hours_table, total_hours )
+            where barcode_type is 'Invalid', 'Student', 'Admin', or 'Error',
+            checkin is the start of the open session (or None if the student is checked out),
+            and hours_table is a list of 3-tuples: [ ('day of week', 'date', 'hours'), ... ]
+        """
+
+        success = False
+        message = ''
+        barcode_type = 'Invalid'
+        student_data = ('', '', '', None)
+        hours_table = list()
+        total_hours = 0.0
+        data = list()
+
+        db_conn, cursor = self.__create_connection()
+        if not db_conn or not cursor:
+            return False, 'Database connection error or cursor error', 'Error', student_data, hours_table, total_hours
+
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        # There is one row for each day the student has logged hours, or a single row if there are no hours.
+        # The hours for the open session (if there is one) are counted up to the current time.
+        sql = '''WITH person AS (
+                    SELECT 'Student' barcode_type, firstname, lastname FROM student WHERE id=?
+                    UNION ALL
+                    SELECT 'Admin' barcode_type, firstname, lastname FROM admin WHERE id=?
+                    LIMIT 1),
+                days AS (
+                    SELECT DATE(checkin) checkin_date,
+                    IFNULL(ROUND(SUM(checkout_epoch - checkin_epoch) / 3600.0, 2), 0.0)
+                    + IFNULL(ROUND(SUM(CASE WHEN checkout IS NULL
+                        THEN STRFTIME('%s', ?) - checkin_epoch END) / 3600.0, 2), 0.0) hours
+                    FROM activity WHERE id=?
+                    GROUP BY checkin_day)
+                SELECT person.barcode_type, person.firstname, person.lastname,
+                    (SELECT checkin FROM activity WHERE id=? AND checkout IS NULL) open_checkin,
+                    days.checkin_date, days.hours
+                FROM person LEFT JOIN days ON person.barcode_type='Student'
+                ORDER BY days.checkin_date DESC'''
+        parameters = (barcode, barcode, current_time, barcode, barcode)
+
+        success, message = self.__sql_execute(cursor, sql, parameters)
+        if success:
+            success, message, data = self.__sql_fetchall(cursor)
+
+        self.__release_connection(cursor, db_conn)
+
+        if not success:
+            return False, message, 'Error', student_data, hours_table, total_hours
+
+        if data:
+            barcode_type, first_name, last_name, checkin = data[0][0:4]
+            status = ''
+            if barcode_type == 'Student':
+                status = 'Checked In' if checkin else 'Checked Out'
+            student_data = (first_name, last_name, status, checkin)
+
+            # This will create the table of hours, which is a list of 3-tuples
+            # [ ('day of week', 'date', 'hours'), ... ]
+            days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+            for (_, _, _, _, date, hours) in data:
+                if date:
+                    # Convert the date string to a datetime object to determine the day of the week.
+                    day_of_week = days[datetime.strptime(date, '%Y-%m-%d').weekday()]
+                    hours_table.append((day_of_week, date, f'{hours:5.2f}'))
+
+            for item in hours_table:
+                total_hours += float(item[2])
+
+        return success, message, barcode_type, student_data, hours_table, total_hours
+
     def check_pin(self, barcode: str, pin: str) -> tuple:
         """
         This method checks if an admin pin is correct.
@@ -232,7 +755,7 @@ class DatabaseManager:
             if len(data) > 0 and self.__is_pin_correct(pin, data[0]):
                 valid = True
 
-        self.__delete_connection(cursor, db_conn)
+        self.__release_connection(cursor, db_conn)
 
         return success, message, valid
 
@@ -267,7 +790,7 @@ class DatabaseManager:
                 # Get the total hours worked.
                 success, message, total_hours = self.__total_hours(cursor, barcode)
 
-        self.__delete_connection(cursor, db_conn)
+        self.__release_connection(cursor, db_conn)
 
         return success, message, (first_name, last_name, status, total_hours)
 
@@ -333,7 +856,7 @@ class DatabaseManager:
         current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
         sql = '''SELECT DATE(checkin),
-                ROUND(SUM(JULIANDAY(?) - JULIANDAY(checkin)) * 24.0, 2)
+                ROUND(SUM(STRFTIME('%s', ?) - checkin_epoch) / 3600.0, 2)
                 FROM activity WHERE id=? AND checkout IS NULL'''
         parameters = (current_time, barcode)
         success, message = self.__sql_execute(cursor, sql, parameters)
@@ -343,9 +866,9 @@ class DatabaseManager:
                 checked_in_data = ()
 
         sql = '''SELECT DATE(checkin),
-                ROUND(SUM(JULIANDAY(checkout) - JULIANDAY(checkin)) * 24.0, 2)
+                ROUND(SUM(checkout_epoch - checkin_epoch) / 3600.0, 2)
                 FROM activity WHERE id=? AND checkout IS NOT NULL
-                GROUP BY DATE(checkin) ORDER BY DATE(checkin) DESC'''
+                GROUP BY checkin_day ORDER BY checkin_day DESC'''
         parameters = (barcode, )
 
         success, message = self.__sql_execute(cursor, sql, parameters)
@@ -374,7 +897,7 @@ class DatabaseManager:
             for item in hours_table:
                 total_hours += float(item[2])
 
-        self.__delete_connection(cursor, db_conn)
+        self.__release_connection(cursor, db_conn)
 
         return success, message, hours_table, total_hours
 
@@ -402,7 +925,7 @@ class DatabaseManager:
             # data is a list of tuples: [('id', 'firstname', 'lastname'), .... ]
             success, message, data = self.__sql_fetchall(cursor)
 
-        self.__delete_connection(cursor, db_conn)
+        self.__release_connection(cursor, db_conn)
 
         return success, message, data
 
@@ -412,31 +935,55 @@ class DatabaseManager:
         :return: list of 5-tuples [ (lastname, firstname, id, checkin, checkout, hours), ... ]
         """
 
-        success = False
-        message = ''
+        success, message, rows = self.get_all_activity_table_rows()
+        if not success:
+            return False, message, list()
+
+        try:
+            return True, '', list(rows)
+        except Error as e:
+            return False, str(e), list()
+
+    def get_all_activity_table_rows(self, batch_size: int = 1000) -> tuple:
+        """
+        This method returns the same records as get_all_activity_table_data(), but they are read from the database
+        a batch at a time while they are being used, so the whole activity table is never held in memory.
+        The records must be read on the thread that called this method. Close the generator if it is not read
+        to the end, so the cursor is released.
+
+        :param batch_size: the number of records read from the database at a time
+        :return: (1) was this successful? (2) explanation of failure
+            (3) generator of tuples (lastname, firstname, id, checkin, checkout, hours)
+        """
 
-        data = list()
         db_conn, cursor = self.__create_connection()
         if not db_conn or not cursor:
-            return False, 'Database connection error or cursor error', list()
+            return False, 'Database connection error or cursor error', iter(())
 
+        # The raw data worksheet is compared with the rows uploaded last time, and only the new rows are added,
+        #   so the rows must always come back in the same order, even if two sessions start at the same time.
         sql = '''SELECT student.lastname, student.firstname, student.id, activity.checkin, activity.checkout,
-                        ROUND((JULIANDAY(activity.checkout) - JULIANDAY(activity.checkin)) * 24.0, 2) hours
+                        ROUND((activity.checkout_epoch - activity.checkin_epoch) / 3600.0, 2) hours
                         FROM student JOIN activity ON student.id=activity.id
                         WHERE checkout IS NOT NULL
-                        ORDER BY activity.checkin ASC'''
+                        ORDER BY activity.checkin ASC, activity.id ASC, activity.rowid ASC'''
 
         success, message = self.__sql_execute(cursor, sql)
-        if success:
-            # data is a list of tuples: [ (lastname, firstname, id, checkin, checkout, hours), .... ]
-            success, message, data = self.__sql_fetchall(cursor)
+        if not success:
+            self.__release_connection(cursor, db_conn)
+            return False, message, iter(())
 
-        self.__delete_connection(cursor, db_conn)
+        return True, '', self.__sql_fetch_batches(cursor, db_conn, batch_size)
 
-        return success, message, data
+    def get_hours_report_data(self) -> tuple:
+        """
+        This method gets the students and the hours each student logged on each day, which the HoursReport adds up
+        by day, week, month, or season for the Google Sheet and any other report.
 
-    def get_google_sheet_data(self) -> tuple:
-        """This method uploads the student data to a Google Sheet."""
+        :return: (1) was this successful? (2) explanation of success or failure
+            (3) the students: [ (lastname, firstname, barcode), ... ]
+            (4) the daily hours: [ (barcode, day number, centihours), ... ]
+        """
 
         success = False
         message = ''
@@ -447,154 +994,363 @@ class DatabaseManager:
 
         success, message, student_names_and_barcode_list = self.__get_student_names_and_barcode_list(cursor)
         if not success:
+            self.__release_connection(cursor, db_conn)
             return False, 'Error with student names and barcode list', [], []
 
-        success, message, student_hours_list = self.__get_student_hours_list(cursor)
-        if not success:
-            return False, 'Error with student hours list', [], []
-
         success, message, daily_hours_list = self.__get_daily_hours_list(cursor)
         if not success:
+            self.__release_connection(cursor, db_conn)
             return False, 'Error with daily hours list', [], []
 
-        self.__delete_connection(cursor, db_conn)
+        self.__release_connection(cursor, db_conn)
 
-        return True, 'Successfully retrieved data', student_names_and_barcode_list, student_hours_list, daily_hours_list
+        return True, 'Successfully retrieved data', student_names_and_barcode_list, daily_hours_list
 
-    def __get_student_names_and_barcode_list(self, cursor: sqlite3.Cursor) -> tuple:
+    def get_upload_state(self, name: str) -> tuple:
         """
-        This *private* method is called by the upload_student_data_to_google_sheet() method to pass
-        the complete list of student names and barcodes to the GoogleSheetManager.
+        This method returns what was uploaded to one worksheet of the Google Sheet the last time,
+        so the next upload only needs to send what has changed.
 
-        :param cursor: the cursor object used to execute sql statements
-        :return: success, message, student_names_and_barcode_list
+        :param name: the name of the worksheet state, e.g. 'weekly', 'daily', or 'raw data'
+        :return: (1) was this successful? (2) explanation of failure (3) the saved state, or '' if there is none
         """
-        # "student_names_and_barcode_list" will be a list of tuples: [ (lastname, firstname, barcode), ... ]
-        sql = '''SELECT lastname, firstname, id FROM student 
-                ORDER BY lastname ASC, firstname ASC, id ASC'''
-        self.__sql_execute(cursor, sql)
-        success, message, student_names_and_barcode_list = self.__sql_fetchall(cursor)
-        if not success:
-            return success, message, None
-        return success, message, student_names_and_barcode_list
 
-    def __get_student_hours_list(self, cursor: sqlite3.Cursor) -> tuple:
-        """
-        This *private* method is called by the upload_student_data_to_google_sheet() method to pass
-        the complete list of student hours (grouped by barcode and week) to the GoogleSheetManager.
+        db_conn, cursor = self.__create_connection()
+        if not db_conn or not cursor:
+            return False, 'Database connection error or cursor error', ''
 
-        :param cursor: the cursor object used to execute sql statements
-        :return: success, message, student_hours_list
-        """
-        # https://www.sqlite.org/lang_datefunc.html
-        # %Y  year: 0000-9999
-        # %W  week of year: 00-53, the first Monday is the beginning of week 1.
-        # By default, STRFTIME('%W') uses Monday as the first day of the week, but we want Sunday to be first.
-        #   So the modifiers '-6 days' and 'weekday 0' will return the date of the Sunday at the start of the week.
-        #   The CASE is used because STRFTIME('%W') is correct if Jan 1 is Monday, otherwise it is off by 1.
-        sql = '''SELECT student.lastname, student.firstname, student.id, 
-                STRFTIME('%Y', activity.checkin, '-6 days', 'weekday 0') year,
-                CASE
-                    WHEN STRFTIME('%j', activity.checkin, '-6 days', 'weekday 0') % 7 == 0
-                        THEN STRFTIME('%W', activity.checkin, '-6 days', 'weekday 0') 
-                    ELSE STRFTIME('%W', activity.checkin, '-6 days', 'weekday 0') + 1
-                    END week,
-                SUM(ROUND( (JULIANDAY(activity.checkout) - JULIANDAY(activity.checkin)) * 24.0, 2)) hours
-                FROM student JOIN activity
-                ON student.id = activity.id
-                WHERE activity.checkout IS NOT NULL
-                GROUP BY student.id, year, week
-                ORDER BY student.lastname ASC, student.firstname ASC, year ASC, week ASC'''
-        self.__sql_execute(cursor, sql)
+        sql = 'SELECT value FROM upload_state WHERE name=?'
+        success, message = self.__sql_execute(cursor, sql, (name, ))
 
-        # "student_hours_list" is a list of tuples: [ (lastname, firstname, barcode, year, week number, week hours),...]
-        # Note: there is one tuple for each week that a student has logged hours,
-        #   so each student will have several tuples with each tuple indicating weekly hours.
-        success, message, student_hours_list = self.__sql_fetchall(cursor)
-        if not success:
-            return success, message, None
-        return success, message, student_hours_list
+        data = tuple()
+        if success:
+            success, message, data = self.__sql_fetchone(cursor)
 
-    def __get_daily_hours_list(self, cursor: sqlite3.Cursor) -> tuple:
-        """
-        This *private* method is called by the upload_student_data_to_google_sheet() method to pass
-        the complete list of student hours (grouped by barcode and date) to the GoogleSheetManager.
+        self.__release_connection(cursor, db_conn)
 
-        :param cursor: the cursor object used to execute sql statements
-        :return: success, message, daily_hours_list
+        return success, message, data[0] if data else ''
+
+    def set_upload_state(self, name: str, value: str) -> tuple:
         """
+        This method saves what was uploaded to one worksheet of the Google Sheet.
 
-        sql = '''SELECT student.lastname, student.firstname, student.id,
-                DATE(activity.checkin) checkin_date,
-                SUM(ROUND( (JULIANDAY(activity.checkout) - JULIANDAY(activity.checkin)) * 24.0, 2)) hours
-                FROM student JOIN activity
-                ON student.id = activity.id
-                WHERE activity.checkout IS NOT NULL
-                GROUP BY student.id, checkin_date
-                ORDER BY student.lastname ASC, student.firstname ASC, checkin_date ASC'''
-        self.__sql_execute(cursor, sql)
+        :param name: the name of the worksheet state, e.g. 'weekly', 'daily', or 'raw data'
+        :param value: the state to save, as a string
+        :return: (boolean, string)
+        """
 
-        # "daily_hours_list" is a list of tuples: [ (lastname, firstname, barcode, date, hours),...]
-        # Note: there is one tuple for each day that a student has logged hours,
-        #   so each student will have several tuples with each tuple indicating weekly hours.
+        db_conn, cursor = self.__create_connection()
+        if not db_conn or not cursor:
+            return False, 'Database connection error or cursor error'
+
+        sql = 'INSERT OR REPLACE INTO upload_state (name, value) VALUES (?, ?)'
+        success, message = self.__sql_execute(cursor, sql, (name, value))
+
+        self.__release_connection(cursor, db_conn)
+
+        return success, message
+
+    def clear_upload_state(self) -> tuple:
+        """
+        This method forgets what was uploaded, so the next upload rewrites every worksheet.
+
+        :return: (boolean, string)
+        """
+
+        db_conn, cursor = self.__create_connection()
+        if not db_conn or not cursor:
+            return False, 'Database connection error or cursor error'
+
+        success, message = self.__sql_execute(cursor, 'DELETE FROM upload_state')
+
+        self.__release_connection(cursor, db_conn)
+
+        return success, message
+
+    def add_upload_request(self, reason: str, full: bool = False) -> tuple:
+        """
+        This method adds an upload to the outbox. The upload is done by the UploadWorker, which keeps
+        trying until it reaches the Google Sheet.
+
+        :param reason: why the upload was requested, e.g. 'nightly' or 'admin'
+        :param full: should every worksheet be rewritten?
+        :return: (boolean, string)
+        """
+
+        db_conn, cursor = self.__create_connection()
+        if not db_conn or not cursor:
+            return False, 'Database connection error or cursor error'
+
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        sql = 'INSERT INTO upload_outbox (requested, reason, full) VALUES (?, ?, ?)'
+        success, message = self.__sql_execute(cursor, sql, (current_time, reason, int(full)))
+
+        self.__release_connection(cursor, db_conn)
+
+        return success, message
+
+    def get_upload_requests(self) -> tuple:
+        """
+        This method returns a summary of the uploads in the outbox. All of them are done by one upload.
+
+        :return: (1) was this successful? (2) explanation of failure (3) the last request id, or 0 if there are none
+            (4) the number of requests (5) does any request need a full upload? (6) the most attempts so far
+        """
+
+        db_conn, cursor = self.__create_connection()
+        if not db_conn or not cursor:
+            return False, 'Database connection error or cursor error', 0, 0, False, 0
+
+        sql = '''SELECT IFNULL(MAX(request_id), 0), COUNT(*), IFNULL(MAX(full), 0), IFNULL(MAX(attempts), 0)
+                FROM upload_outbox'''
+        success, message = self.__sql_execute(cursor, sql)
+
+        data = (0, 0, 0, 0)
+        if success:
+            success, message, data = self.__sql_fetchone(cursor)
+
+        self.__release_connection(cursor, db_conn)
+
+        if not (success and data):
+            return success, message, 0, 0, False, 0
+
+        return success, message, data[0], data[1], bool(data[2]), data[3]
+
+    def finish_upload_requests(self, last_request_id: int) -> tuple:
+        """
+        This method removes the uploads that were completed from the outbox.
+        Any upload requested after the upload started is kept.
+
+        :param last_request_id: the last request id that was included in the upload
+        :return: (boolean, string)
+        """
+
+        db_conn, cursor = self.__create_connection()
+        if not db_conn or not cursor:
+            return False, 'Database connection error or cursor error'
+
+        sql = 'DELETE FROM upload_outbox WHERE request_id<=?'
+        success, message = self.__sql_execute(cursor, sql, (last_request_id, ))
+
+        self.__release_connection(cursor, db_conn)
+
+        return success, message
+
+    def fail_upload_requests(self, last_request_id: int, error: str) -> tuple:
+        """
+        This method records a failed upload attempt for the uploads in the outbox, which are tried again later.
+
+        :param last_request_id: the last request id that was included in the upload
+        :param error: explanation of the failure
+        :return: (boolean, string)
+        """
+
+        db_conn, cursor = self.__create_connection()
+        if not db_conn or not cursor:
+            return False, 'Database connection error or cursor error'
+
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        sql = '''UPDATE upload_outbox SET attempts=attempts+1, last_attempt=?, last_error=?
+                WHERE request_id<=?'''
+        success, message = self.__sql_execute(cursor, sql, (current_time, error, last_request_id))
+
+        self.__release_connection(cursor, db_conn)
+
+        return success, message
+
+    def __get_student_names_and_barcode_list(self, cursor: sqlite3.Cursor) -> tuple:
+        """
+        This *private* method is called by the get_hours_report_data() method to pass
+        the complete list of student names and barcodes to the HoursReport.
+
+        :param cursor: the cursor object used to execute sql statements
+        :return: success, message, student_names_and_barcode_list
+        """
+        # "student_names_and_barcode_list" will be a list of tuples: [ (lastname, firstname, barcode), ... ]
+        sql = '''SELECT lastname, firstname, id FROM student 
+                ORDER BY lastname ASC, firstname ASC, id ASC'''
+        self.__sql_execute(cursor, sql)
+        success, message, student_names_and_barcode_list = self.__sql_fetchall(cursor)
+        if not success:
+            return success, message, None
+        return success, message, student_names_and_barcode_list
+
+    def __get_daily_hours_list(self, cursor: sqlite3.Cursor) -> tuple:
+        """
+        This *private* method is called by the get_hours_report_data() method to get the hours
+        of every student on every day with hours.
+
+        :param cursor: the cursor object used to execute sql statements
+        :return: success, message, daily_hours_list
+        """
+
+        # The daily_hours table already has the hours for each day, as whole hundredths of an hour (centihours).
+        #   The days are numbered from 1970-01-01, and the HoursReport adds them up into weeks and months.
+        sql = '''SELECT id, checkin_day, centihours FROM daily_hours'''
+        self.__sql_execute(cursor, sql)
+
+        # "daily_hours_list" is a list of tuples: [ (barcode, day number, centihours),...]
+        # Note: there is one tuple for each day that a student has logged hours.
         success, message, daily_hours_list = self.__sql_fetchall(cursor)
 
         if not success:
             return success, message, None
         return success, message, daily_hours_list
 
-    def __create_connection(self) -> tuple:
+    def __create_connection(self, upgrade: bool = True) -> tuple:
         """
-        This *private* method establishes a connection to the database and creates a cursor.
+        This *private* method gets this thread's database connection and creates a cursor.
+        The connection is opened the first time it is needed and is reopened if it is no longer usable.
 
+        :param upgrade: upgrade an older database when a new connection is opened
         :return: (database connection, database cursor)
         """
 
-        # Garbage collection slows down the process, so disable it temporarily.
-        # Garbage collection is enabled again in the __delete_connection() method.
-        gc.disable()
+        db_conn = getattr(self.__thread_data, 'db_conn', None)
 
-        db_conn = None
-        cursor = None
+        if db_conn and not getattr(self.__thread_data, 'reconnect', False):
+            try:
+                return db_conn, db_conn.cursor()
+            except Error:
+                # The connection was closed or is broken, so it is replaced below.
+                pass
+
+        if db_conn:
+            self.__drop_connection(db_conn)
 
         # Check if the database exists, do not create one if it does not exist.
-        if os.path.isfile(self.__filename):
+        if not os.path.isfile(self.__filename):
+            return None, None
 
-            try:
-                # Connect to the database, if the database exists.
-                # If the database does not exist, the database is created but with no tables, indexes, triggers, etc.
-                db_conn = sqlite3.connect(self.__filename, isolation_level=None)
-                try:
-                    cursor = db_conn.cursor()
-                except Error:
-                    cursor = None
-                    db_conn.close()  # close the database connection if the cursor creation failed
-            except Error:
-                db_conn = None
+        db_conn = self.__open_connection()
+        if not db_conn:
+            return None, None
+
+        try:
+            cursor = db_conn.cursor()
+        except Error:
+            self.__drop_connection(db_conn)
+            return None, None
+
+        # Bring an older database up to date the first time it is opened.
+        # The program cannot use a database that is only partly upgraded, so the connection is closed
+        #   and the upgrade is tried again the next time a connection is needed.
+        if upgrade:
+            success, message, results = self.__upgrade_database(cursor)
+            if not success:
+                logger.error('The database could not be upgraded: %s', message)
+                self.__drop_connection(db_conn)
+                return None, None
 
         return db_conn, cursor
 
-    def __delete_connection(self, cursor: sqlite3.Cursor, db_conn: sqlite3.Connection) -> None:
+    def __open_connection(self) -> sqlite3.Connection:
         """
-        This *private* method closes the database connection and cursor.
+        This *private* method opens a new database connection for this thread.
+        If the database does not exist, the database is created but with no tables, indexes, triggers, etc.
+
+        :return: the database connection, or None if the connection failed
+        """
+
+        try:
+            # The connection is only used by the thread that opened it, but check_same_thread is turned off
+            # so that close() can close the connections opened by other threads.
+            db_conn = sqlite3.connect(self.__filename, isolation_level=None, check_same_thread=False)
+        except Error:
+            return None
+
+        try:
+            # Apply the connection settings once, rather than before every sql statement.
+            for pragma in self.__connection_pragmas:
+                db_conn.execute(pragma)
+        except Error:
+            db_conn.close()
+            return None
+
+        self.__thread_data.db_conn = db_conn
+        self.__thread_data.reconnect = False
+        with self.__connections_lock:
+            self.__connections.append(db_conn)
+
+        return db_conn
+
+    def __get_connection_pragmas(self, database_config: dict) -> list:
+        """
+        This *private* method creates the PRAGMA statements that are run when a connection is opened.
+        Values missing from the database config, or values that are not valid, use the default value.
+
+        :param database_config: the "database config" dictionary from the config.json file
+        :return: a list of sql statements
+        """
+
+        config = dict(DEFAULT_DATABASE_CONFIG)
+        for key in config:
+            if key in database_config:
+                config[key] = database_config[key]
+
+        # PRAGMA statements cannot use parameters, so only known values are allowed.
+        if not isinstance(config['foreign keys'], bool):
+            config['foreign keys'] = DEFAULT_DATABASE_CONFIG['foreign keys']
+
+        if str(config['journal mode']).upper() not in ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'):
+            config['journal mode'] = DEFAULT_DATABASE_CONFIG['journal mode']
+
+        if str(config['synchronous']).upper() not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+            config['synchronous'] = DEFAULT_DATABASE_CONFIG['synchronous']
+
+        if str(config['temp store']).upper() not in ('DEFAULT', 'FILE', 'MEMORY'):
+            config['temp store'] = DEFAULT_DATABASE_CONFIG['temp store']
+
+        for key in ('cache size', 'mmap size'):
+            if not isinstance(config[key], int) or isinstance(config[key], bool):
+                config[key] = DEFAULT_DATABASE_CONFIG[key]
+
+        return [f'PRAGMA foreign_keys={"ON" if config["foreign keys"] else "OFF"}',
+                f'PRAGMA journal_mode={str(config["journal mode"]).upper()}',
+                f'PRAGMA synchronous={str(config["synchronous"]).upper()}',
+                f'PRAGMA cache_size={config["cache size"]}',
+                f'PRAGMA mmap_size={config["mmap size"]}',
+                f'PRAGMA temp_store={str(config["temp store"]).upper()}']
+
+    def __drop_connection(self, db_conn: sqlite3.Connection) -> None:
+        """
+        This *private* method closes a connection that is no longer usable and forgets about it.
 
-        :param cursor: the cursor object used to execute sql statements
         :param db_conn: the database connection
         :return: None
         """
 
-        gc.enable()
+        self.__thread_data.db_conn = None
+        self.__thread_data.reconnect = False
+        with self.__connections_lock:
+            if db_conn in self.__connections:
+                self.__connections.remove(db_conn)
+
+        try:
+            db_conn.close()
+        except Error:
+            pass
+
+    def __release_connection(self, cursor: sqlite3.Cursor, db_conn: sqlite3.Connection) -> None:
+        """
+        This *private* method closes the cursor. The database connection stays open to be used again.
+
+        :param cursor: the cursor object used to execute sql statements
+        :param db_conn: the database connection
+        :return: None
+        """
 
         try:
             cursor.close()
-            try:
-                db_conn.close()
-            except Error:
-                db_conn = None
         except Error:
-            cursor = None
+            pass
 
-        gc.collect()
+        try:
+            # Do not leave a failed transaction open on a connection that will be used again.
+            if db_conn.in_transaction:
+                db_conn.rollback()
+        except Error:
+            self.__thread_data.reconnect = True
 
     def __sql_execute(self, cursor: sqlite3.Cursor, sql: str, parameters: tuple = None) -> tuple:
         """
@@ -609,7 +1365,6 @@ class DatabaseManager:
         success = False
         message = ''
         try:
-            cursor.execute('PRAGMA foreign_keys=ON')
             if parameters:
                 cursor.execute(sql, parameters)
             else:
@@ -619,6 +1374,37 @@ class DatabaseManager:
             success = False
             message = str(e)
 
+            # Constraint and trigger errors are expected, but any other database error may mean that the
+            # connection is broken, so it is reopened on the next query.
+            if not isinstance(e, sqlite3.IntegrityError):
+                self.__thread_data.reconnect = True
+
+        return success, message
+
+    def __sql_executemany(self, cursor: sqlite3.Cursor, sql: str, seq_of_parameters: list) -> tuple:
+        """
+        This *private* method executes one sql statement for every set of parameters, like __sql_execute().
+        It is only used to insert many records at once.
+
+        :param cursor: the cursor object used to execute sql statements
+        :param sql: the sql statement to execute
+        :param seq_of_parameters: a list with the parameters for each execution of the sql statement
+        :return: (boolean, string)
+        """
+        success = False
+        message = ''
+        try:
+            cursor.executemany(sql, seq_of_parameters)
+            success = True
+        except Error as e:
+            success = False
+            message = str(e)
+
+            # Constraint and trigger errors are expected, but any other database error may mean that the
+            # connection is broken, so it is reopened on the next query.
+            if not isinstance(e, sqlite3.IntegrityError):
+                self.__thread_data.reconnect = True
+
         return success, message
 
     def __sql_fetchall(self, cursor: sqlite3.Cursor) -> tuple:
@@ -650,6 +1436,33 @@ class DatabaseManager:
 
         return success, message, data
 
+    def __sql_fetch_batches(self, cursor: sqlite3.Cursor, db_conn: sqlite3.Connection, batch_size: int):
+        """
+        This *private* generator fetches the records after the previously executed sql statement, a batch at a time.
+        The cursor is released when all the records have been read or the generator is closed.
+        A database error is raised to the code reading the records.
+
+        :param cursor: the cursor pointing to the database
+        :param db_conn: the database connection
+        :param batch_size: the number of records fetched at a time
+        :return: generator of tuples containing the data fetched from the database
+        """
+
+        try:
+            while True:
+                try:
+                    data = cursor.fetchmany(batch_size)
+                except Error:
+                    self.__thread_data.reconnect = True
+                    raise
+
+                if not data:
+                    return
+
+                yield from data
+        finally:
+            self.__release_connection(cursor, db_conn)
+
     def __sql_fetchone(self, cursor: sqlite3.Cursor) -> tuple:
         """
         This *private* method fetches one of the records from the database after the previously executed sql statement.
@@ -682,9 +1495,9 @@ class DatabaseManager:
     def __total_hours(self, cursor: sqlite3.Cursor, barcode: str) -> tuple:
         total_hours = 0.0
 
-        # Sum the total hours logged from previous checkins and checkouts.
-        sql = '''SELECT SUM(JULIANDAY(checkout) - JULIANDAY(checkin)) * 24.0
-                FROM activity WHERE id=? AND checkout IS NOT NULL'''
+        # Get the total hours logged from previous checkins and checkouts.
+        # The student_totals table is kept current by triggers, so this does not add up every session.
+        sql = '''SELECT total_seconds / 3600.0 FROM student_totals WHERE id=?'''
         parameters = (barcode, )
 
         success, message = self.__sql_execute(cursor, sql, parameters)
@@ -729,8 +1542,6 @@ class DatabaseManager:
         :return: Boolean indicating success, String explaining success/fail
         """
 
-        gc.disable()
-
         db_conn = None
         cursor = None
         total = len(self.__db_tables) + len(self.__db_indexes) + len(self.__db_triggers)
@@ -741,19 +1552,12 @@ class DatabaseManager:
 
         # The self.__create_connection() cannot be used here because that method does not allow
         # a blank database to be created.
-        # db_conn, cursor = self.__create_connection()
-
-        try:
-            # Connect to the database, if the database exists.
-            # If the database does not exist, the database is created but with no tables, indexes, triggers, etc.
-            db_conn = sqlite3.connect(self.__filename, isolation_level=None)
+        db_conn = self.__open_connection()
+        if db_conn:
             try:
                 cursor = db_conn.cursor()
             except Error:
-                cursor = None
-                db_conn.close()  # close the database connection if the cursor creation failed
-        except Error:
-            db_conn = None
+                self.__drop_connection(db_conn)  # close the database connection if the cursor creation failed
 
         if not db_conn or not cursor:
             return False, 'Database connection error or cursor error', 0, total
@@ -789,7 +1593,13 @@ class DatabaseManager:
         parameters = record
         success, message = self.__sql_execute(cursor, sql, parameters)
 
-        self.__delete_connection(cursor, db_conn)
+        # The new database starts at version 0, so apply every upgrade step to it.
+        success, message, _ = self.__upgrade_database(cursor)
+
+        self.__release_connection(cursor, db_conn)
+
+        if not success:
+            return False, message, counter, total
 
         total = len(self.__db_tables) + len(self.__db_indexes) + len(self.__db_triggers)
         if total == counter:
@@ -797,6 +1607,331 @@ class DatabaseManager:
         else:
             return False, 'Not all database objects created', counter, total
 
+    def upgrade_database(self) -> tuple:
+        """
+        This method brings an existing database up to the current schema version, without losing any data.
+        Databases are also upgraded automatically the first time a connection is opened.
+
+        :return: a 3-tuple: (success, message, [ (version, description, seconds), ... ])
+        """
+
+        db_conn, cursor = self.__create_connection(upgrade=False)
+        if not db_conn or not cursor:
+            return False, 'Database connection error or cursor error', []
+
+        success, message, results = self.__upgrade_database(cursor)
+
+        self.__release_connection(cursor, db_conn)
+
+        return success, message, results
+
+    def __upgrade_database(self, cursor: sqlite3.Cursor) -> tuple:
+        """
+        This *private* method applies the schema changes made after the database was created.
+        Each step is only applied if the PRAGMA user_version is lower than the step's version.
+        Every step runs in its own transaction, along with the new user_version, so a step is either
+        applied completely or not at all.
+
+        :param cursor: the cursor object used to execute sql statements
+        :return: a 3-tuple: (success, message, [ (version, description, seconds), ... ])
+        """
+
+        # Each step is a 3-tuple: (version, description, method that applies the step)
+        # The steps must be in order and the last version must be the SCHEMA_VERSION.
+        upgrade_steps = ((1, 'Add open session and covering indexes on activity', self.__upgrade_to_version_1),
+                         (2, 'Add integer epoch, day, and week columns to activity', self.__upgrade_to_version_2),
+                         (3, 'Add the student_totals summary table', self.__upgrade_to_version_3),
+                         (4, 'Add the daily_hours rollup table', self.__upgrade_to_version_4),
+                         (5, 'Replace the COUNT(*) trigger checks with EXISTS', self.__upgrade_to_version_5),
+                         (6, 'Add the upload_state table', self.__upgrade_to_version_6),
+                         (7, 'Add the upload_outbox table', self.__upgrade_to_version_7),
+                         (8, 'Drop the weekly_hours rollup table', self.__upgrade_to_version_8))
+
+        results = list()
+
+        success, message, version = self.__get_user_version(cursor)
+        if not success:
+            return success, message, results
+
+        if version >= SCHEMA_VERSION:
+            return True, 'The database is up to date.', results
+
+        # Foreign key enforcement cannot be changed inside a transaction, and it must be off while a table
+        # is rebuilt. The foreign keys are checked before each step is committed instead.
+        self.__sql_execute(cursor, 'PRAGMA foreign_keys')
+        _, _, data = self.__sql_fetchone(cursor)
+        foreign_keys = data[0] if data else 1
+        self.__sql_execute(cursor, 'PRAGMA foreign_keys=OFF')
+
+        for step_version, description, upgrade_step in upgrade_steps:
+            start_time = time.perf_counter()
+
+            # BEGIN IMMEDIATE takes the write lock, so two connections cannot apply the same step.
+            success, message = self.__sql_execute(cursor, 'BEGIN IMMEDIATE')
+            if not success:
+                break
+
+            success, message, version = self.__get_user_version(cursor)
+            if success and version < step_version:
+                success, message = upgrade_step(cursor)
+
+                if success:
+                    success, message = self.__sql_execute(cursor, f'PRAGMA user_version={step_version}')
+
+                if success:
+                    success, message = self.__sql_execute(cursor, 'PRAGMA foreign_key_check')
+                    if success:
+                        success, message, data = self.__sql_fetchall(cursor)
+                        if data:
+                            success = False
+                            message = 'Foreign key check failed after upgrading to version ' + str(step_version)
+
+            if success:
+                success, message = self.__sql_execute(cursor, 'COMMIT')
+
+            if not success:
+                self.__sql_execute(cursor, 'ROLLBACK')
+                message = 'Upgrade to version ' + str(step_version) + ' failed: ' + message
+                break
+
+            if version < step_version:
+                results.append((step_version, description, time.perf_counter() - start_time))
+
+        self.__sql_execute(cursor, f'PRAGMA foreign_keys={foreign_keys}')
+
+        if success:
+            message = 'Upgraded the database to version ' + str(SCHEMA_VERSION) + '.'
+
+        return success, message, results
+
+    def __get_user_version(self, cursor: sqlite3.Cursor) -> tuple:
+        """
+        This *private* method gets the schema version of the database.
+
+        :param cursor: the cursor object used to execute sql statements
+        :return: a 3-tuple: (success, message, version)
+        """
+
+        success, message = self.__sql_execute(cursor, 'PRAGMA user_version')
+        if not success:
+            return success, message, 0
+
+        success, message, data = self.__sql_fetchone(cursor)
+        if not (success and data):
+            return False, message, 0
+
+        return True, '', data[0]
+
+    def __upgrade_to_version_1(self, cursor: sqlite3.Cursor) -> tuple:
+        """
+        Version 1: Index the open sessions and cover the (id, checkin, checkout) lookups.
+        The activity_id index is a prefix of the new composite index, so it is no longer needed.
+
+        :param cursor: the cursor object used to execute sql statements
+        :return: (boolean, string)
+        """
+
+        for sql in (self.__create_activity_open_index(),
+                    self.__create_activity_id_checkin_checkout_index(),
+                    'DROP INDEX IF EXISTS activity_id'):
+            success, message = self.__sql_execute(cursor, sql)
+            if not success:
+                return success, message
+
+        return True, ''
+
+    def __upgrade_to_version_2(self, cursor: sqlite3.Cursor) -> tuple:
+        """
+        Version 2: Rebuild the activity table with integer epoch, day, and week columns.
+        SQLite cannot add STORED generated columns to an existing table, so the table is copied into a new one.
+        The rowid of every record is kept, and the indexes and triggers on the activity table are created again.
+
+        :param cursor: the cursor object used to execute sql statements
+        :return: (boolean, string)
+        """
+
+        for sql in (self.__create_activity_table_version_2('activity_new'),
+                    '''INSERT INTO activity_new (rowid, id, checkin, checkout)
+                        SELECT rowid, id, checkin, checkout FROM activity ORDER BY rowid''',
+                    'DROP TABLE activity',
+                    'ALTER TABLE activity_new RENAME TO activity',
+                    self.__create_activity_open_index(),
+                    self.__create_activity_id_checkin_checkout_index(),
+                    self.__create_activity_id_checkin_day_index(),
+                    self.__create_insert_activity_trigger(),
+                    self.__create_update_activity_trigger()):
+            success, message = self.__sql_execute(cursor, sql)
+            if not success:
+                return success, message
+
+        return True, ''
+
+    def __upgrade_to_version_3(self, cursor: sqlite3.Cursor) -> tuple:
+        """
+        Version 3: Add the student_totals table, the triggers that keep it current, and fill it in.
+
+        :param cursor: the cursor object used to execute sql statements
+        :return: (boolean, string)
+        """
+
+        for sql in (self.__create_student_totals_table(),
+                    self.__create_insert_activity_totals_trigger(),
+                    self.__create_update_activity_totals_trigger(),
+                    self.__create_delete_activity_totals_trigger(),
+                    self.__create_delete_student_totals_trigger(),
+                    self.__create_update_student_totals_trigger()):
+            success, message = self.__sql_execute(cursor, sql)
+            if not success:
+                return success, message
+
+        # The daily_hours table is added in version 4.
+        return self.__rebuild_totals(cursor, rollups=False)
+
+    def __upgrade_to_version_4(self, cursor: sqlite3.Cursor) -> tuple:
+        """
+        Version 4: Add the daily_hours table, the triggers that keep it current, and fill it in.
+        This step also added a weekly_hours table, which version 8 drops, so it is no longer created here.
+
+        :param cursor: the cursor object used to execute sql statements
+        :return: (boolean, string)
+        """
+
+        for sql in (self.__create_daily_hours_table(),
+                    self.__create_insert_activity_rollups_trigger(),
+                    self.__create_update_activity_rollups_trigger(),
+                    self.__create_delete_activity_rollups_trigger()):
+            success, message = self.__sql_execute(cursor, sql)
+            if not success:
+                return success, message
+
+        return self.__rebuild_totals(cursor)
+
+    def __upgrade_to_version_5(self, cursor: sqlite3.Cursor) -> tuple:
+        """
+        Version 5: Create the triggers that check for an existing barcode or an open session again.
+        The new triggers use EXISTS, which stops at the first matching record, instead of COUNT(*),
+        which counts every matching record.
+
+        :param cursor: the cursor object used to execute sql statements
+        :return: (boolean, string)
+        """
+
+        triggers = (('insert_student', self.__create_insert_student_trigger()),
+                    ('update_student', self.__create_update_student_trigger()),
+                    ('insert_activity', self.__create_insert_activity_trigger()),
+                    ('update_activity', self.__create_update_activity_trigger()),
+                    ('insert_admin', self.__create_insert_admin_trigger()),
+                    ('update_admin', self.__create_update_admin_trigger()),
+                    ('delete_admin', self.__create_delete_admin_trigger()))
+
+        for name, create_sql in triggers:
+            for sql in (f'DROP TRIGGER IF EXISTS {name}', create_sql):
+                success, message = self.__sql_execute(cursor, sql)
+                if not success:
+                    return success, message
+
+        return True, ''
+
+    def __upgrade_to_version_6(self, cursor: sqlite3.Cursor) -> tuple:
+        """
+        Version 6: Add the upload_state table, which remembers what was last uploaded to the Google Sheet.
+
+        :param cursor: the cursor object used to execute sql statements
+        :return: (boolean, string)
+        """
+
+        return self.__sql_execute(cursor, self.__create_upload_state_table())
+
+    def __upgrade_to_version_7(self, cursor: sqlite3.Cursor) -> tuple:
+        """
+        Version 7: Add the upload_outbox table, which keeps the uploads that have not reached the Google Sheet yet.
+
+        :param cursor: the cursor object used to execute sql statements
+        :return: (boolean, string)
+        """
+
+        return self.__sql_execute(cursor, self.__create_upload_outbox_table())
+
+    def __upgrade_to_version_8(self, cursor: sqlite3.Cursor) -> tuple:
+        """
+        Version 8: Drop the weekly_hours table. The HoursReport adds up the weeks from the daily_hours table,
+        so nothing reads it, and keeping it current was extra work for every session that was logged.
+        The triggers that kept both tables current are created again for the daily_hours table only.
+
+        :param cursor: the cursor object used to execute sql statements
+        :return: (boolean, string)
+        """
+
+        triggers = (('insert_activity_rollups', self.__create_insert_activity_rollups_trigger()),
+                    ('update_activity_rollups', self.__create_update_activity_rollups_trigger()),
+                    ('delete_activity_rollups', self.__create_delete_activity_rollups_trigger()))
+
+        for name, create_sql in triggers:
+            for sql in (f'DROP TRIGGER IF EXISTS {name}', create_sql):
+                success, message = self.__sql_execute(cursor, sql)
+                if not success:
+                    return success, message
+
+        return self.__sql_execute(cursor, 'DROP TABLE IF EXISTS weekly_hours')
+
+    def rebuild_totals(self) -> tuple:
+        """
+        This method recalculates the student_totals and daily_hours tables from the activity table.
+        The triggers keep the totals current, so this is only needed if the totals are ever suspected to be wrong.
+
+        :return: (boolean, string)
+        """
+
+        db_conn, cursor = self.__create_connection()
+        if not db_conn or not cursor:
+            return False, 'Database connection error or cursor error'
+
+        success, message = self.__sql_execute(cursor, 'BEGIN IMMEDIATE')
+        if success:
+            success, message = self.__rebuild_totals(cursor)
+
+            if success:
+                success, message = self.__sql_execute(cursor, 'COMMIT')
+            else:
+                self.__sql_execute(cursor, 'ROLLBACK')
+
+        self.__release_connection(cursor, db_conn)
+
+        if success:
+            message = 'Rebuilt the student totals.'
+
+        return success, message
+
+    def __rebuild_totals(self, cursor: sqlite3.Cursor, rollups: bool = True) -> tuple:
+        """
+        This *private* method replaces the contents of the student_totals and daily_hours tables.
+        It must be called inside a transaction.
+
+        :param cursor: the cursor object used to execute sql statements
+        :param rollups: also rebuild the daily_hours table
+        :return: (boolean, string)
+        """
+
+        sql_list = ['DELETE FROM student_totals',
+                    '''INSERT INTO student_totals (id, total_seconds, sessions)
+                        SELECT id, SUM(checkout_epoch - checkin_epoch), COUNT(*)
+                        FROM activity WHERE checkout IS NOT NULL
+                        GROUP BY id''']
+
+        if rollups:
+            sql_list.append('DELETE FROM daily_hours')
+            sql_list.append('''INSERT INTO daily_hours (id, checkin_day, centihours, sessions)
+                                SELECT id, checkin_day, SUM(ROUND((checkout_epoch - checkin_epoch) / 36.0)), COUNT(*)
+                                FROM activity WHERE checkout IS NOT NULL
+                                GROUP BY id, checkin_day''')
+
+        for sql in sql_list:
+            success, message = self.__sql_execute(cursor, sql)
+            if not success:
+                return success, message
+
+        return True, ''
+
     def __create_db_object(self, cursor: sqlite3.Cursor, type: str, name: str) -> tuple:
         """This method checks if the table/index/trigger exists and creates the object if it does not exist."""
 
@@ -871,6 +2006,80 @@ class DatabaseManager:
                 FOREIGN KEY (id) REFERENCES student(id) ON DELETE CASCADE ON UPDATE CASCADE)'''
         return sql
 
+    def __create_activity_table_version_2(self, name: str):
+        # The checkin and checkout columns are still TEXT, so they are entered and displayed the same way as before.
+        #   The STORED generated columns are calculated once when a record is inserted or updated, so the
+        #   hours can be calculated with integer arithmetic instead of parsing the dates with JULIANDAY/STRFTIME.
+        # The checkin and checkout fields are local times, so the epoch columns are the number of seconds
+        #   from 1970-01-01 00:00:00 local time (not UTC) and the hours are not affected by daylight saving time.
+        # checkin_day is the number of days since 1970-01-01, so all sessions that start on the same date
+        #   have the same checkin_day.
+        # checkin_week is the number of weeks, starting on Sunday, since Sunday 1969-12-28.
+        #   1970-01-01 was a Thursday, which is why 4 days are added before dividing by 7.
+        date_time_format = '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-9][0-9]:[0-9][0-9]:[0-9][0-9]'
+        sql = f'''CREATE TABLE IF NOT EXISTS {name}
+                (id TEXT NOT NULL,
+                checkin TEXT NOT NULL CHECK(checkin GLOB "{date_time_format}"),
+                checkout TEXT CHECK(checkout GLOB "{date_time_format}"),
+                checkin_epoch INTEGER GENERATED ALWAYS AS (CAST(STRFTIME('%s', checkin) AS INTEGER)) STORED,
+                checkout_epoch INTEGER GENERATED ALWAYS AS (CAST(STRFTIME('%s', checkout) AS INTEGER)) STORED,
+                checkin_day INTEGER GENERATED ALWAYS AS (checkin_epoch / 86400) STORED,
+                checkin_week INTEGER GENERATED ALWAYS AS ((checkin_epoch / 86400 + 4) / 7) STORED,
+                FOREIGN KEY (id) REFERENCES student(id) ON DELETE CASCADE ON UPDATE CASCADE)'''
+        return sql
+
+    def __create_student_totals_table(self):
+        # This table holds the total seconds and number of completed sessions for each student, so the
+        #   total hours is a primary key lookup instead of adding up every session the student ever logged.
+        # It is kept current by the insert_activity_totals, update_activity_totals, delete_activity_totals,
+        #   delete_student_totals, and update_student_totals triggers. A student with no completed sessions may not have a record.
+        sql = '''CREATE TABLE IF NOT EXISTS student_totals
+                (id TEXT PRIMARY KEY NOT NULL,
+                total_seconds INTEGER NOT NULL DEFAULT 0,
+                sessions INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID'''
+        return sql
+
+    def __create_daily_hours_table(self):
+        # The daily_hours table holds the hours each student logged on each day (checkin_day), so the
+        #   Google Sheet upload does not group the whole activity table. The HoursReport adds up the weeks,
+        #   months, and seasons from it.
+        # The hours are stored as whole hundredths of an hour (centihours) so that adding and subtracting
+        #   sessions in the triggers never builds up floating point errors. Each session is rounded to
+        #   the hundredth of an hour before it is added, which is how the hours are shown in the raw data.
+        # They are kept current by the insert_activity_rollups, update_activity_rollups, and
+        #   delete_activity_rollups triggers. A record is removed when its last session is removed.
+        sql = '''CREATE TABLE IF NOT EXISTS daily_hours
+                (id TEXT NOT NULL,
+                checkin_day INTEGER NOT NULL,
+                centihours INTEGER NOT NULL DEFAULT 0,
+                sessions INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (id, checkin_day)) WITHOUT ROWID'''
+        return sql
+
+    def __create_upload_state_table(self):
+        # This table holds one record for each worksheet in the Google Sheet with what was uploaded the last time,
+        #   so that the next upload only sends the cells and rows that have changed since then.
+        #   The value is a JSON string that only the GoogleSheetManager reads and writes.
+        sql = '''CREATE TABLE IF NOT EXISTS upload_state
+                (name TEXT PRIMARY KEY NOT NULL,
+                value TEXT NOT NULL) WITHOUT ROWID'''
+        return sql
+
+    def __create_upload_outbox_table(self):
+        # This table holds one record for each upload that was requested but has not reached the Google Sheet yet.
+        #   An upload always sends everything in the database, so one successful upload completes all the records.
+        #   The records stay in the table if the upload fails, so a failed upload is tried again later,
+        #   even if the program is restarted.
+        sql = '''CREATE TABLE IF NOT EXISTS upload_outbox
+                (request_id INTEGER PRIMARY KEY,
+                requested TEXT NOT NULL,
+                reason TEXT NOT NULL,
+                full INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_attempt TEXT,
+                last_error TEXT)'''
+        return sql
+
     def __create_admin_table(self):
         # Why is the Primary Key also specified as NOT NULL?
         #   Non-integer Primary Keys can be set to NULL -- its a known sqlite bug.
@@ -885,12 +2094,30 @@ class DatabaseManager:
         sql = '''CREATE INDEX IF NOT EXISTS activity_id ON activity(id)'''
         return sql
 
+    def __create_activity_open_index(self):
+        # This partial index only contains the open sessions (checkout IS NULL), so it stays small no matter
+        #   how many seasons of activity are stored. It is used to find whether a student is checked in,
+        #   by the insert_activity and update_activity triggers, and to list everyone that is checked in.
+        sql = '''CREATE INDEX IF NOT EXISTS activity_open ON activity(id, checkin) WHERE checkout IS NULL'''
+        return sql
+
+    def __create_activity_id_checkin_checkout_index(self):
+        # This index covers the queries that look up a student's sessions, so the table itself is not read.
+        sql = '''CREATE INDEX IF NOT EXISTS activity_id_checkin_checkout ON activity(id, checkin, checkout)'''
+        return sql
+
+    def __create_activity_id_checkin_day_index(self):
+        # This index covers the queries that add up a student's hours for each day and in total.
+        sql = '''CREATE INDEX IF NOT EXISTS activity_id_checkin_day
+                ON activity(id, checkin_day, checkin_epoch, checkout_epoch)'''
+        return sql
+
     def __create_insert_student_trigger(self):
         # This trigger runs before a new record is inserted in the Student table.
         #   It checks if the NEW id is already in the Admin table. If the NEW id already exists in the Admin
         #   table, then the insert is aborted.
         message = 'Barcode already exists in the Admin Table. Use a different Barcode.'
-        condition = '(SELECT COUNT(*) FROM admin WHERE NEW.id=id) >0'
+        condition = 'EXISTS (SELECT 1 FROM admin WHERE id=NEW.id)'
         sql = f'''CREATE TRIGGER IF NOT EXISTS insert_student BEFORE INSERT ON student
                     BEGIN
                         SELECT CASE
@@ -904,7 +2131,7 @@ class DatabaseManager:
         #   It checks if the NEW id is already in the Admin table. If the NEW id already exists in the Admin
         #   table, then the update is aborted.
         message = 'Barcode already exists in the Admin Table. Use a different Barcode.'
-        condition = '(SELECT COUNT(*) FROM admin WHERE NEW.id=id) >0'
+        condition = 'EXISTS (SELECT 1 FROM admin WHERE id=NEW.id)'
         sql = f'''CREATE TRIGGER IF NOT EXISTS update_student BEFORE UPDATE OF id ON student
                     BEGIN
                         SELECT CASE
@@ -918,7 +2145,7 @@ class DatabaseManager:
         #   It will only allow a student to be "Checked In" one time. If the new checkout time is NULL
         #   and there already exists a NULL checkout time for that id, then the insert is aborted.
         message = 'Student already Checked In. Must include a Check Out time.'
-        condition = '(SELECT COUNT(*) FROM activity WHERE NEW.id=id AND NEW.checkout IS NULL AND checkout IS NULL) >0'
+        condition = 'NEW.checkout IS NULL AND EXISTS (SELECT 1 FROM activity WHERE id=NEW.id AND checkout IS NULL)'
         sql = f'''CREATE TRIGGER IF NOT EXISTS insert_activity BEFORE INSERT ON activity
                     BEGIN
                         SELECT CASE
@@ -932,8 +2159,8 @@ class DatabaseManager:
         #   It will only allow a student to be "Checked In" one time. If the updated checkout time is NULL
         #   and there already exists a NULL checkout time for that id, then the update is aborted.
         message = 'Student already Checked In. Must include a Check Out time.'
-        condition = '''(SELECT COUNT(*) FROM activity 
-                        WHERE NEW.rowid!=rowid AND NEW.id=id AND NEW.checkout IS NULL AND checkout IS NULL) >0'''
+        condition = '''NEW.checkout IS NULL AND EXISTS (SELECT 1 FROM activity
+                        WHERE id=NEW.id AND checkout IS NULL AND rowid!=NEW.rowid)'''
         sql = f'''CREATE TRIGGER IF NOT EXISTS update_activity BEFORE UPDATE ON activity
                     BEGIN
                         SELECT CASE
@@ -942,12 +2169,124 @@ class DatabaseManager:
                     END;'''
         return sql
 
+    def __create_insert_activity_totals_trigger(self):
+        # This trigger runs after a new record is inserted in the Activity table.
+        #   If the session is complete (it has a checkout time), it is added to the student's totals.
+        sql = '''CREATE TRIGGER IF NOT EXISTS insert_activity_totals AFTER INSERT ON activity
+                    WHEN NEW.checkout IS NOT NULL
+                    BEGIN
+                        INSERT INTO student_totals (id, total_seconds, sessions)
+                            VALUES (NEW.id, NEW.checkout_epoch - NEW.checkin_epoch, 1)
+                            ON CONFLICT(id) DO UPDATE SET
+                                total_seconds = total_seconds + excluded.total_seconds,
+                                sessions = sessions + 1;
+                    END;'''
+        return sql
+
+    def __create_update_activity_totals_trigger(self):
+        # This trigger runs after a record is updated in the Activity table, which includes checking out.
+        #   The OLD session is taken out of the totals and the NEW session is added, if they are complete.
+        #   This also moves the hours to the new id when a student's id is changed (ON UPDATE CASCADE).
+        sql = '''CREATE TRIGGER IF NOT EXISTS update_activity_totals AFTER UPDATE OF id, checkin, checkout ON activity
+                    BEGIN
+                        UPDATE student_totals SET
+                            total_seconds = total_seconds - (OLD.checkout_epoch - OLD.checkin_epoch),
+                            sessions = sessions - 1
+                            WHERE id=OLD.id AND OLD.checkout IS NOT NULL;
+                        INSERT INTO student_totals (id, total_seconds, sessions)
+                            SELECT NEW.id, NEW.checkout_epoch - NEW.checkin_epoch, 1
+                            WHERE NEW.checkout IS NOT NULL
+                            ON CONFLICT(id) DO UPDATE SET
+                                total_seconds = total_seconds + excluded.total_seconds,
+                                sessions = sessions + 1;
+                    END;'''
+        return sql
+
+    def __create_delete_activity_totals_trigger(self):
+        # This trigger runs after a record is deleted from the Activity table.
+        #   If the session was complete, it is taken out of the student's totals.
+        sql = '''CREATE TRIGGER IF NOT EXISTS delete_activity_totals AFTER DELETE ON activity
+                    WHEN OLD.checkout IS NOT NULL
+                    BEGIN
+                        UPDATE student_totals SET
+                            total_seconds = total_seconds - (OLD.checkout_epoch - OLD.checkin_epoch),
+                            sessions = sessions - 1
+                            WHERE id=OLD.id;
+                    END;'''
+        return sql
+
+    def __create_delete_student_totals_trigger(self):
+        # This trigger runs after a record is deleted from the Student table.
+        #   The student's totals are removed along with the student.
+        sql = '''CREATE TRIGGER IF NOT EXISTS delete_student_totals AFTER DELETE ON student
+                    BEGIN
+                        DELETE FROM student_totals WHERE id=OLD.id;
+                    END;'''
+        return sql
+
+    def __create_update_student_totals_trigger(self):
+        # This trigger runs after the id of a record is changed in the Student table.
+        #   The update_activity_totals trigger moves the hours to the new id, so the old record is removed.
+        sql = '''CREATE TRIGGER IF NOT EXISTS update_student_totals AFTER UPDATE OF id ON student
+                    BEGIN
+                        DELETE FROM student_totals WHERE id=OLD.id;
+                    END;'''
+        return sql
+
+    def __create_insert_activity_rollups_trigger(self):
+        # This trigger runs after a new record is inserted in the Activity table.
+        #   If the session is complete (it has a checkout time), it is added to the daily hours.
+        sql = '''CREATE TRIGGER IF NOT EXISTS insert_activity_rollups AFTER INSERT ON activity
+                    WHEN NEW.checkout IS NOT NULL
+                    BEGIN
+                        INSERT INTO daily_hours (id, checkin_day, centihours, sessions)
+                            SELECT NEW.id, NEW.checkin_day, ROUND((NEW.checkout_epoch - NEW.checkin_epoch) / 36.0), 1
+                            WHERE NEW.checkout IS NOT NULL
+                            ON CONFLICT(id, checkin_day) DO UPDATE SET
+                                centihours = centihours + excluded.centihours,
+                                sessions = sessions + 1;
+                    END;'''
+        return sql
+
+    def __create_update_activity_rollups_trigger(self):
+        # This trigger runs after a record is updated in the Activity table, which includes checking out.
+        #   The OLD session is taken out of the daily hours and the NEW session is added, if they are complete.
+        sql = '''CREATE TRIGGER IF NOT EXISTS update_activity_rollups AFTER UPDATE OF id, checkin, checkout ON activity
+                    BEGIN
+                        UPDATE daily_hours SET
+                            centihours = centihours - ROUND((OLD.checkout_epoch - OLD.checkin_epoch) / 36.0),
+                            sessions = sessions - 1
+                            WHERE id=OLD.id AND checkin_day=OLD.checkin_day AND OLD.checkout IS NOT NULL;
+                        DELETE FROM daily_hours WHERE id=OLD.id AND checkin_day=OLD.checkin_day AND sessions=0;
+                        INSERT INTO daily_hours (id, checkin_day, centihours, sessions)
+                            SELECT NEW.id, NEW.checkin_day, ROUND((NEW.checkout_epoch - NEW.checkin_epoch) / 36.0), 1
+                            WHERE NEW.checkout IS NOT NULL
+                            ON CONFLICT(id, checkin_day) DO UPDATE SET
+                                centihours = centihours + excluded.centihours,
+                                sessions = sessions + 1;
+                    END;'''
+        return sql
+
+    def __create_delete_activity_rollups_trigger(self):
+        # This trigger runs after a record is deleted from the Activity table.
+        #   If the session was complete, it is taken out of the daily hours.
+        sql = '''CREATE TRIGGER IF NOT EXISTS delete_activity_rollups AFTER DELETE ON activity
+                    WHEN OLD.checkout IS NOT NULL
+                    BEGIN
+                        UPDATE daily_hours SET
+                            centihours = centihours - ROUND((OLD.checkout_epoch - OLD.checkin_epoch) / 36.0),
+                            sessions = sessions - 1
+                            WHERE id=OLD.id AND checkin_day=OLD.checkin_day AND OLD.checkout IS NOT NULL;
+                        DELETE FROM daily_hours WHERE id=OLD.id AND checkin_day=OLD.checkin_day AND sessions=0;
+                    END;'''
+        return sql
+
     def __create_insert_admin_trigger(self):
         # This trigger runs before a new record is inserted in the Admin table.
         #   It checks if the NEW id is already in the Student table. If the NEW id already exists in the Student
         #   table, then the insert is aborted.
         message = 'Barcode already exists in the Student Table. Use a different Barcode.'
-        condition = '(SELECT COUNT(*) FROM student WHERE NEW.id=id) >0'
+        condition = 'EXISTS (SELECT 1 FROM student WHERE id=NEW.id)'
         sql = f'''CREATE TRIGGER IF NOT EXISTS insert_admin BEFORE INSERT ON admin
                     BEGIN
                         SELECT CASE
@@ -961,7 +2300,7 @@ class DatabaseManager:
         #   It checks if the NEW id is already in the Student table. If the NEW id already exists in the Student
         #   table, then the update is aborted.
         message = 'Barcode already exists in the Student Table. Use a different Barcode.'
-        condition = '(SELECT COUNT(*) FROM student WHERE NEW.id=id) >0'
+        condition = 'EXISTS (SELECT 1 FROM student WHERE id=NEW.id)'
         sql = f'''CREATE TRIGGER IF NOT EXISTS update_admin BEFORE UPDATE OF id ON admin
                     BEGIN
                         SELECT CASE
@@ -972,9 +2311,9 @@ class DatabaseManager:
 
     def __create_delete_admin_trigger(self):
         # This trigger runs before a record is deleted in the Admin table.
-        #   It checks if there only one admin in the Admin table.
+        #   It checks if there only one admin in the Admin table, which is true if no other admin exists.
         message = 'There must be at least one admin in the Admin Table.'
-        condition = '(SELECT COUNT(*) FROM admin) =1'
+        condition = 'NOT EXISTS (SELECT 1 FROM admin WHERE id!=OLD.id)'
         sql = f'''CREATE TRIGGER IF NOT EXISTS delete_admin BEFORE DELETE ON admin
                     BEGIN
                         SELECT CASE
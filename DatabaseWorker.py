@@ -0,0 +1,158 @@
+from PyQt5 import QtCore as qtc
+
+from DatabaseManager import DatabaseManager
+
+# The most requests that can be waiting for the database before new requests are turned away.
+DEFAULT_MAX_PENDING = 20
+
+
+class DatabaseRunner(qtc.QObject):
+    """This class lives on the database thread and calls the DatabaseManager methods, one request at a time."""
+
+    # Signal to return the result of a request: (request id, method name, result)
+    finished = qtc.pyqtSignal(int, str, object)
+
+    def __init__(self, db_manager: DatabaseManager):
+        super().__init__()
+
+        self.__db_manager = db_manager
+
+    @qtc.pyqtSlot(int, str, tuple)
+    def run(self, request_id: int, method_name: str, arguments: tuple) -> None:
+        """
+        This slot calls a DatabaseManager method on the database thread.
+        The requests are queued by Qt and run in the order they were submitted.
+
+        :param request_id: the number that identifies the request
+        :param method_name: the name of the DatabaseManager method to call
+        :param arguments: the arguments for the method
+        :return: None, emits the "finished" signal with the result of the method,
+            or (False, error message) if the method raised an exception
+        """
+
+        try:
+            result = getattr(self.__db_manager, method_name)(*arguments)
+        except Exception as e:
+            result = (False, str(e))
+
+        self.finished.emit(request_id, method_name, result)
+
+
+class DatabaseWorker(qtc.QObject):
+    """This class runs DatabaseManager methods on a separate thread, so the windows never wait for the database.
+
+    A request is submitted with the name of a DatabaseManager method, its arguments, and a callback.
+    The requests run one at a time, in the order they were submitted, so a check in or check out is never
+    run out of order. The callback is called on the GUI thread with the result of the method.
+    If the method raised an exception, the result is only (False, error message), so a callback must check
+    the success value before unpacking the rest of the result.
+    """
+
+    # Signal to send a request to the database thread: (request id, method name, arguments)
+    request_submitted = qtc.pyqtSignal(int, str, tuple)
+
+    # Signal to indicate that a request has finished: (request id, method name, result)
+    request_finished = qtc.pyqtSignal(int, str, object)
+
+    # Signal to indicate that the worker has become busy (True) or has finished all its requests (False).
+    busy_changed = qtc.pyqtSignal(bool)
+
+    def __init__(self, db_manager: DatabaseManager, max_pending: int = DEFAULT_MAX_PENDING):
+        super().__init__()
+
+        self.__max_pending = max(1, int(max_pending))
+        self.__next_request_id = 1
+        self.__callbacks = dict()       # request id -> callback for the requests that have not finished
+        self.__busy = False
+
+        self.__runner = DatabaseRunner(db_manager)
+        self.__thread = qtc.QThread()
+        self.__runner.moveToThread(self.__thread)
+
+        # The runner is on a different thread, so both of these are queued connections.
+        self.request_submitted.connect(self.__runner.run)
+        self.__runner.finished.connect(self.__finished)
+
+        self.__thread.start()
+
+    @property
+    def max_pending(self) -> int:
+        return self.__max_pending
+
+    def pending(self) -> int:
+        """
+        This method returns the number of requests that have not finished.
+
+        :return: the number of requests waiting for or using the database
+        """
+
+        return len(self.__callbacks)
+
+    def is_busy(self) -> bool:
+        return self.__busy
+
+    def is_full(self) -> bool:
+        return len(self.__callbacks) >= self.__max_pending
+
+    def submit(self, method_name: str, arguments: tuple = (), callback=None) -> bool:
+        """
+        This method queues a request to call a DatabaseManager method on the database thread.
+        If too many requests are already waiting, the request is turned away so that the caller can
+        tell the user to try again, rather than letting the requests pile up.
+
+        :param method_name: the name of the DatabaseManager method to call
+        :param arguments: the arguments for the method
+        :param callback: a function that is called on the GUI thread with the result of the method
+        :return: True if the request was queued, False if the worker is too busy or has stopped
+        """
+
+        if self.is_full() or not self.__thread.isRunning():
+            return False
+
+        request_id = self.__next_request_id
+        self.__next_request_id += 1
+
+        self.__callbacks[request_id] = callback
+        if not self.__busy:
+            self.__busy = True
+            self.busy_changed.emit(True)
+
+        self.request_submitted.emit(request_id, method_name, tuple(arguments))
+
+        return True
+
+    def stop(self) -> None:
+        """
+        This method lets the requests already queued finish, then stops the database thread.
+        The callbacks for those requests are not called.
+
+        :return: None
+        """
+
+        self.__thread.quit()
+        self.__thread.wait()
+
+    @qtc.pyqtSlot(int, str, object)
+    def __finished(self, request_id: int, method_name: str, result: object) -> None:
+        """
+        This *private* slot is called on the GUI thread when a request has finished.
+
+        :param request_id: the number that identifies the request
+        :param method_name: the name of the DatabaseManager method that was called
+        :param result: the value returned by the method
+        :return: None, emits the "request_finished" signal and "busy_changed" if there are no more requests
+        """
+
+        callback = self.__callbacks.pop(request_id, None)
+
+        # The worker must not stay busy if a callback fails, otherwise the windows would wait for it forever.
+        try:
+            if callback:
+                callback(result)
+        finally:
+            self.request_finished.emit(request_id, method_name, result)
+
+            # A callback may submit another request, so the worker is only idle if nothing is left to do.
+            if self.__busy and not self.__callbacks:
+                self.__busy = False
+                self.busy_changed.emit(False)
@@ -0,0 +1,193 @@
+import gc
+import time
+import logging
+
+from PyQt5 import QtCore as qtc
+
+logger = logging.getLogger(__name__)
+
+# These settings can be changed in the "gc config" section of the config.json file.
+DEFAULT_GC_CONFIG = {
+    'mode': 'idle',                     # 'default', 'tuned', or 'idle'
+    'thresholds': [50000, 20, 100],     # only used in 'tuned' mode
+    'idle seconds': 5.0,                # only used in 'idle' mode
+    'max seconds': 300.0                # only used in 'idle' mode
+}
+
+
+class GarbageCollectionManager(qtc.QObject):
+    """This class decides when garbage collection runs and measures how long each collection pauses the program.
+
+    There are three modes:
+      • 'default' - Python decides when to collect, which is the same as not using this class.
+      • 'tuned'   - the generational thresholds are raised at startup so that collections happen less often.
+      • 'idle'    - automatic collection is turned off and a full collection only runs after the kiosk
+                    has been idle for a few seconds, so a collection never pauses a scan. A kiosk that is
+                    not scanning still collects every few minutes, so it does not keep growing.
+    """
+
+    def __init__(self, gc_config: dict = None):
+        super().__init__()
+
+        config = dict(DEFAULT_GC_CONFIG)
+        config.update(gc_config or {})
+
+        self.__mode = str(config.get('mode')).lower()
+        if self.__mode not in ('default', 'tuned', 'idle'):
+            self.__mode = DEFAULT_GC_CONFIG['mode']
+
+        # Statistics for every collection, whether it was started by Python or by this class.
+        self.__collection_start = 0.0
+        self.__collections = [0, 0, 0]      # number of collections of each generation
+        self.__total_pause = 0.0            # seconds
+        self.__max_pause = 0.0              # seconds
+
+        # Statistics for the scan in progress.
+        self.__scan_in_progress = False
+        self.__scan_collections = 0
+        self.__scan_pause = 0.0             # seconds
+
+        gc.callbacks.append(self.__gc_callback)
+
+        self.__idle_timer = qtc.QTimer()
+        self.__idle_timer.setSingleShot(True)
+        self.__idle_timer.timeout.connect(self.collect)
+
+        # In 'idle' mode, this timer makes sure there is a collection at least every 'max seconds', even when
+        #   there are no scans to start the idle timer (e.g. while the kiosk only uploads to the Google Sheet).
+        self.__max_timer = qtc.QTimer()
+        self.__max_timer.timeout.connect(self.__max_time_reached)
+
+        if self.__mode == 'tuned':
+            try:
+                gc.set_threshold(*[int(x) for x in config.get('thresholds')])
+            except (TypeError, ValueError):
+                gc.set_threshold(*DEFAULT_GC_CONFIG['thresholds'])
+
+        elif self.__mode == 'idle':
+            try:
+                idle_seconds = float(config.get('idle seconds'))
+            except (TypeError, ValueError):
+                idle_seconds = DEFAULT_GC_CONFIG['idle seconds']
+            self.__idle_timer.setInterval(int(1000 * idle_seconds))
+
+            try:
+                max_seconds = float(config.get('max seconds'))
+            except (TypeError, ValueError):
+                max_seconds = DEFAULT_GC_CONFIG['max seconds']
+            if max_seconds <= 0:
+                max_seconds = DEFAULT_GC_CONFIG['max seconds']
+            self.__max_timer.setInterval(int(1000 * max(max_seconds, idle_seconds)))
+
+            gc.disable()
+            self.__max_timer.start()
+
+    def startup_complete(self) -> None:
+        """
+        This method is called once the program has finished starting up.
+        The objects created at startup live until the program exits, so they are moved out of the
+        generations that are checked by each collection.
+
+        :return: None
+        """
+
+        if self.__mode != 'default':
+            gc.collect()
+            gc.freeze()
+
+    def scan_started(self) -> None:
+        """
+        This method is called when a barcode is scanned. It stops an idle collection from starting
+        and resets the statistics for this scan.
+
+        :return: None
+        """
+
+        self.__idle_timer.stop()
+        self.__scan_in_progress = True
+        self.__scan_collections = 0
+        self.__scan_pause = 0.0
+
+    def scan_finished(self) -> None:
+        """
+        This method is called when the Main window is refreshed after a scan.
+        It logs how much time garbage collection added to the scan and, in 'idle' mode,
+        starts the timer to collect once the kiosk is idle.
+
+        :return: None
+        """
+
+        if self.__scan_in_progress:
+            logger.info('Garbage collection added %.2f ms to the scan (%d collections)',
+                        1000 * self.__scan_pause, self.__scan_collections)
+            self.__scan_in_progress = False
+
+        if self.__mode == 'idle':
+            self.__idle_timer.start()
+
+    @qtc.pyqtSlot()
+    def collect(self) -> None:
+        """
+        This slot runs a full collection. It is called by the idle timer.
+
+        :return: None
+        """
+
+        gc.collect()
+
+        # The next collection is due 'max seconds' after this one.
+        if self.__max_timer.isActive():
+            self.__max_timer.start()
+
+    @qtc.pyqtSlot()
+    def __max_time_reached(self) -> None:
+        """
+        This *private* slot is called when there has not been a collection for 'max seconds'.
+        If a scan is in progress, the collection is left to the idle timer that starts when it finishes.
+
+        :return: None
+        """
+
+        if not self.__scan_in_progress:
+            self.collect()
+
+    def get_stats(self) -> dict:
+        """
+        This method returns the garbage collection statistics since the program started.
+
+        :return: a dictionary of statistics, with all times in milliseconds
+        """
+
+        return {'mode': self.__mode,
+                'collections': tuple(self.__collections),
+                'total pause ms': 1000 * self.__total_pause,
+                'max pause ms': 1000 * self.__max_pause,
+                'last scan pause ms': 1000 * self.__scan_pause,
+                'last scan collections': self.__scan_collections}
+
+    def __gc_callback(self, phase: str, info: dict) -> None:
+        """
+        This *private* method is called by Python at the start and stop of every collection.
+
+        :param phase: either 'start' or 'stop'
+        :param info: a dictionary that contains the generation being collected
+        :return: None
+        """
+
+        if phase == 'start':
+            self.__collection_start = time.perf_counter()
+            return
+
+        pause = time.perf_counter() - self.__collection_start
+        generation = info.get('generation', 2)
+
+        self.__collections[generation] += 1
+        self.__total_pause += pause
+        self.__max_pause = max(self.__max_pause, pause)
+
+        if self.__scan_in_progress:
+            self.__scan_collections += 1
+            self.__scan_pause += pause
+
+        if generation == 2:
+            logger.debug('Full garbage collection paused the program for %.2f ms', 1000 * pause)
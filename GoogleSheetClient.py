@@ -0,0 +1,283 @@
+import time
+import random
+import logging
+import threading
+
+import gspread
+import requests
+
+logger = logging.getLogger(__name__)
+
+# These settings can be changed in the "google config" section of the config.json file.
+# The Google Sheets API allows 60 read requests and 60 write requests per minute for each user, and every
+#   kiosk that uses the same service account is the same user, so lower these if several kiosks share one.
+DEFAULT_LIMITS_CONFIG = {
+    'read requests per minute': 60,
+    'write requests per minute': 60,
+    'max retries': 5,
+    'max backoff seconds': 64
+}
+
+# The API errors that are worth trying again: too many requests, and errors on the Google side.
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """This class limits how often requests can be made. It holds up to one minute of requests, and a request
+    waits until the bucket has a token for it. The bucket is refilled at a steady rate."""
+
+    def __init__(self, requests_per_minute: float):
+        self.__lock = threading.Lock()
+        self.__capacity = 1.0
+        self.__rate = 1.0 / 60
+        self.__tokens = 0.0
+        self.__updated = time.monotonic()
+
+        self.set_rate(requests_per_minute)
+        self.__tokens = self.__capacity
+
+    def set_rate(self, requests_per_minute: float) -> None:
+        """
+        This method changes the limit. The tokens already in the bucket are kept, up to the new capacity.
+
+        :param requests_per_minute: the most requests that can be made in one minute
+        :return: None
+        """
+
+        with self.__lock:
+            self.__refill()
+            self.__capacity = max(1.0, float(requests_per_minute))
+            self.__rate = self.__capacity / 60
+            self.__tokens = min(self.__tokens, self.__capacity)
+
+    def acquire(self) -> float:
+        """
+        This method takes one token from the bucket, waiting until one is available.
+
+        :return: the number of seconds spent waiting
+        """
+
+        waited = 0.0
+        while True:
+            with self.__lock:
+                self.__refill()
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return waited
+                wait = (1 - self.__tokens) / self.__rate
+
+            time.sleep(wait)
+            waited += wait
+
+    def __refill(self) -> None:
+        """
+        This *private* method adds the tokens earned since the last refill. The lock must be held.
+
+        :return: None
+        """
+
+        now = time.monotonic()
+        self.__tokens = min(self.__capacity, self.__tokens + (now - self.__updated) * self.__rate)
+        self.__updated = now
+
+
+class GoogleSheetClient:
+    """This class makes the Google Sheets API calls for the GoogleSheetManager.
+
+    Every call waits for a token from the read or write bucket, so the program stays under the per-minute limits.
+    If Google still answers with 429 RESOURCE_EXHAUSTED or a 5xx error, or the network fails, the call is tried
+    again after an exponential backoff with random jitter, as recommended in the Google Sheets API documentation.
+    A call that would change the Google Sheet again if it were repeated (not idempotent) is only tried again after
+    a 429, because after a 5xx error or a network failure the first call may already have been applied.
+    Keep one client for the life of the program so the buckets remember the calls from earlier uploads.
+    """
+
+    def __init__(self, google_config: dict = None):
+        self.__read_bucket = TokenBucket(DEFAULT_LIMITS_CONFIG['read requests per minute'])
+        self.__write_bucket = TokenBucket(DEFAULT_LIMITS_CONFIG['write requests per minute'])
+        self.__max_retries = DEFAULT_LIMITS_CONFIG['max retries']
+        self.__max_backoff = DEFAULT_LIMITS_CONFIG['max backoff seconds']
+
+        # Statistics for every call, for each kind of call: 'read' and 'write'
+        self.__stats_lock = threading.Lock()
+        self.__stats = {kind: {'calls': 0, 'retries': 0, 'failures': 0, 'throttle seconds': 0.0,
+                               'total seconds': 0.0, 'max seconds': 0.0} for kind in ('read', 'write')}
+
+        self.configure(google_config)
+
+    def configure(self, google_config: dict = None) -> None:
+        """
+        This method sets the limits from the google config. Any setting that is missing or invalid uses the default.
+
+        :param google_config: the "google config" section of the config.json file
+        :return: None
+        """
+
+        config = dict(DEFAULT_LIMITS_CONFIG)
+        config.update(google_config or {})
+
+        def number(key: str, minimum: float) -> float:
+            try:
+                return max(minimum, float(config.get(key)))
+            except (TypeError, ValueError):
+                return DEFAULT_LIMITS_CONFIG[key]
+
+        self.__read_bucket.set_rate(number('read requests per minute', 1))
+        self.__write_bucket.set_rate(number('write requests per minute', 1))
+        self.__max_retries = int(number('max retries', 0))
+        self.__max_backoff = number('max backoff seconds', 1)
+
+    def read(self, function, *args, is_cancelled=None, **kwargs):
+        """
+        This method makes a call that reads from the Google Sheet. See call().
+        """
+
+        return self.call('read', function, *args, is_cancelled=is_cancelled, **kwargs)
+
+    def write(self, function, *args, is_cancelled=None, idempotent=True, **kwargs):
+        """
+        This method makes a call that writes to the Google Sheet. See call().
+        """
+
+        return self.call('write', function, *args, is_cancelled=is_cancelled, idempotent=idempotent, **kwargs)
+
+    def call(self, kind: str, function, *args, is_cancelled=None, idempotent=True, **kwargs):
+        """
+        This method calls a gspread method that makes one API request, waiting for the rate limit first and
+        trying again if the error is temporary.
+
+        :param kind: either 'read' or 'write', which decides the limit that is used
+        :param function: the gspread method to call
+        :param args: the arguments for the method
+        :param is_cancelled: a function that returns True if the upload should stop instead of trying again
+        :param idempotent: can the call be repeated without changing the result? If not, it is only tried again
+            when Google turned it away with a 429.
+        :param kwargs: the keyword arguments for the method
+        :return: the value returned by the method, or the last exception is raised
+        """
+
+        bucket = self.__write_bucket if kind == 'write' else self.__read_bucket
+        attempt = 0
+
+        while True:
+            throttle = bucket.acquire()
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+                self.__record(kind, time.perf_counter() - start, throttle, attempt, False)
+                return result
+            except Exception as e:
+                seconds = time.perf_counter() - start
+                retry = self.__is_retryable(e, idempotent) and attempt < self.__max_retries
+                if not retry:
+                    self.__record(kind, seconds, throttle, attempt, True)
+                    raise
+
+                delay = self.__backoff(e, attempt)
+                logger.warning('Google Sheets %s failed (%s), trying again in %.1f seconds', kind, e, delay)
+                if not self.__sleep(delay, is_cancelled):
+                    self.__record(kind, seconds, throttle, attempt, True)
+                    raise
+
+                attempt += 1
+
+    def get_stats(self) -> dict:
+        """
+        This method returns the statistics for the calls made since the client was created.
+
+        :return: a dictionary for 'read' and 'write' calls, with all times in milliseconds
+        """
+
+        with self.__stats_lock:
+            stats = dict()
+            for kind, kind_stats in self.__stats.items():
+                calls = kind_stats['calls']
+                stats[kind] = {'calls': calls,
+                               'retries': kind_stats['retries'],
+                               'failures': kind_stats['failures'],
+                               'throttle ms': 1000 * kind_stats['throttle seconds'],
+                               'average ms': 1000 * kind_stats['total seconds'] / calls if calls else 0.0,
+                               'max ms': 1000 * kind_stats['max seconds']}
+            return stats
+
+    def __record(self, kind: str, seconds: float, throttle: float, retries: int, failed: bool) -> None:
+        """
+        This *private* method adds one call to the statistics.
+
+        :param kind: either 'read' or 'write'
+        :param seconds: how long the last attempt of the call took
+        :param throttle: how long the last attempt waited for the rate limit
+        :param retries: how many times the call was tried again
+        :param failed: did the call fail in the end?
+        :return: None
+        """
+
+        with self.__stats_lock:
+            kind_stats = self.__stats[kind]
+            kind_stats['calls'] += 1
+            kind_stats['retries'] += retries
+            kind_stats['failures'] += int(failed)
+            kind_stats['throttle seconds'] += throttle
+            kind_stats['total seconds'] += seconds
+            kind_stats['max seconds'] = max(kind_stats['max seconds'], seconds)
+
+        logger.debug('Google Sheets %s took %.0f ms after %d retries', kind, 1000 * seconds, retries)
+
+    def __is_retryable(self, error: Exception, idempotent: bool = True) -> bool:
+        """
+        This *private* method decides if a failed call is worth trying again.
+
+        :param error: the exception raised by gspread
+        :param idempotent: can the call be repeated without changing the result?
+        :return: True for 429 and 5xx API errors and for network errors, only True for 429 if not idempotent
+        """
+
+        if isinstance(error, gspread.exceptions.APIError):
+            response = getattr(error, 'response', None)
+            status_code = getattr(response, 'status_code', None)
+            if not idempotent:
+                return status_code == 429
+            return status_code in RETRY_STATUS_CODES
+
+        return idempotent and isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+    def __backoff(self, error: Exception, attempt: int) -> float:
+        """
+        This *private* method returns how long to wait before trying again: 1, 2, 4, 8, ... seconds plus up to
+        one second of random jitter, so that several kiosks do not try again at the same moment.
+        If Google says how long to wait with a Retry-After header, that is used if it is longer.
+
+        :param error: the exception raised by gspread
+        :param attempt: the number of times the call has been tried again
+        :return: the number of seconds to wait
+        """
+
+        delay = min(2 ** attempt + random.random(), self.__max_backoff)
+
+        response = getattr(error, 'response', None)
+        try:
+            delay = max(delay, min(float(response.headers.get('Retry-After')), self.__max_backoff))
+        except (AttributeError, TypeError, ValueError):
+            pass
+
+        return delay
+
+    def __sleep(self, seconds: float, is_cancelled=None) -> bool:
+        """
+        This *private* method waits before trying again, checking if the upload was cancelled.
+
+        :param seconds: the number of seconds to wait
+        :param is_cancelled: a function that returns True if the upload should stop
+        :return: False if the upload was cancelled while waiting
+        """
+
+        end = time.monotonic() + seconds
+        while True:
+            if is_cancelled and is_cancelled():
+                return False
+
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return True
+
+            time.sleep(min(remaining, 0.25))
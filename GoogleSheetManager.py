@@ -1,44 +1,89 @@
-import gc
 import os
 import gspread
 import gspread.utils
+import hashlib
+import itertools
 import json
+import re
+import sqlite3
 
+from contextlib import closing
 from datetime import datetime, timedelta
 from DatabaseManager import DatabaseManager
+from GoogleSheetClient import GoogleSheetClient
+from HoursReport import HoursReport
 
 # The CONFIG_FILENAME is also defined in TimeTrack4237.py
 CONFIG_FILENAME = 'config.json'
 THIS_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
 
+# The dates in the header rows and the check in and check out times in the raw data.
+DATE_PATTERN = re.compile(r'\d{2}/\d{2}/\d{4}$')
+DATE_TIME_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$')
+
+# Google Sheets stores a date as the number of days since this date.
+SHEETS_EPOCH = datetime(1899, 12, 30)
+
+RAW_DATA_HEADER = ('Last Name', 'First Name', 'Barcode', 'Checkin', 'Checkout', 'Hours')
+
+# The rows of a worksheet are sent in blocks, one updateCells request for each block,
+#   so the rows can be read one at a time from the database and no single request grows with the whole history.
+ROWS_PER_REQUEST = 1000
+
+# The raw data is written with one batch_update() API call for every ROWS_PER_WRITE rows, so a large raw data sheet
+#   is never one huge request. This can be changed with "rows per write" in the "google config" section.
+ROWS_PER_WRITE = 5000
+
 
 class GoogleSheetManager:
-    """This class is only used in the DatabaseManager.upload_student_data_to_google_sheet() method.
-    When the object is created, it automatically uploads the data to the google sheet."""
+    """This class uploads the hours to the Google Sheet when upload_data() is called. It is used by the UploadWorker
+    and by the --upload command line option.
+
+    Each upload reads the database once, plans the requests for the weekly, raw data, and daily worksheets, and
+    sends them all with one batch_update() API call, so a failed or cancelled upload leaves the Google Sheet as it was.
+    Only a raw data worksheet with more than "rows per write" new rows is written with more than one call, and the
+    next upload carries on from the last rows that were written.
+    """
 
     # IMPORTANT: gspread uses the Google Sheets API v4, which introduced Usage Limits
     #   • 300 write requests per minute,
     #   • 60 write requests per minute per user, and
     #   • unlimited write requests per day.
     # When the application hits that limit, you get an APIError 429 RESOURCE_EXHAUSTED.
+    # The GoogleSheetClient keeps to these limits and tries again, with a backoff, after a 429 or 5xx error.
     # These are the same limits for reading, but that is not an issue with this application.
     # Use the update() and batch_update() methods to help reduce API calls.
+    # This class plans every add sheet, clear, resize, format, and data request for all the worksheets and
+    #   sends them with one batch_update() call. The spreadsheet is kept open between uploads, so an upload uses
+    #   one read request and one write request (plus one read request to open the spreadsheet the first time).
+    #   Only a raw data worksheet with more than "rows per write" new rows takes more write requests.
 
-    def __init__(self, db_manager_or_filename):
+    def __init__(self, db_manager_or_filename, client: GoogleSheetClient = None):
         if isinstance(db_manager_or_filename, DatabaseManager):
             self.__db_manager = db_manager_or_filename
         else:  # elif isinstance(db_manager_or_filename, str):
             self.__db_manager = DatabaseManager(db_manager_or_filename)
 
-        # self.__student_names_and_barcode_list = [ (lastnameA, firstnameA, barcodeA), ... ]
-        self.__student_names_and_barcode_list = []
-
-        # self.__student_hours_list = [ (lastnameA, firstnameA, barcodeA, year1, week1, week1_hours),
-        #                               (lastnameA, firstnameA, barcodeA, year2, week2, week2_hours), ...]
-        # Note: there is one tuple for each week that a student has logged hours,
-        #   so each student will have several tuples with each tuple indicating weekly hours.
-        self.__student_hours_list = []
-        self.__daily_hours_list = []
+        # Every API call goes through the client, which keeps to the rate limits and tries again after a 429 error.
+        # Pass in the same client for every upload so that it remembers the calls made by earlier uploads.
+        self.__client = client or GoogleSheetClient()
+        self.__is_cancelled = None
+
+        # Keep the same GoogleSheetManager for every upload so these are only set up once:
+        #   the google config, which is read again only if the config.json file changes,
+        #   the gspread client, which is created again only if the credential file changes, and
+        #   the spreadsheet, which is opened again only if the url changes or an upload fails.
+        # The gspread client refreshes its OAuth token by itself when the token is about to expire.
+        self.__config_file_key = None
+        self.__google_config = {}
+        self.__credential_file_key = None
+        self.__gspread_client = None
+        self.__spreadsheet_url = ''
+        self.__spreadsheet = None
+
+        # The hours of every student on every day, read once for each upload. The weekly and daily worksheets
+        #   are both made from it, by adding up the hours by week and by day.
+        self.__report = None
 
         # self.__header_list[0] = ['', '', '', '', year1, year1, year1, ...,  year1,  year2, ... ]
         # self.__header_list[1] = ['', '', '', '', week1, week2, week3, ..., week51, week52, ... ]
@@ -54,19 +99,67 @@ class GoogleSheetManager:
         # self.__daily_data_list = [ ['lastname', 'firstname', date1_hours, date2_hours, ...] ...]
         self.__daily_data_list = []
 
-        # self.__raw_data_list = [ [ 'lastname', 'firstname', 'barcode', checkin, checkout, hours ] ]
-        self.__raw_data_list = []
-
-    def upload_data(self) -> tuple:
-        # Garbage collection slows down the process, so disable it during the upload process.
-        # Garbage collection is enabled again in the __clean_up() method.
-        gc.disable()
+        # A full upload rewrites every worksheet. Otherwise, only the cells and rows that changed since the
+        #   last upload are sent (see __upload_changed_cells() and __upload_new_rows()).
+        self.__full_upload = False
+        self.__cells_uploaded = 0
+
+        # The requests planned for all the worksheets, which are sent with one batch_update() API call.
+        # self.__sheets = { 'worksheet name': { 'sheetId': id, 'title': 'worksheet name', 'gridProperties': ... } }
+        # self.__upload_states = [ (upload state name, sheet, state), ... ] which are saved once the requests are sent
+        # self.__streams = [ generator, ... ] that plan the raw data rows while they are sent (see __stream_rows())
+        self.__requests = []
+        self.__sheets = {}
+        self.__upload_states = []
+        self.__streams = []
+        self.__rows_per_write = ROWS_PER_WRITE
+        self.__spreadsheet_id = ''
+        self.__api_calls = 0
+
+    def upload_data(self, progress_callback=None, is_cancelled=None, full: bool = False) -> tuple:
+        """
+        This method uploads the data to the Google Sheet in stages.
+        The upload can be cancelled between stages, but a stage that has started is always finished.
+        Unless a full upload is requested (or the "upload mode" in the google config is "full"), only the data
+        that changed since the last upload is sent.
+
+        Nothing is written until the last stage, which sends the changes to every worksheet with one
+        batch_update() API call, so a cancelled upload leaves the Google Sheet as it was.
+
+        :param progress_callback: a function that is called at the start of each stage with
+            (stage description, stage number, number of stages)
+        :param is_cancelled: a function that returns True if the upload should stop
+        :param full: rewrite every worksheet, even if only some of the data changed
+        :return: (1) was this successful? (2) title of the message (3) explanation of success or failure
+        """
 
         success = False
         title = ''
         message = ''
 
-        success, message, self.__student_names_and_barcode_list, self.__student_hours_list, self.__daily_hours_list = self.__db_manager.get_google_sheet_data()
+        stages = ('Reading the database', 'Opening the Google Sheet', 'Preparing the weekly hours',
+                  'Preparing the raw data', 'Preparing the daily hours', 'Writing to the Google Sheet')
+
+        def start_stage(stage: int) -> bool:
+            # Report the stage that is starting, unless the upload has been cancelled.
+            if is_cancelled and is_cancelled():
+                return False
+            if progress_callback:
+                progress_callback(stages[stage - 1], stage, len(stages))
+            return True
+
+        cancelled = (False, 'Upload Cancelled', 'The upload was cancelled.')
+
+        # Start from nothing, in case the last upload with this GoogleSheetManager did not finish.
+        self.__clean_up()
+
+        if not start_stage(1):
+            return cancelled
+
+        success, message, students, daily_hours = self.__db_manager.get_hours_report_data()
+        if not success:
+            return False, 'Database Error', message
+        self.__report = HoursReport(students, daily_hours)
 
         # Get the Google config info
         success, message, google_config = self.__get_google_config()
@@ -74,6 +167,23 @@ class GoogleSheetManager:
             self.__clean_up()
             return False, 'Google Sheets Error', message
 
+        self.__full_upload = full or str(google_config.get('upload mode', 'delta')).lower() == 'full'
+        self.__cells_uploaded = 0
+        self.__api_calls = 0
+
+        try:
+            self.__rows_per_write = max(1, int(google_config.get('rows per write', ROWS_PER_WRITE)))
+        except (TypeError, ValueError):
+            self.__rows_per_write = ROWS_PER_WRITE
+
+        self.__client.configure(google_config)
+        self.__is_cancelled = is_cancelled
+        retries = self.__get_retries()
+
+        if not start_stage(2):
+            self.__clean_up()
+            return cancelled
+
         # Open the spreadsheet, but wait to open the worksheet
         success, message, wb = self.__open_spreadsheet(google_config)
         if not (success and wb):
@@ -81,32 +191,66 @@ class GoogleSheetManager:
             return False, 'Google Sheets Error', message
 
         # Check if the worksheets exist in the spreadsheet
-        self.__check_spreadsheet(wb, google_config)
+        success, message = self.__check_spreadsheet(wb, google_config)
+        if not success:
+            self.__clean_up()
+            return False, 'Google Sheets Error', message
+
+        if not start_stage(3):
+            self.__clean_up()
+            return cancelled
 
-        # Upload the worksheet of formatted and condensed data
-        success, title, message = self.__upload_worksheet(google_config, wb)
+        # Plan the worksheet of formatted and condensed data
+        success, title, message = self.__upload_worksheet(google_config)
         if not success:
             self.__clean_up()
-            return False, 'Database Error', message
+            return False, title, message
+
+        if not start_stage(4):
+            self.__clean_up()
+            return cancelled
 
-        # Upload the full activity table raw data
-        success, title, message = self.__upload_raw_data_worksheet(google_config, wb)
+        # Plan the full activity table raw data
+        success, title, message = self.__upload_raw_data_worksheet(google_config)
         if not success:
             self.__clean_up()
-            return False, 'Database Error', message
+            return False, title, message
+
+        if not start_stage(5):
+            self.__clean_up()
+            return cancelled
 
-        # Upload the worksheet of daily data
-        success, title, message = self.__upload_daily_worksheet(google_config, wb)
+        # Plan the worksheet of daily data
+        success, title, message = self.__upload_daily_worksheet(google_config)
         if not success:
             self.__clean_up()
-            return False, 'Database Error', message
+            return False, title, message
+
+        if not start_stage(6):
+            self.__clean_up()
+            return cancelled
+
+        # Send everything that was planned for all the worksheets
+        success, message = self.__send_requests(wb)
+        if not success:
+            self.__clean_up()
+            return False, 'Google Sheets Error', message
 
         # Clean it up and return a "successful" message
         self.__clean_up()
 
-        return True, 'Upload Successful', 'The data was uploaded successfully to the Google Sheet.'
+        message = 'The data was uploaded successfully to the Google Sheet.'
+        if not self.__full_upload:
+            message += f' {self.__cells_uploaded} cells were updated.'
+        message += f' The upload used {self.__api_calls} Google Sheets API calls.'
+
+        retries = self.__get_retries() - retries
+        if retries:
+            message += f' Google was busy, so calls were tried again {retries} times.'
+
+        return True, 'Upload Successful', message
 
-    def __upload_worksheet(self, google_config: dict, wb: gspread.Spreadsheet) -> tuple:
+    def __upload_worksheet(self, google_config: dict) -> tuple:
 
         success = False
         message = ''
@@ -115,8 +259,8 @@ class GoogleSheetManager:
         if not ws_name:
             return False, 'Google Sheets Error', 'The "worksheet name" key is missing in config.json file.'
 
-        success, message, ws = self.__open_sheet(wb, ws_name)
-        if not (success and ws):
+        success, message, sheet = self.__open_sheet(ws_name)
+        if not (success and sheet):
             self.__clean_up()
             return False, 'Google Sheets Error', message
 
@@ -128,7 +272,20 @@ class GoogleSheetManager:
 
         self.__create_data_list()
 
-        success, message = self.__remove_data_and_formatting(wb, ws)
+        if self.__data_list:
+            data = [self.__header_list[2]] + self.__data_list
+        else:
+            data = [self.__header_list[2]]
+
+        # Only send the cells that changed since the last upload, if the worksheet still has the same layout.
+        success, message, uploaded = self.__upload_changed_cells(sheet, 'weekly', data, 3, self.__format_sheet)
+        if not success:
+            self.__clean_up()
+            return False, 'Google Sheets Error', message
+        if uploaded:
+            return True, 'Upload Successful', 'The worksheet was planned successfully.'
+
+        success, message = self.__remove_data_and_formatting(sheet)
         if not success:
             self.__clean_up()
             return False, 'Google Sheets Error', message
@@ -139,73 +296,78 @@ class GoogleSheetManager:
         # The order below matters: (1) resize the sheet, (2) format the sheet, (3) enter the data
         # The barcode column must be set to TEXT number format before the data is entered,
         #   otherwise any leading zeros will be lost.
-        success, message = self.__resize_sheet(ws, num_rows, num_cols)
+        success, message = self.__resize_sheet(sheet, num_rows, num_cols)
         if not success:
             self.__clean_up()
             return False, 'Google Sheets Error', message
 
-        success, message = self.__format_sheet(wb, ws)
+        success, message = self.__format_sheet(sheet)
         if not success:
             self.__clean_up()
             return False, 'Google Sheets Error', message
 
-        if self.__data_list:
-            data = [self.__header_list[2]] + self.__data_list
-        else:
-            data = [self.__header_list[2]]
-
-        success, message = self.__enter_data_on_sheet(ws, data)
+        success, message = self.__enter_data_on_sheet(sheet, data)
         if not success:
             self.__clean_up()
             return False, 'Google Sheets Error', message
 
-        return True, 'Upload Successful', 'The worksheet was uploaded successfully to the Google Sheet.'
+        self.__upload_states.append(('weekly', sheet, {'values': data}))
 
-    def __upload_raw_data_worksheet(self, google_config: dict, wb: gspread.Spreadsheet) -> tuple:
-        # Upload raw data sheet
+        return True, 'Upload Successful', 'The worksheet was planned successfully.'
+
+    def __upload_raw_data_worksheet(self, google_config: dict) -> tuple:
+        # Plan the raw data sheet
+        # The rows are read from the database while they are sent, a block at a time, so only the rows of one write
+        #   are held in memory (see __stream_rows()).
 
         raw_data_ws_name = google_config.get('raw data worksheet name')
         if not raw_data_ws_name:
             return False, 'Google Sheets Error', 'The "raw data worksheet name" key is missing in config.json file.'
 
-        success, message, ws_raw_data = self.__open_sheet(wb, raw_data_ws_name)
-        if not (success and ws_raw_data):
+        success, message, raw_data_sheet = self.__open_sheet(raw_data_ws_name)
+        if not (success and raw_data_sheet):
             self.__clean_up()
             return False, 'Google Sheets Error', message
 
-        self.__create_raw_data_list()
+        try:
+            # Only append the new rows if the rows uploaded last time have not changed.
+            success, message, uploaded = self.__upload_new_rows(raw_data_sheet, 'raw data',
+                                                                self.__create_raw_data_rows,
+                                                                self.__format_raw_data_sheet)
+        except sqlite3.Error as e:
+            self.__clean_up()
+            return False, 'Database Error', str(e)
 
-        success, message = self.__remove_data_and_formatting(wb, ws_raw_data)
         if not success:
             self.__clean_up()
             return False, 'Google Sheets Error', message
+        if uploaded:
+            return True, 'Upload Successful', 'The raw data was planned successfully.'
 
-        # The order below matters: (1) resize the sheet, (2) format the sheet, (3) enter the data
-        # The barcode column must be set to TEXT number format before the data is entered,
-        #   otherwise any leading zeros will be lost.
-        num_rows = 1
-        num_cols = 1
-        if len(self.__raw_data_list) > 0:
-            num_rows = len(self.__raw_data_list)
-            num_cols = len(self.__raw_data_list[0])
-
-        success, message = self.__resize_sheet(ws_raw_data, num_rows, num_cols)
+        success, message = self.__remove_data_and_formatting(raw_data_sheet)
         if not success:
+            self.__clean_up()
             return False, 'Google Sheets Error', message
 
-        success, message = self.__format_raw_data_sheet(wb, ws_raw_data)
+        # The order below matters: (1) resize the sheet to the header row, (2) enter the data, which adds the rows
+        #   it needs, (3) format the sheet once it has all the rows.
+        # The cells are entered as text or numbers, so the leading zeros of a barcode are kept before it is formatted.
+        success, message = self.__resize_sheet(raw_data_sheet, 1, len(RAW_DATA_HEADER))
         if not success:
             self.__clean_up()
             return False, 'Google Sheets Error', message
 
-        success, message = self.__enter_data_on_sheet(ws_raw_data, self.__raw_data_list)
+        success, message, rows = self.__create_raw_data_rows()
         if not success:
             self.__clean_up()
-            return False, 'Google Sheets Error', message
+            return False, 'Database Error', message
 
-        return True, 'Upload Successful', 'The data was uploaded successfully to the Google Sheet.'
+        self.__streams.append(self.__stream_rows(raw_data_sheet, 'raw data', rows, 0, hashlib.sha256(b'['),
+                                                 self.__format_raw_data_sheet))
 
-    def __upload_daily_worksheet(self, google_config: dict, wb: gspread.Spreadsheet) -> tuple:
+        return True, 'Upload Successful', 'The raw data was planned successfully.'
+
+    def __upload_daily_worksheet(self, google_config: dict) -> tuple:
 
         success = False
         message = ''
@@ -214,8 +376,8 @@ class GoogleSheetManager:
         if not ws_name:
             return False, 'Google Sheets Error', 'The "worksheet name" key is missing in config.json file.'
 
-        success, message, ws = self.__open_sheet(wb, ws_name)
-        if not (success and ws):
+        success, message, sheet = self.__open_sheet(ws_name)
+        if not (success and sheet):
             self.__clean_up()
             return False, 'Google Sheets Error', message
 
@@ -227,7 +389,20 @@ class GoogleSheetManager:
 
         self.__create_daily_data_list()
 
-        success, message = self.__remove_data_and_formatting(wb, ws)
+        if self.__daily_data_list:
+            data = [self.__daily_header_list] + self.__daily_data_list
+        else:
+            data = [self.__daily_header_list]
+
+        # Only send the cells that changed since the last upload, if the worksheet still has the same layout.
+        success, message, uploaded = self.__upload_changed_cells(sheet, 'daily', data, 2, self.__format_daily_sheet)
+        if not success:
+            self.__clean_up()
+            return False, 'Google Sheets Error', message
+        if uploaded:
+            return True, 'Upload Successful', 'The worksheet was planned successfully.'
+
+        success, message = self.__remove_data_and_formatting(sheet)
         if not success:
             self.__clean_up()
             return False, 'Google Sheets Error', message
@@ -238,32 +413,29 @@ class GoogleSheetManager:
         # The order below matters: (1) resize the sheet, (2) format the sheet, (3) enter the data
         # The barcode column must be set to TEXT number format before the data is entered,
         #   otherwise any leading zeros will be lost.
-        success, message = self.__resize_sheet(ws, num_rows, num_cols)
+        success, message = self.__resize_sheet(sheet, num_rows, num_cols)
         if not success:
             self.__clean_up()
             return False, 'Google Sheets Error', message
 
-        success, message = self.__format_daily_sheet(wb, ws)
+        success, message = self.__format_daily_sheet(sheet)
         if not success:
             self.__clean_up()
             return False, 'Google Sheets Error', message
 
-        if self.__daily_data_list:
-            data = [self.__daily_header_list] + self.__daily_data_list
-        else:
-            data = [self.__daily_header_list]
-
-        success, message = self.__enter_data_on_sheet(ws, data)
+        success, message = self.__enter_data_on_sheet(sheet, data)
         if not success:
             self.__clean_up()
             return False, 'Google Sheets Error', message
 
-        return True, 'Upload Successful', 'The worksheet was uploaded successfully to the Google Sheet.'
+        self.__upload_states.append(('daily', sheet, {'values': data}))
+
+        return True, 'Upload Successful', 'The worksheet was planned successfully.'
 
     def __create_header_list(self) -> None:
         """
         This *private* method creates the header_list which contains 3 sub-lists.
-        The first two lists are needed to create the data_list later and the last list is the Google Sheet header.
+        The last list is the Google Sheet header, and the first two lists show the year and week of each column.
         header_list[0] = ['', '', '', '', year1, year1, year1, ...,  year1,  year2, ... ]
         header_list[1] = ['', '', '', '', week1, week2, week3, ..., week51, week52, ... ]
         header_list[2] = ['Last name', 'First name', 'Barcode', 'Hours', sunday1, sunday2, sunday3, ... ]
@@ -275,38 +447,13 @@ class GoogleSheetManager:
 
         self.__header_list = [['', '', '', ''], ['', '', '', ''], ['Last Name', 'First Name', 'Barcode', 'Hours']]
 
-        if self.__student_hours_list:
-            # This is a sweet way to find the earliest week and latest week with data in the student_hours_list.
-            first = min(self.__student_hours_list, key=lambda x: int(x[3]) + int(x[4]) / 54)
-            last = max(self.__student_hours_list, key=lambda x: int(x[3]) + int(x[4]) / 54)
-
-            # Get the starting week/year and ending week/year
-            start_year = int(first[3])
-            start_week = int(first[4])
-            end_year = int(last[3])
-            end_week = int(last[4])
-
-            # Get the day number of the first sunday of the year
-            start_sunday = (7 - int(datetime(start_year, 1, 1).strftime('%w'))) % 7
-            end_sunday = (7 - int(datetime(end_year, 1, 1).strftime('%w'))) % 7
-
-            # Get the date of the first sunday of the year
-            start_date = datetime(start_year, 1, 1 + start_sunday)
-            end_date = datetime(end_year, 1, 1 + end_sunday)
-
-            # Get the sunday of the starting week/year and ending week/year
-            start_date += timedelta(days=(start_week - 1) * 7)
-            end_date += timedelta(days=(end_week - 1) * 7)
+        # The weeks start on Sunday, so the first date of each week is its Sunday.
+        sundays, matrix, cells = self.__report.get_matrix('week')
 
-            self.__header_list = [['', '', '', ''], ['', '', '', ''], ['Last Name', 'First Name', 'Barcode', 'Hours']]
-
-            # Create the rest of the header_list, adding an element to each sub-list for the corresponding
-            # year, week, and sunday date in range from start_date to end_date
-            while start_date.date() <= end_date.date():
-                self.__header_list[0] += [start_date.strftime('%Y')]
-                self.__header_list[1] += [start_date.strftime('%U')]
-                self.__header_list[2] += [start_date.strftime('%m/%d/%Y')]
-                start_date += timedelta(days=7)
+        for sunday in sundays:
+            self.__header_list[0] += [sunday.strftime('%Y')]
+            self.__header_list[1] += [sunday.strftime('%U')]
+            self.__header_list[2] += [sunday.strftime('%m/%d/%Y')]
 
     def __create_data_list(self) -> None:
         """
@@ -316,69 +463,26 @@ class GoogleSheetManager:
         :return: None
         """
 
-        # Convert the "student_names_and_barcode_list" into a list of lists along with a spot for the total hours
-        # This method will be adding elements to each of these sub-lists, which cannot be done with tuples.
-        # "data_list" will be a list of lists: [ [lastname, firstname, barcode, 0.0], ... ]
-        for record in self.__student_names_and_barcode_list:
-            self.__data_list.append(list(record + (0.0,)))
-
-        data_list_index = 0
-        header_list_index = 4
-
-        for record in self.__student_hours_list:
-            # record = ('lastname', 'firstname', 'barcode', 'year', 'week number', 'week hours')
-
-            # Find the student that this "record" belongs to in the "data_list"
-            # Note: some students may not have any hours yet and must be skipped over
-            while data_list_index < len(self.__data_list) and record[2] != self.__data_list[data_list_index][2]:
-                data_list_index += 1
-                header_list_index = 4
-
-            year = int(record[3])
-            week_num = int(record[4])
-            week_hours = record[5]
-            self.__data_list[data_list_index][3] += week_hours
-
-            # If the week number is 0, then the Sunday at the beginning of that week was in the previous year
-            if week_num == 0:
-                year -= 1
-                week_num = int(datetime(year, 12, 31).strftime('%W'))  # either 52 or 53
-
-                # Check if the last week of the previous year data
-                same_year = (str(year) == str(self.__header_list[0][header_list_index-1]))
-                same_week = (str(week_num) == str(self.__header_list[1][header_list_index-1]))
-
-                if same_year and same_week:
-                    week_hours += self.__data_list[data_list_index].pop()
-                    header_list_index -= 1
+        sundays, self.__data_list = self.__report.get_rows('week', total=True)
 
-            # Append the weekly hours onto the "data_list" for each student
-            # data_list = [ ['lastname', 'firstname', 'barcode', total_hours, week1_hours, week2_hours, ...] ...]
-            # Find the correct column for this "record" in the "data_list"
-            # If a student only worked week 1 and week 3, then a blank needs to be added for week 2.
-            done = False
-            while not done:
-                header_year = int(self.__header_list[0][header_list_index])
-                header_week_num = int(self.__header_list[1][header_list_index])
-
-                if year == header_year and week_num == header_week_num:
-                    # Stop the loop if this is the correct column
-                    done = True
-                else:
-                    # Add a blank if this is not the correct column
-                    self.__data_list[data_list_index] += ['']
+    def __create_raw_data_rows(self) -> tuple:
+        """
+        This *private* method starts reading the rows for the raw data sheet from the database.
 
-                header_list_index += 1
+        :return: (1) was this successful? (2) explanation of failure
+            (3) generator of rows: the header row, then (lastname, firstname, barcode, checkin, checkout, hours), ...
+        """
 
-            # Add this "record" to the "data_list"
-            self.__data_list[data_list_index].append(week_hours)
+        success, message, raw_data = self.__db_manager.get_all_activity_table_rows()
+        if not success:
+            return False, message, iter(())
 
-    def __create_raw_data_list(self) -> None:
-        success, message, raw_data = self.__db_manager.get_all_activity_table_data()
+        return True, '', self.__raw_data_rows(raw_data)
 
-        self.__raw_data_list = [['Last Name', 'First Name', 'Barcode', 'Checkin', 'Checkout', 'Hours']]
-        for tpl in raw_data:
-            self.__raw_data_list = self.__raw_data_list + [list(tpl)]
+    def __raw_data_rows(self, raw_data):
+        # The database generator is closed when this generator is closed.
+        yield RAW_DATA_HEADER
+        yield from raw_data
 
     def __create_daily_header_list(self) -> None:
         """
@@ -391,81 +495,28 @@ class GoogleSheetManager:
         # self.__daily_header_list = ['Last Name', 'First Name', 'Barcode']
         self.__daily_header_list = ['Last Name', 'First Name']
 
-        if self.__daily_hours_list:
-            # This is a sweet way to find the earliest date and latest date with data in the daily_hours_list.
-            first = min(self.__daily_hours_list, key=lambda x: x[3])
-            last = max(self.__daily_hours_list, key=lambda x: x[3])
+        days, matrix, cells = self.__report.get_matrix('day')
 
-            # Convert the date string into a datetime object
-            start_date = datetime.fromisoformat(first[3])
-            end_date = datetime.fromisoformat(last[3])
-
-            # self.__daily_header_list = ['Last Name', 'First Name', 'Barcode']
-            self.__daily_header_list = ['Last Name', 'First Name']
-
-            # Create the rest of the header_list, adding an element to each sub-list for the corresponding
-            # year, week, and sunday date in range from start_date to end_date
-            while start_date.date() <= end_date.date():
-                self.__daily_header_list += [start_date.strftime('%m/%d/%Y')]
-                start_date += timedelta(days=1)
+        self.__daily_header_list += [day.strftime('%m/%d/%Y') for day in days]
 
     def __create_daily_data_list(self) -> None:
         """
         This *private* method creates the daily_data_list which contains multiple lists, one for each student.
-        daily_data_list[0] = ['lastname0', 'firstname0', 'barcode0', 'date1_hours', 'date2_hours', ... ]
+        daily_data_list[0] = ['lastname0', 'firstname0', 'date1_hours', 'date2_hours', ... ]
 
         :return: None
         """
 
-        # Convert the "student_names_and_barcode_list" into a list of lists
-        # This method will be adding elements to each of these sub-lists, which cannot be done with tuples.
-        # "daily_data_list" will be a list of lists: [ [lastname, firstname, barcode], ... ]
-        for record in self.__student_names_and_barcode_list:
-            self.__daily_data_list.append(list(record))
-
-        data_list_index = 0
-        header_list_index = 2
-
-        for record in self.__daily_hours_list:
-            # record = ('lastname', 'firstname', 'barcode', 'date', 'hours')
-
-            # Find the student that this "record" belongs to in the "data_list"
-            # Note: some students may not have any hours yet and must be skipped over
-            while data_list_index < len(self.__daily_data_list) and record[2] != self.__daily_data_list[data_list_index][2]:
-                data_list_index += 1
-                header_list_index = 2
-
-            the_date = datetime.fromisoformat(record[3])
-            daily_hours = record[4]
-
-            # Append the daily hours onto the "daily_data_list" for each student
-            # daily_data_list = [ ['lastname', 'firstname', 'barcode', date1_hours, date2_hours, ...] ...]
-            # Find the correct column for this "record" in the "daily_data_list"
-            # If a student worked day 1 and day 3, then a blank needs to be added for day 2.
-            done = False
-            while not done:
-                # header_year = int(self.__header_list[0][header_list_index])
-                # header_week_num = int(self.__header_list[1][header_list_index])
-
-                # if year == header_year and week_num == header_week_num:
-                if the_date == datetime.strptime(self.__daily_header_list[header_list_index], "%m/%d/%Y"):
-                    # Stop the loop if this is the correct column
-                    done = True
-                else:
-                    # Add a blank if this is not the correct column
-                    self.__daily_data_list[data_list_index] += ['']
-
-                header_list_index += 1
-
-            # Add this "record" to the "data_list"
-            self.__daily_data_list[data_list_index].append(daily_hours)
+        days, self.__daily_data_list = self.__report.get_rows('day')
 
+        # The rows start with [lastname, firstname, barcode], and the barcode is not shown on the daily worksheet.
         for record in self.__daily_data_list:
             record.pop(2)
 
     def __get_google_config(self) -> tuple:
         """
         This *private* method gets the configuration data in order to open the Google Sheet.
+        The config.json file is only read again if it has changed since the last upload.
 
         :return: success, message, config info
         """
@@ -476,6 +527,11 @@ class GoogleSheetManager:
         if not os.path.isfile(config_file):
             return False, 'The config.json file does not exist.', {}
 
+        file_stat = os.stat(config_file)
+        config_file_key = (file_stat.st_mtime_ns, file_stat.st_size)
+        if self.__config_file_key == config_file_key:
+            return True, '', dict(self.__google_config)
+
         # Open the files if it exists.
         with open(config_file, 'r') as fh:
             try:
@@ -487,6 +543,9 @@ class GoogleSheetManager:
                 if not google_config:
                     return False, 'The "google config" key is missing in config.json file.', {}
 
+                self.__config_file_key = config_file_key
+                self.__google_config = dict(google_config)
+
                 return True, '', google_config
 
             except Exception as e:
@@ -494,7 +553,7 @@ class GoogleSheetManager:
 
     def __open_spreadsheet(self, google_config: dict) -> tuple:
         """
-        This *private* method opens the Google Spreadsheet.
+        This *private* method opens the Google Spreadsheet, or reuses the one opened by the last upload.
 
         :param google_config: the google config dictionary to open the Google Spreadsheet
         :return: wb = Google Spreadsheet file
@@ -508,79 +567,131 @@ class GoogleSheetManager:
             folder, file = os.path.split(service_account)
             credential_file = os.path.join(THIS_DIRECTORY, folder, file)
 
-            gspread_client = gspread.service_account(credential_file)
             spreadsheet_url = google_config.get('spreadsheet url')
             if not spreadsheet_url:
                 return False, 'The "spreadsheet url" key is missing in config.json file.', None
 
-            wb = gspread_client.open_by_url(spreadsheet_url)
+            # Reading the credential file and getting an OAuth token is only done again if the file changes.
+            credential_file_key = (credential_file, os.stat(credential_file).st_mtime_ns)
+            if self.__gspread_client is None or self.__credential_file_key != credential_file_key:
+                self.__forget_spreadsheet()
+                self.__gspread_client = gspread.service_account(credential_file)
+                self.__credential_file_key = credential_file_key
+
+            if self.__spreadsheet is None or self.__spreadsheet_url != spreadsheet_url:
+                # gspread reads the spreadsheet properties when it opens the file
+                self.__api_calls += 1
+                self.__spreadsheet = self.__client.read(self.__gspread_client.open_by_url, spreadsheet_url,
+                                                        is_cancelled=self.__is_cancelled)
+                self.__spreadsheet_url = spreadsheet_url
+
+            wb = self.__spreadsheet
+            self.__spreadsheet_id = wb.id
 
             return True, '', wb
         except Exception as e:
+            self.__forget_spreadsheet()
             return False, 'There was an error with the Google Sheets file.', None
 
-    def __check_spreadsheet(self, wb: gspread.Spreadsheet, google_config: dict) -> None:
-        worksheet_exists = False
-        raw_data_worksheet_exists = False
-        daily_worksheet_exists = False
+    def __forget_spreadsheet(self) -> None:
+        """
+        This *private* method drops the gspread client and spreadsheet, so the next upload sets them up again.
+        This is done when a call to Google fails, in case the credentials or the spreadsheet are no longer valid.
 
-        for worksheet in wb.worksheets():
-            if worksheet.title == google_config.get('worksheet name'):
-                worksheet_exists = True
-            elif worksheet.title == google_config.get('raw data worksheet name'):
-                raw_data_worksheet_exists = True
-            elif worksheet.title == google_config.get('daily worksheet name'):
-                daily_worksheet_exists = True
+        :return: None
+        """
 
-        if not worksheet_exists:
-            wb.add_worksheet(google_config.get('worksheet name'), 1, 1)
-        if not raw_data_worksheet_exists:
-            wb.add_worksheet(google_config.get('raw data worksheet name'), 1, 1)
-        if not daily_worksheet_exists:
-            wb.add_worksheet(google_config.get('daily worksheet name'), 1, 1)
+        self.__credential_file_key = None
+        self.__gspread_client = None
+        self.__spreadsheet_url = ''
+        self.__spreadsheet = None
 
-    def __open_sheet(self, wb: gspread.Spreadsheet, ws_name: str) -> tuple:
+    def __check_spreadsheet(self, wb: gspread.Spreadsheet, google_config: dict) -> tuple:
         """
-        This *private* method opens the Google Sheet.
+        This *private* method reads the properties of every worksheet in the spreadsheet with one API call.
+        This is done for every upload, even when the spreadsheet is reused, so a worksheet that was resized,
+        renamed, or deleted by hand is noticed.
+        A worksheet that does not exist yet is added by the same batch_update() that enters the data,
+        so it is given its own sheet id here.
 
-        :param wb: Google Spreadsheet file
-        :param ws_name: Worksheet name
-        :return: ws = one Worksheet in the file
+        :param wb: the Google Spreadsheet file
+        :param google_config: the google config dictionary with the worksheet names
+        :return: (1) was this successful? (2) explanation of failure
         """
+
         try:
-            # See the gspread documentation to open a Google Sheet
-            ws = wb.worksheet(ws_name)
-            return True, '', ws
+            self.__api_calls += 1
+            metadata = self.__client.read(wb.fetch_sheet_metadata, {'fields': 'sheets.properties'},
+                                          is_cancelled=self.__is_cancelled)
         except Exception as e:
+            self.__forget_spreadsheet()
+            return False, 'There was an error with the Google Sheets file.'
+
+        self.__sheets = {}
+        for worksheet in metadata.get('sheets', []):
+            properties = worksheet.get('properties', {})
+            properties.setdefault('gridProperties', {'rowCount': 0, 'columnCount': 0})
+            self.__sheets[properties.get('title')] = properties
+
+        next_sheet_id = max([properties.get('sheetId', 0) for properties in self.__sheets.values()] + [0]) + 1
+
+        for key in ('worksheet name', 'raw data worksheet name', 'daily worksheet name'):
+            ws_name = google_config.get(key)
+            if ws_name and ws_name not in self.__sheets:
+                self.__requests.append({'addSheet': {'properties': {
+                    'sheetId': next_sheet_id,
+                    'title': ws_name,
+                    'gridProperties': {'rowCount': 1, 'columnCount': 1}}}})
+                self.__sheets[ws_name] = {'sheetId': next_sheet_id, 'title': ws_name,
+                                          'gridProperties': {'rowCount': 1, 'columnCount': 1}}
+                next_sheet_id += 1
+
+        return True, ''
+
+    def __open_sheet(self, ws_name: str) -> tuple:
+        """
+        This *private* method finds the properties of a worksheet that were read by __check_spreadsheet().
+
+        :param ws_name: Worksheet name
+        :return: the properties of one Worksheet in the file
+        """
+
+        sheet = self.__sheets.get(ws_name)
+        if not sheet:
             return False, 'There was an error with the Google Sheets file.', None
 
-    def __remove_data_and_formatting(self, wb: gspread.Spreadsheet, ws: gspread.Worksheet) -> tuple:
+        return True, '', sheet
+
+    def __remove_data_and_formatting(self, sheet: dict) -> tuple:
         """
-        This *private* method removes all data and formatting from the sheet.
+        This *private* method plans removing all data and formatting from the sheet.
         Without this, when new rows and columns are added, the format from the existing cells is used.
 
-        :param wb: the Google Spreadsheet file
-        :param ws: the one Google Worksheet in the file
+        :param sheet: the properties of the one Google Worksheet in the file
         :return: None
         """
 
         # See the Google Sheets API and gspread documentation for help
-        sheet_id = ws._properties.get('sheetId')
-        if not sheet_id:
+        sheet_id = sheet.get('sheetId')
+        if sheet_id is None:
             return False, 'There was an error removing the previous data and formatting from the Google Sheet.'
 
+        num_rows = sheet['gridProperties']['rowCount']
+        num_cols = sheet['gridProperties']['columnCount']
+
         lst = []
 
-        # Clear all formatting on the sheet
+        # Clear all data and formatting on the sheet
+        lst.append(self.__clear_values(sheet_id))
         lst.append(self.__clear_formatting(sheet_id))
 
-        if ws.col_count > 0:
+        if num_cols > 0:
             # Reset the column width to 100 pixels (default) so that new columns are added with this default size.
-            lst.append(self.__set_column_width(sheet_id, 0, ws.col_count, 100))
+            lst.append(self.__set_column_width(sheet_id, 0, num_cols, 100))
 
-        if ws.row_count > 0:
+        if num_rows > 0:
             # Reset the row height to 21 pixels (default) so that new rows are added with this default size.
-            lst.append(self.__set_row_height(sheet_id, 0, ws.row_count, 21))
+            lst.append(self.__set_row_height(sheet_id, 0, num_rows, 21))
 
         # Unfreeze rows and columns
         lst.append(self.__set_frozen_rows(sheet_id, 0))
@@ -589,58 +700,50 @@ class GoogleSheetManager:
         # Clear any filters
         lst.append(self.__clear_filter(sheet_id))
 
-        try:
-            # Clear all data on the sheet
-            # ws.clear() cannot be completed with a ws.batch_update() call, so it is done separate
-            response = ws.clear()
-
-            if len(lst) > 0:
-                body = {'requests': lst}
-                wb.batch_update(body)
-            return True, ''
-        except Exception as e:
-            return False, 'There was an error removing the previous data and formatting from the Google Sheet.'
+        self.__requests += lst
+
+        return True, ''
 
-    def __resize_sheet(self, ws: gspread.Worksheet, num_rows: int, num_cols: int) -> tuple:
+    def __resize_sheet(self, sheet: dict, num_rows: int, num_cols: int) -> tuple:
         """
-        This *private* method resizes the worksheet to the given dimensions.
+        This *private* method plans resizing the worksheet to the given dimensions.
 
-        :param ws: the one Google Worksheet in the file
+        :param sheet: the properties of the one Google Worksheet in the file
         :param num_rows: number of rows
         :param num_cols: number of columns
         :return: None
         """
-        try:
-            if num_rows > 0 and num_cols > 0:
-                # ws.resize() calls batch_update
-                response = ws.resize(rows=num_rows, cols=num_cols)
-
-                # NOTE: ws.resize() has a known BUG, it does not update the ws.row_count and ws.col_count properties
-                #   of the gspread.Worksheet object. Some gspread methods rely on these properties.
-                #   So the following two statements update those properties.
-                ws._properties['gridProperties']['rowCount'] = num_rows
-                ws._properties['gridProperties']['columnCount'] = num_cols
-            return True, ''
-        except Exception as e:
-            return False, 'There was an error resizing the Google Sheet.'
 
-    def __format_sheet(self, wb: gspread.Spreadsheet, ws: gspread.Worksheet) -> tuple:
+        if num_rows > 0 and num_cols > 0:
+            self.__requests.append({'updateSheetProperties': {
+                'properties': {
+                    'sheetId': sheet['sheetId'],
+                    'gridProperties': {'rowCount': num_rows, 'columnCount': num_cols}},
+                'fields': 'gridProperties(rowCount,columnCount)'}})
+
+            # The formatting planned after this uses the new size of the sheet.
+            sheet['gridProperties']['rowCount'] = num_rows
+            sheet['gridProperties']['columnCount'] = num_cols
+
+        return True, ''
+
+    def __format_sheet(self, sheet: dict) -> tuple:
         """
-        This *private* method formats the worksheet.
-        :param wb: the Google Spreadsheet file
-        :param ws: the one Google Worksheet in the file
+        This *private* method plans formatting the worksheet.
+        :param sheet: the properties of the one Google Worksheet in the file
         :return: None
         """
 
         # NOTE: The gspread method ws.format() could also be used to do the first six formats below.
         # However, each call to ws.format() would use a separate batch_update() API call.
-        # So this uses the native Google Sheets API approach, but it only requires one batch_update() at the end.
-        num_rows = ws.row_count
-        num_cols = ws.col_count
+        # So this uses the native Google Sheets API approach, and the requests are sent with the one batch_update()
+        #   at the end of the upload.
+        num_rows = sheet['gridProperties']['rowCount']
+        num_cols = sheet['gridProperties']['columnCount']
 
         # See the Google Sheets API and gspread documentation for help
-        sheet_id = ws._properties.get('sheetId')
-        if not sheet_id:
+        sheet_id = sheet.get('sheetId')
+        if sheet_id is None:
             return False, 'There was an error formatting the WorkSheet.'
 
         lst = []
@@ -692,31 +795,27 @@ class GoogleSheetManager:
             # Row 1 and Columns A:D - Set to frozen
             lst.append(self.__set_frozen_columns(sheet_id, 4))
 
-        try:
-            if len(lst) > 0:
-                body = {'requests': lst}
-                wb.batch_update(body)
-            return True, ''
-        except Exception as e:
-            return False, 'There was an error formatting the WorkSheet.'
+        self.__requests += lst
+
+        return True, ''
 
-    def __format_raw_data_sheet(self, wb: gspread.Spreadsheet, ws: gspread.Worksheet) -> tuple:
+    def __format_raw_data_sheet(self, sheet: dict) -> tuple:
         """
-        This *private* method formats the worksheet.
-        :param wb: the Google Spreadsheet file
-        :param ws: the one Google Worksheet in the file
+        This *private* method plans formatting the worksheet.
+        :param sheet: the properties of the one Google Worksheet in the file
         :return: None
         """
 
         # NOTE: The gspread method ws.format() could also be used to do the first six formats below.
         # However, each call to ws.format() would use a separate batch_update() API call.
-        # So this uses the native Google Sheets API approach, but it only requires one batch_update() at the end.
-        num_rows = ws.row_count
-        num_cols = ws.col_count
+        # So this uses the native Google Sheets API approach, and the requests are sent with the one batch_update()
+        #   at the end of the upload.
+        num_rows = sheet['gridProperties']['rowCount']
+        num_cols = sheet['gridProperties']['columnCount']
 
         # See the Google Sheets API and gspread documentation for help
-        sheet_id = ws._properties.get('sheetId')
-        if not sheet_id:
+        sheet_id = sheet.get('sheetId')
+        if sheet_id is None:
             return False, 'There was an error formatting the Raw Data Sheet.'
 
         lst = []
@@ -745,31 +844,27 @@ class GoogleSheetManager:
             # Cells F2:F? - Set number format to NUMBER with 2 decimals.
             lst.append(self.__set_number_format(sheet_id, 1, num_rows, 5, 6, 'NUMBER', '0.00'))
 
-        try:
-            if len(lst) > 0:
-                body = {'requests': lst}
-                wb.batch_update(body)
-            return True, ''
-        except Exception as e:
-            return False, 'There was an error formatting the Raw Data Sheet.'
+        self.__requests += lst
 
-    def __format_daily_sheet(self, wb: gspread.Spreadsheet, ws: gspread.Worksheet) -> tuple:
+        return True, ''
+
+    def __format_daily_sheet(self, sheet: dict) -> tuple:
         """
-        This *private* method formats the worksheet.
-        :param wb: the Google Spreadsheet file
-        :param ws: the one Google Worksheet in the file
+        This *private* method plans formatting the worksheet.
+        :param sheet: the properties of the one Google Worksheet in the file
         :return: None
         """
 
         # NOTE: The gspread method ws.format() could also be used to do the first six formats below.
         # However, each call to ws.format() would use a separate batch_update() API call.
-        # So this uses the native Google Sheets API approach, but it only requires one batch_update() at the end.
-        num_rows = ws.row_count
-        num_cols = ws.col_count
+        # So this uses the native Google Sheets API approach, and the requests are sent with the one batch_update()
+        #   at the end of the upload.
+        num_rows = sheet['gridProperties']['rowCount']
+        num_cols = sheet['gridProperties']['columnCount']
 
         # See the Google Sheets API and gspread documentation for help
-        sheet_id = ws._properties.get('sheetId')
-        if not sheet_id:
+        sheet_id = sheet.get('sheetId')
+        if sheet_id is None:
             return False, 'There was an error formatting the WorkSheet.'
 
         lst = []
@@ -814,13 +909,9 @@ class GoogleSheetManager:
             # Columns A:B - Set to frozen
             lst.append(self.__set_frozen_columns(sheet_id, 2))
 
-        try:
-            if len(lst) > 0:
-                body = {'requests': lst}
-                wb.batch_update(body)
-            return True, ''
-        except Exception as e:
-            return False, 'There was an error formatting the WorkSheet.'
+        self.__requests += lst
+
+        return True, ''
 
     def __set_column_width(self, sheet_id: int, start_index: int, end_index: int, pixel_size: int) -> dict:
         return {'updateDimensionProperties': {
@@ -899,30 +990,396 @@ class GoogleSheetManager:
             'range': {'sheetId': sheet_id},
             'fields': 'userEnteredFormat'}}
 
+    def __clear_values(self, sheet_id: int) -> dict:
+        return {'updateCells': {
+            'range': {'sheetId': sheet_id},
+            'fields': 'userEnteredValue'}}
+
     def __clear_filter(self, sheet_id: int) -> dict:
         return {'clearBasicFilter': {'sheetId': sheet_id}}
 
-    def __enter_data_on_sheet(self, ws: gspread.Worksheet, data: list) -> tuple:
+    def __enter_data_on_sheet(self, sheet: dict, data) -> tuple:
+        """
+        This *private* method plans entering the data into the worksheet, starting at cell A1.
+        The rows are read one at a time and planned in blocks of ROWS_PER_REQUEST rows, so the data can be
+        a generator and is never copied as a whole.
+
+        :param sheet: the properties of the one Google Worksheet in the file
+        :param data: the rows of data, a list or any other iterable
+        :return: None
+        """
+
+        row_index = 0
+        for rows in self.__blocks(data):
+            self.__requests.append(self.__update_cells(sheet['sheetId'], row_index, 0, rows))
+            self.__cells_uploaded += sum(len(row) for row in rows)
+            row_index += len(rows)
+
+        return True, ''
+
+    def __upload_changed_cells(self, sheet: dict, name: str, data: list, key_columns: int, format_method) -> tuple:
+        """
+        This *private* method plans entering only the cells that changed since the last upload.
+        This is only possible if the worksheet has the same rows as last time (the same students in the same order)
+        and the same columns, or the same columns with new weeks or days added at the end.
+        Otherwise, nothing is planned and the whole worksheet must be rewritten.
+
+        :param sheet: the properties of the one Google Worksheet in the file
+        :param name: the name of the upload state for this worksheet
+        :param data: the header row followed by the data rows
+        :param key_columns: the number of columns at the start of each row that identify the student
+        :param format_method: the method that formats the worksheet, used if columns are added
+        :return: (1) was this successful? (2) explanation of failure (3) was the worksheet planned?
+        """
+
+        if self.__full_upload:
+            return True, '', False
+
+        previous = self.__load_upload_state(name, sheet).get('values')
+        if not previous:
+            return True, '', False
+
+        # Compare the data the same way it was saved, so rows that are tuples match the saved lists.
+        data = json.loads(json.dumps(data, default=str))
+
+        num_rows = len(data)
+        num_cols = len(data[0])
+        previous_cols = len(previous[0])
+
+        # The worksheet must still be the size it was after the last upload, otherwise it was changed by hand.
+        grid = sheet['gridProperties']
+        if grid['rowCount'] != len(previous) or grid['columnCount'] != previous_cols:
+            return True, '', False
+
+        # New weeks or days can only be added at the end, and the students must be the same and in the same order.
+        if num_rows != len(previous) or num_cols < previous_cols or data[0][:previous_cols] != previous[0]:
+            return True, '', False
+
+        for row, previous_row in zip(data[1:], previous[1:]):
+            if row[:key_columns] != previous_row[:key_columns]:
+                return True, '', False
+
+        # The order below matters, just like a full upload: (1) resize the sheet, (2) format the sheet,
+        #   (3) enter the data
+        if num_cols > previous_cols:
+            success, message = self.__resize_sheet(sheet, num_rows, num_cols)
+            if not success:
+                return success, message, False
+
+            success, message = format_method(sheet)
+            if not success:
+                return success, message, False
+
+        for row_index, col_index, values in self.__get_changed_ranges(previous, data, num_cols):
+            self.__requests.append(self.__update_cells(sheet['sheetId'], row_index, col_index, [values]))
+            self.__cells_uploaded += len(values)
+
+        self.__upload_states.append((name, sheet, {'values': data}))
+
+        return True, '', True
+
+    def __upload_new_rows(self, sheet: dict, name: str, create_rows, format_method) -> tuple:
+        """
+        This *private* method plans appending only the rows that are new since the last upload.
+        This is only possible if the rows uploaded last time are still the first rows of the data.
+        Otherwise, nothing is planned and the whole worksheet must be rewritten.
+
+        The rows uploaded last time are only read and hashed now, and reading stops as soon as they do not match.
+        The new rows are read while they are sent (see __stream_rows()).
+        If the last upload stopped part way through writing the worksheet, this continues it from the last block
+        that was written, even for a full upload.
+
+        :param sheet: the properties of the one Google Worksheet in the file
+        :param name: the name of the upload state for this worksheet
+        :param create_rows: the method that starts reading the header row followed by the data rows
+        :param format_method: the method that formats the worksheet, used if rows are added
+        :return: (1) was this successful? (2) explanation of failure (3) was the worksheet planned?
+        """
+
+        previous_state = self.__load_upload_state(name, sheet)
+        previous_rows = previous_state.get('rows', 0)
+        complete = previous_state.get('complete', True)
+        if not previous_rows or (self.__full_upload and complete):
+            return True, '', False
+
+        # The worksheet must still be the size it was after the last upload, otherwise it was changed by hand.
+        grid = sheet['gridProperties']
+        if grid['rowCount'] != previous_rows:
+            return True, '', False
+
+        success, message, rows = create_rows()
+        if not success:
+            return False, message, False
+
+        # A session that was changed or removed, or that belongs before the rows already uploaded, means
+        #   the rows uploaded last time are not the same, so the whole worksheet is rewritten.
+        hasher = hashlib.sha256(b'[')
+        num_rows = 0
+        for row in itertools.islice(rows, previous_rows):
+            if grid['columnCount'] != len(row):
+                break
+            self.__add_to_hash(hasher, row, num_rows)
+            num_rows += 1
+
+        if num_rows != previous_rows or self.__hash_digest(hasher) != previous_state.get('hash'):
+            rows.close()
+            return True, '', False
+
+        self.__streams.append(self.__stream_rows(sheet, name, rows, previous_rows, hasher, format_method, complete))
+
+        return True, '', True
+
+    def __get_changed_ranges(self, previous: list, data: list, num_cols: int) -> list:
+        """
+        This *private* method compares the data uploaded last time with the data to upload now.
+        Each run of changed cells in a row becomes one range, so a student with several changed weeks next
+        to each other is sent as one range.
+
+        :param previous: the rows uploaded last time
+        :param data: the rows to upload now, with the same number of rows
+        :param num_cols: the number of columns to compare
+        :return: a list of ranges: [ (row index, column index, [value, value, ...]), ... ]
+        """
+
+        updates = []
+        for row_index, (row, previous_row) in enumerate(zip(data, previous)):
+            # Rows are only as long as the last column with hours, so the missing cells are blank.
+            row = list(row) + [''] * (num_cols - len(row))
+            previous_row = list(previous_row) + [''] * (num_cols - len(previous_row))
+
+            col_index = 0
+            while col_index < num_cols:
+                if row[col_index] == previous_row[col_index]:
+                    col_index += 1
+                    continue
+
+                start_index = col_index
+                while col_index < num_cols and row[col_index] != previous_row[col_index]:
+                    col_index += 1
+
+                updates.append((row_index, start_index, row[start_index:col_index]))
+
+        return updates
+
+    def __update_cells(self, sheet_id: int, row_index: int, column_index: int, rows: list) -> dict:
+        return {'updateCells': {
+            'start': {'sheetId': sheet_id, 'rowIndex': row_index, 'columnIndex': column_index},
+            'rows': [self.__row_data(row) for row in rows],
+            'fields': 'userEnteredValue'}}
+
+    def __row_data(self, row: list) -> dict:
+        return {'values': [self.__cell_data(value) for value in row]}
+
+    def __cell_data(self, value) -> dict:
+        """
+        This *private* method converts one value into a cell for an updateCells request.
+        These requests do not parse the values like ws.update(raw=False) does, so the dates are converted
+        into Google Sheets date numbers here. Everything else that is not a number stays text, which also
+        keeps the leading zeros of a barcode.
+
+        :param value: a number, a string, or a date string ('mm/dd/yyyy' or 'yyyy-mm-dd hh:mm:ss')
+        :return: the cell data
+        """
+
+        if value is None or value == '':
+            return {}
+
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return {'userEnteredValue': {'numberValue': value}}
+
+        value = str(value)
+        if DATE_PATTERN.match(value):
+            date = datetime.strptime(value, '%m/%d/%Y')
+        elif DATE_TIME_PATTERN.match(value):
+            date = datetime.fromisoformat(value)
+        else:
+            return {'userEnteredValue': {'stringValue': value}}
+
+        return {'userEnteredValue': {'numberValue': (date - SHEETS_EPOCH) / timedelta(days=1)}}
+
+    def __stream_rows(self, sheet: dict, name: str, rows, start_row: int, hasher, format_method,
+                      formatted: bool = True):
+        """
+        This *private* generator plans entering the rows into the worksheet, starting at start_row, while they are
+        sent by __send_requests(). Each block of rows adds the rows it needs to the sheet and enters the data.
+        After each block, it yields the upload state for the rows entered so far, which is saved once that block
+        has been written. If the upload fails part way through, the next upload continues from the last block that
+        was written (see __upload_new_rows()). The sheet is formatted after the last block.
+
+        :param sheet: the properties of the one Google Worksheet in the file
+        :param name: the name of the upload state for this worksheet
+        :param rows: the rows to enter, which is closed at the end
+        :param start_row: the index of the row where the first row is entered
+        :param hasher: the hash of the rows before start_row
+        :param format_method: the method that formats the worksheet
+        :param formatted: were the rows before start_row formatted?
+        :return: generator of (number of rows planned, upload state)
         """
-        This *private* method enters the data into the worksheet.
 
-        :param ws: the one Google Worksheet in the file
-        :return:
+        grid = sheet['gridProperties']
+        num_rows = start_row
+
+        with closing(rows):
+            for block in self.__blocks(rows, min(ROWS_PER_REQUEST, self.__rows_per_write)):
+                # The sheet is grown to an exact number of rows and the block is entered at an exact row, rather
+                #   than appended, so sending the same requests twice (e.g. after a timeout) gives the same sheet.
+                if num_rows + len(block) > grid['rowCount']:
+                    grid['rowCount'] = num_rows + len(block)
+                    self.__requests.append({'updateSheetProperties': {
+                        'properties': {'sheetId': sheet['sheetId'], 'gridProperties': {'rowCount': grid['rowCount']}},
+                        'fields': 'gridProperties.rowCount'}})
+
+                self.__requests.append(self.__update_cells(sheet['sheetId'], num_rows, 0, block))
+                self.__cells_uploaded += sum(len(row) for row in block)
+
+                for row in block:
+                    self.__add_to_hash(hasher, row, num_rows)
+                    num_rows += 1
+
+                yield len(block), (name, sheet, {'rows': num_rows, 'hash': self.__hash_digest(hasher),
+                                                 'complete': False})
+
+        if num_rows > start_row or not formatted:
+            success, message = format_method(sheet)
+            if not success:
+                raise ValueError(message)
+
+        yield 0, (name, sheet, {'rows': num_rows, 'hash': self.__hash_digest(hasher)})
+
+    def __send_requests(self, wb: gspread.Spreadsheet) -> tuple:
+        """
+        This *private* method sends all the planned requests for every worksheet with one batch_update() API call.
+        The requests are applied in order and all together, so either every worksheet is updated or none are.
+        The upload state of each worksheet is only saved once the requests have been applied.
+
+        The raw data rows are planned while they are sent. When the rows planned since the last call reach
+        "rows per write", they are sent with their own batch_update() call, so a large raw data sheet takes
+        several calls, each one waiting for the rate limit like any other call. If one of them fails,
+        the blocks already written are kept, and the next upload continues from there.
+
+        :param wb: the Google Spreadsheet file
+        :return: (1) was this successful? (2) explanation of failure
         """
 
         try:
-            response = ws.update('A1', data, raw=False)
-            return True, ''
-        except Exception as e:
-            return False, 'There was an error entering the data on the Google Sheet.'
+            num_rows = 0
+            for stream in self.__streams:
+                for block_rows, upload_state in stream:
+                    self.__upload_states.append(upload_state)
+                    num_rows += block_rows
+                    if num_rows >= self.__rows_per_write:
+                        success, message = self.__send_batch(wb)
+                        if not success:
+                            return success, message
+                        num_rows = 0
+        except sqlite3.Error as e:
+            return False, f'There was an error reading the raw data: {e}'
+        except ValueError as e:
+            return False, str(e)
+
+        return self.__send_batch(wb)
+
+    def __send_batch(self, wb: gspread.Spreadsheet) -> tuple:
+        """
+        This *private* method sends the requests planned so far with one batch_update() API call.
+        The upload states are saved once the requests have been applied, only the last one for each worksheet.
+
+        :param wb: the Google Spreadsheet file
+        :return: (1) was this successful? (2) explanation of failure
+        """
+
+        if self.__requests:
+            # Adding a worksheet cannot be repeated, so a batch that adds one is not sent again if the network fails.
+            #   Every other request sets exact rows, cells, and properties, so it can safely be sent again.
+            idempotent = not any('addSheet' in request for request in self.__requests)
+            try:
+                self.__api_calls += 1
+                self.__client.write(wb.batch_update, {'requests': self.__requests}, is_cancelled=self.__is_cancelled,
+                                    idempotent=idempotent)
+            except Exception as e:
+                self.__forget_spreadsheet()
+                return False, 'There was an error updating the Google Sheet.'
+
+        upload_states = {name: (sheet, state) for name, sheet, state in self.__upload_states}
+        for name, (sheet, state) in upload_states.items():
+            self.__save_upload_state(name, sheet, state)
+
+        self.__requests.clear()
+        self.__upload_states.clear()
+
+        return True, ''
+
+    def __load_upload_state(self, name: str, sheet: dict) -> dict:
+        """
+        This *private* method gets what was uploaded to this worksheet the last time.
+        The state is ignored if it was saved for a different worksheet or spreadsheet.
+
+        :param name: the name of the upload state for this worksheet
+        :param sheet: the properties of the one Google Worksheet in the file
+        :return: the upload state, or an empty dictionary
+        """
+
+        success, message, value = self.__db_manager.get_upload_state(name)
+        if not (success and value):
+            return {}
+
+        try:
+            state = json.loads(value)
+        except ValueError:
+            return {}
+
+        if state.get('sheet') != f'{self.__spreadsheet_id}/{sheet["sheetId"]}':
+            return {}
+
+        return state
+
+    def __save_upload_state(self, name: str, sheet: dict, state: dict) -> None:
+        """
+        This *private* method saves what was uploaded to this worksheet, for the next upload.
+
+        :param name: the name of the upload state for this worksheet
+        :param sheet: the properties of the one Google Worksheet in the file
+        :param state: the upload state
+        :return: None
+        """
+
+        state['sheet'] = f'{self.__spreadsheet_id}/{sheet["sheetId"]}'
+        self.__db_manager.set_upload_state(name, json.dumps(state, default=str))
+
+    def __get_retries(self) -> int:
+        stats = self.__client.get_stats()
+        return stats['read']['retries'] + stats['write']['retries']
+
+    def __add_to_hash(self, hasher, row, row_index: int) -> None:
+        # The rows are hashed one at a time, so they can be compared with the next upload without keeping them.
+        # The hash is the same as hashing the whole list of rows at once as JSON.
+        hasher.update(((', ' if row_index else '') + json.dumps(row, default=str)).encode())
+
+    def __hash_digest(self, hasher) -> str:
+        hasher = hasher.copy()
+        hasher.update(b']')
+        return hasher.hexdigest()
+
+    def __blocks(self, rows, size: int = ROWS_PER_REQUEST):
+        # Split the rows into lists of up to size rows, reading them one at a time.
+        rows = iter(rows)
+        while True:
+            block = list(itertools.islice(rows, size))
+            if not block:
+                return
+            yield block
 
     def __clean_up(self):
-        gc.enable()
-        self.__student_names_and_barcode_list.clear()
-        self.__student_hours_list.clear()
+        self.__report = None
         self.__header_list.clear()
         self.__data_list.clear()
-        self.__raw_data_list.clear()
         self.__daily_header_list.clear()
         self.__daily_data_list.clear()
-        gc.collect()
+        self.__requests.clear()
+        self.__sheets.clear()
+        self.__upload_states.clear()
+
+        # Close the raw data rows that were not sent, which releases the database cursor.
+        for stream in self.__streams:
+            stream.close()
+        self.__streams.clear()
@@ -0,0 +1,167 @@
+from array import array
+from datetime import date, timedelta
+
+# The activity table numbers the days from 1970-01-01 (checkin_day) and the weeks from the Sunday before it
+#   (checkin_week = (checkin_day + 4) // 7), because 1970-01-01 was a Thursday.
+EPOCH = date(1970, 1, 1)
+
+# The periods that the hours can be added up by. The season is every day with hours, in one column.
+PERIODS = ('day', 'week', 'month', 'season')
+
+
+class HoursReport:
+    """This class adds up the hours the students logged into a table with one row for each student and one column
+    for each day, week, or month, or one column for the whole season. The Google Sheet and any other report use
+    the same HoursReport, so the database is only read once and the hours only added up once for each period.
+
+    The hours are loaded from the daily_hours table into three arrays, with one value for each student and day:
+    the row of the student, the day number, and the hours in hundredths of an hour (centihours). Adding them up by
+    a period is a plain Python loop over the arrays. The column of each day is only worked out once for each
+    distinct day, and the columns and the totals of each period are kept, so a period is only added up once.
+    The hours are added as whole hundredths, so the totals do not build up floating point errors.
+    """
+
+    def __init__(self, students: list, daily_hours: list):
+        """
+        :param students: one tuple for each row, [ (lastname, firstname, barcode), ... ]
+        :param daily_hours: the hours for each student and day, [ (barcode, day number, centihours), ... ]
+            The hours of a barcode that is not in the students are left out.
+        """
+
+        self.__students = [tuple(student) for student in students]
+
+        # { barcode: row index }
+        row_index = dict()
+        for index, student in enumerate(self.__students):
+            row_index.setdefault(student[2], index)
+
+        self.__rows = array('l')
+        self.__days = array('l')
+        self.__centihours = array('q')
+
+        for barcode, day, centihours in daily_hours:
+            index = row_index.get(barcode)
+            if index is None:
+                continue
+
+            self.__rows.append(index)
+            self.__days.append(day)
+            self.__centihours.append(centihours)
+
+        # { period: array of the column number of each day in the arrays above }
+        self.__keys = dict()
+
+        # { period: (column dates, hours, cells with hours) } so each period is only added up once.
+        self.__matrices = dict()
+
+    def get_students(self) -> list:
+        return self.__students
+
+    def get_matrix(self, period: str) -> tuple:
+        """
+        This method adds up the hours of each student by the period.
+        There is a column for every period from the first one with hours to the last one, even if nobody
+        logged any hours in it.
+
+        :param period: 'day', 'week', 'month', or 'season'
+        :return: (1) the first date of each column: [ date1, date2, ... ]
+            (2) the centihours, one array for each student with one value for each column
+            (3) the cells with hours, one bytearray for each student, 1 if the student logged a session in that column
+        """
+
+        if period not in PERIODS:
+            raise ValueError(f'The period must be one of {", ".join(PERIODS)}, not "{period}".')
+
+        if period not in self.__matrices:
+            self.__matrices[period] = self.__create_matrix(period)
+
+        return self.__matrices[period]
+
+    def get_rows(self, period: str, total: bool = False) -> tuple:
+        """
+        This method returns the hours by the period as the rows of a worksheet.
+        Each row ends at its last cell with hours, and the cells without hours are blank.
+
+        :param period: 'day', 'week', 'month', or 'season'
+        :param total: add a column with the total hours of each student after the barcode
+        :return: (1) the first date of each column of hours: [ date1, date2, ... ]
+            (2) one row for each student: [ lastname, firstname, barcode, (total,) hours1, '', hours3, ... ]
+        """
+
+        dates, matrix, cells = self.get_matrix(period)
+
+        rows = []
+        for student, centihours, has_hours in zip(self.__students, matrix, cells):
+            row = list(student)
+            if total:
+                row.append(sum(centihours) / 100)
+
+            last_column = has_hours.rfind(1)
+            row += [centihours[column] / 100 if has_hours[column] else '' for column in range(last_column + 1)]
+            rows.append(row)
+
+        return dates, rows
+
+    def __get_keys(self, period: str) -> array:
+        """
+        This *private* method numbers the column of each day in the arrays by the period: the day number,
+        the week number, year * 12 + month, or 0 for the season.
+
+        :param period: 'day', 'week', 'month', or 'season'
+        :return: one column number for each day in the arrays
+        """
+
+        if period not in self.__keys:
+            if period == 'day':
+                keys = self.__days
+            elif period == 'season':
+                keys = array('l', [0]) * len(self.__days)
+            else:
+                # Each distinct day is only converted once, no matter how many students logged hours that day.
+                columns = dict()
+                for day in set(self.__days):
+                    if period == 'week':
+                        columns[day] = (day + 4) // 7
+                    else:
+                        the_date = EPOCH + timedelta(days=day)
+                        columns[day] = the_date.year * 12 + the_date.month - 1
+                keys = array('l', map(columns.__getitem__, self.__days))
+
+            self.__keys[period] = keys
+
+        return self.__keys[period]
+
+    def __create_matrix(self, period: str) -> tuple:
+        """
+        This *private* method adds up the hours of each student by the period. See get_matrix().
+
+        :param period: 'day', 'week', 'month', or 'season'
+        :return: (1) the first date of each column (2) the centihours (3) the cells with hours
+        """
+
+        # The columns start at the first one with hours.
+        keys = self.__get_keys(period)
+        if keys:
+            first_key = min(keys)
+            num_columns = max(keys) - first_key + 1
+        else:
+            first_key = 0
+            num_columns = 0
+
+        if period == 'day':
+            dates = [EPOCH + timedelta(days=key) for key in range(first_key, first_key + num_columns)]
+        elif period == 'week':
+            dates = [EPOCH + timedelta(days=key * 7 - 4) for key in range(first_key, first_key + num_columns)]
+        elif period == 'month':
+            dates = [date(key // 12, key % 12 + 1, 1) for key in range(first_key, first_key + num_columns)]
+        else:
+            dates = [EPOCH + timedelta(days=min(self.__days))] if num_columns else []
+
+        matrix = [array('q', [0]) * num_columns for student in self.__students]
+        cells = [bytearray(num_columns) for student in self.__students]
+
+        for row, key, centihours in zip(self.__rows, keys, self.__centihours):
+            matrix[row][key - first_key] += centihours
+            cells[row][key - first_key] = 1
+
+        return dates, matrix, cells
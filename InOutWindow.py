@@ -1,10 +1,9 @@
-import gc
 import platform
 from PyQt5 import QtWidgets as qtw
 from PyQt5 import QtCore as qtc
 from PyQt5 import QtGui as qtg
 from gui.Ui_InOutWindow import Ui_InOutWindow
-from DatabaseManager import DatabaseManager
+from DatabaseWorker import DatabaseWorker
 
 
 class HoursTableModel(qtc.QAbstractTableModel):
@@ -136,7 +135,7 @@ class InOutWindow(qtw.QWidget, Ui_InOutWindow):
     # Signal to indicate that the Check In/Out window was closed.
     window_closed = qtc.pyqtSignal(str)
 
-    def __init__(self, parent: qtw.QWidget, db_manager: DatabaseManager):
+    def __init__(self, parent: qtw.QWidget, db_worker: DatabaseWorker):
         super().__init__(parent)
         self.setupUi(self)
 
@@ -145,7 +144,7 @@ class InOutWindow(qtw.QWidget, Ui_InOutWindow):
         self.setWindowFlag(qtc.Qt.Dialog)                # dialog box without min or max buttons
         self.setWindowFlag(qtc.Qt.FramelessWindowHint)   # borderless window that cannot be resized
 
-        self.__db_manager = db_manager
+        self.__db_worker = db_worker
         self.__barcode = ''
         self.__status = ''
 
@@ -173,17 +172,13 @@ class InOutWindow(qtw.QWidget, Ui_InOutWindow):
 
         self.hide()
 
-    def __config_window(self):
-        # "data" is a 4-tuple: (firstname, lastname, status, total_hours)
-        success, message, data = self.__db_manager.get_student_data(self.__barcode)
-
+    def __config_window(self, student_data: tuple, hours_table_model: list, total_hours: float):
+        # "student_data" is a 4-tuple: (firstname, lastname, status, checkin)
         # Set the data to display in the Check In/Out window.
-        self.studentName.setText(data[0] + ' ' + data[1])
-        self.__status = data[2]
-        # self.totalHours.setNum(data[3])
+        self.studentName.setText(student_data[0] + ' ' + student_data[1])
+        self.__status = student_data[2]
 
         # The "hours_table_model" is a list of 3-tuples:  [ ('day of week', 'date', 'hours'), ... ]
-        success, message, hours_table_model, total_hours = self.__db_manager.get_student_hours_table(self.__barcode)
         self.totalHours.setNum(total_hours)
 
         if not hours_table_model:
@@ -204,9 +199,19 @@ class InOutWindow(qtw.QWidget, Ui_InOutWindow):
             self.set_button_state(self.checkinButton, '', True)
             self.set_button_state(self.checkoutButton, 'Not Checked In', False)
 
-    def show_window(self, barcode: str):
+    def show_window(self, barcode: str, student_data: tuple, hours_table: list, total_hours: float):
+        """
+        This method displays the Check In/Out window using the data from DatabaseManager.get_scan_snapshot().
+
+        :param barcode: the barcode scanned
+        :param student_data: a 4-tuple: (firstname, lastname, status, checkin)
+        :param hours_table: a list of 3-tuples: [ ('day of week', 'date', 'hours'), ... ]
+        :param total_hours: the total hours in the hours table
+        :return: None
+        """
+
         self.__barcode = barcode
-        self.__config_window()
+        self.__config_window(student_data, hours_table, total_hours)
         if platform.system() == 'Windows':
             self.show()
         else:
@@ -222,16 +227,27 @@ class InOutWindow(qtw.QWidget, Ui_InOutWindow):
         """
 
         # Determine which button was clicked and set the message to be displayed.
+        method_name = ''
+        message = ''
         if button_name == 'Cancel':
             message = 'Cancelled.'
         elif button_name == 'Check In' and self.__status == 'Checked Out':
-            success, message = self.__db_manager.checkin_student(self.__barcode)
+            method_name = 'checkin_student'
         elif button_name == 'Check Out' and self.__status == 'Checked In':
-            success, message = self.__db_manager.checkout_student(self.__barcode)
+            method_name = 'checkout_student'
         else:
             message = 'Nothing done.'
 
-        self.window_closed.emit(message)
+        # The check in or check out is queued on the database thread, so the window closes right away.
+        # The "window_closed" signal is emitted with the message once the database has been updated.
+        if method_name:
+            submitted = self.__db_worker.submit(method_name, (self.__barcode, ),
+                                                lambda result: self.window_closed.emit(result[1]))
+            if not submitted:
+                message = 'Database busy. Try Again.'
+
+        if message:
+            self.window_closed.emit(message)
         self.hide()
         self.__clean_up()
 
@@ -258,13 +274,11 @@ class InOutWindow(qtw.QWidget, Ui_InOutWindow):
             button.setFont(font)
 
     def __clean_up(self):
-        gc.enable()
         self.__barcode = ''
         self.__status = ''
         self.__table_model.beginResetModel()
         self.__table_model.resetData([('', '', '')])
         self.__table_model.endResetModel()
-        gc.collect()
 
     def __display(self, title: str, text: str, informative_text: str = '', detailed_text: str = '',
                   buttons: qtw.QMessageBox.StandardButton = qtw.QMessageBox.Ok) -> int:
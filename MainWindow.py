@@ -1,22 +1,28 @@
-import gc
 import platform
+import collections
 import csv
+import logging
 import os
 
 from PyQt5 import QtWidgets as qtw
 from PyQt5 import QtCore as qtc
+from PyQt5 import QtGui as qtg
 from gui.Ui_MainWindow import Ui_MainWindow
 from InOutWindow import InOutWindow
 from AdminWindow import AdminWindow
 from DatabaseManager import DatabaseManager
+from DatabaseWorker import DatabaseWorker, DEFAULT_MAX_PENDING
 from NumberPadDialogBox import NumberPadDialogBox
-from GoogleSheetManager import GoogleSheetManager
+from GarbageCollectionManager import GarbageCollectionManager
+from UploadWorker import UploadWorker
+
+logger = logging.getLogger(__name__)
 
 
 class MainWindow(qtw.QWidget, Ui_MainWindow):
     """The Main Window contains a title, a message, an input box, and the 'Checked In' list."""
 
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, database_config: dict = None, gc_config: dict = None):
         super().__init__()
         self.setupUi(self)
         self.setWindowModality(qtc.Qt.ApplicationModal)  # block input to all other windows
@@ -25,9 +31,20 @@ class MainWindow(qtw.QWidget, Ui_MainWindow):
 
         self.__filename = filename
         self.__barcode = ''
-        self.__db_manager = DatabaseManager(self.__filename)
-        self.__in_out_window = InOutWindow(self, self.__db_manager)
-        self.__admin_window = AdminWindow(self, self.__db_manager)
+        self.__gc_manager = GarbageCollectionManager(gc_config)
+        self.__db_manager = DatabaseManager(self.__filename, database_config)
+
+        # The scans, check ins, and check outs use the database on a separate thread, in the order they happen.
+        # The barcodes scanned are queued, and the first barcode in the queue is the scan in progress.
+        max_pending = (database_config or {}).get('max pending requests', DEFAULT_MAX_PENDING)
+        self.__db_worker = DatabaseWorker(self.__db_manager, max_pending)
+        self.__scan_queue = collections.deque()
+
+        self.__in_out_window = InOutWindow(self, self.__db_worker)
+        # The data is uploaded to the Google Sheet on a separate thread, so scans are accepted during the upload.
+        self.__upload_worker = UploadWorker(self.__db_manager)
+
+        self.__admin_window = AdminWindow(self, self.__db_worker, self.__upload_worker)
         self.__admin_pin_dialog_box = NumberPadDialogBox(self)
 
         # self.__admin_pin_dialog_box.title.setText('Enter PIN')
@@ -39,7 +56,8 @@ class MainWindow(qtw.QWidget, Ui_MainWindow):
         # Set up the model-view structure for the 'Checked In' list.
         # As the data in the model changes, the view is updated automatically.
         # The QStringListModel is the easiest to implement since it does not require a customized model.
-        self.__checked_in_list = self.get_checked_in_list()
+        # The list is filled in once the database worker returns the students that are checked in.
+        self.__checked_in_list = list()
         self.__checked_in_model = qtc.QStringListModel(self.__checked_in_list)
         self.checkedInList.setModel(self.__checked_in_model)
 
@@ -58,7 +76,7 @@ class MainWindow(qtw.QWidget, Ui_MainWindow):
 
         # Refresh the Main window when the Check In/Out window closes.
         # The "window_closed" signal emits a "message" to display on the Main window for 3 seconds.
-        self.__in_out_window.window_closed.connect(lambda message: self.refresh_window(message, 3))
+        self.__in_out_window.window_closed.connect(lambda message: self.__end_scan(message, 3))
 
         # When the Number Pad dialog box closes, decide whether to display the Admin window or an Error message.
         # The "window_closed" signal emits two strings:
@@ -67,7 +85,7 @@ class MainWindow(qtw.QWidget, Ui_MainWindow):
             lambda pin: self.admin_pin_dialog_box_closed(pin))
 
         # Display the Admin window when the Admin PIN is correct.
-        self.__admin_window.window_closed.connect(lambda: self.refresh_window('', 0))
+        self.__admin_window.window_closed.connect(lambda: self.__end_scan('', 0))
 
         # Use the timer to clear the message. The self.refresh_window() method will start the timer.
         # The static method qtc.QTimer.singleShot() will perform a similar operation, however
@@ -76,6 +94,14 @@ class MainWindow(qtw.QWidget, Ui_MainWindow):
         #   the second message will only display for the remaining time from the first message.
         self.__timer.timeout.connect(self.message.clear)
 
+        # Show that the kiosk is busy if the database takes more than half a second to answer.
+        self.__busy_timer = qtc.QTimer()
+        self.__busy_timer.setSingleShot(True)
+        self.__busy_timer.setInterval(500)
+        self.__busy_timer.timeout.connect(self.__show_busy)
+        self.__busy = False
+        self.__db_worker.busy_changed.connect(self.__busy_changed)
+
         # Use an event timer to schedule the auto logout and upload data feature
         self.__event_timer = qtc.QTimer()
         self.__event_timer.setSingleShot(True)
@@ -88,6 +114,12 @@ class MainWindow(qtw.QWidget, Ui_MainWindow):
             self.showFullScreen()
 
         self.check_database()  # check if the database file exists after the main window displays
+        self.__update_checked_in_list()
+
+        # Finish any uploads that were still waiting in the outbox when the program last stopped.
+        self.__upload_worker.flush()
+
+        self.__gc_manager.startup_complete()
 
     def set_event_timer(self) -> None:
         # Get the current date and time.
@@ -113,19 +145,41 @@ class MainWindow(qtw.QWidget, Ui_MainWindow):
         :return: None
         """
 
-        # Logout all users that are still checked in.
-        success1, message1 = self.__db_manager.logout_all()
+        # Logout all users that are still checked in, using the logout policy from the config file.
+        # The logout is queued on the database worker, so it runs after any check in or check out still waiting.
+        if not self.__db_worker.submit('checkout_all', (), self.__logout_finished):
+            self.__logout_finished(self.__db_manager.checkout_all())
+
+    def __logout_finished(self, result: tuple) -> None:
+        # "result" is a 4-tuple: (success, message, number of students checked out, seconds taken)
         self.refresh_window()
 
-        # Upload the data to the Google Sheet.
-        gsm = GoogleSheetManager(self.__db_manager)
-        success2, _, message2 = gsm.upload_data()
+        # Upload the data to the Google Sheet in the background.
+        # If the upload fails, it stays in the outbox and is tried again until it reaches the Google Sheet.
+        self.__upload_worker.start_upload('nightly')
 
         # Reset the event timer to run this task again tomorrow.
         self.set_event_timer()
 
-        gc.enable()
-        gc.collect()
+    def closeEvent(self, event: qtg.QCloseEvent) -> None:
+        """
+        This method overrides the closeEvent in the parent class.
+        It closes the database connections before the application exits.
+
+        :param event: the close event
+        :return: None
+        """
+
+        self.__upload_worker.stop()
+        self.__db_worker.stop()
+        self.__db_manager.close()
+
+        # The pauses for each scan are logged as they happen. These are the totals since the program started.
+        stats = self.__gc_manager.get_stats()
+        logger.info('Garbage collection (%s mode): %s collections by generation, %.2f ms in total, %.2f ms at most',
+                    stats['mode'], stats['collections'], stats['total pause ms'], stats['max pause ms'])
+
+        super().closeEvent(event)
 
     def check_database(self) -> None:
         # Check if the database file exists.
@@ -168,15 +222,37 @@ class MainWindow(qtw.QWidget, Ui_MainWindow):
         _, file_extension = os.path.splitext(csv_filename)
         if file_extension == '.csv':
 
+            # Count the records first, so the progress dialog box can show how much of the import is done.
+            with open(csv_filename, 'r', newline='') as fh:
+                total = sum(1 for _ in csv.reader(fh))
+
+            progress = qtw.QProgressDialog('Importing ' + table + ' records...', '', 0, total, self)
+            progress.setWindowTitle('Import Records')
+            progress.setCancelButton(None)
+            progress.setMinimumDuration(500)
+
+            def show_progress(count: int) -> None:
+                progress.setValue(count)
+                qtw.QApplication.processEvents()
+
             # The with ... as statement will open the file and close the file at the end.
-            with open(csv_filename, 'r') as fh:
+            # The records are streamed from the csv file into the database in chunks.
+            # Activity records are past sessions, so they are checked all at once instead of by the triggers.
+            with open(csv_filename, 'r', newline='') as fh:
                 csv_reader = csv.reader(fh)
-                counter = 0
-                for record in csv_reader:
-                    self.__db_manager.new_record(table, tuple(record))
-                    counter += 1
+                success, message, counter, errors, seconds = \
+                    self.__db_manager.import_records(table, csv_reader, show_progress, historical=(table == 'activity'))
 
-                self.__display('Import Success', 'Imported ' + str(counter) + ' ' + table + ' records.')
+            progress.close()
+
+            detailed_text = '\n'.join(f'Row {row_number}: {",".join(field or "" for field in record)} -- {error}'
+                                       for row_number, record, error in errors)
+
+            if success:
+                self.__display('Import Success', 'Imported ' + str(counter) + ' ' + table + ' records.',
+                               str(len(errors)) + ' records were skipped.' if errors else '', detailed_text)
+            else:
+                self.__display('Import Error', 'No ' + table + ' records were imported.', message, detailed_text)
 
     @qtc.pyqtSlot(str)
     def barcode_scanned(self, barcode: str) -> None:
@@ -184,18 +260,51 @@ class MainWindow(qtw.QWidget, Ui_MainWindow):
         This slot is called when a barcode is scanned.
         It displays either (1) the Check In/Out window for Students, (2) the PIN dialog box for Admin,
         or (3) a message for an Invalid barcode.
+        If another scan is still in progress, the barcode is queued until that scan is finished.
 
         :param barcode: the barcode that was scanned
         :return: None
         """
 
+        self.barcode.clear()
+
+        # Turn the scan away if too many scans are already waiting for the database.
+        if len(self.__scan_queue) >= self.__db_worker.max_pending:
+            self.message.setText('Busy. Scan Again.')
+            self.__timer.start(3000)
+            return
+
+        self.__scan_queue.append(barcode)
+        if len(self.__scan_queue) == 1:
+            self.__start_scan()
+
+    def __start_scan(self) -> None:
+        # Start the scan at the front of the queue by asking the database worker for the scan snapshot.
+        self.__gc_manager.scan_started()
+
+        barcode = self.__scan_queue[0]
         self.__barcode = barcode
-        success, message, barcode_type = self.__db_manager.check_barcode(self.__barcode)
-        # The "barcode_type" is either a Student, Admin, or Invalid.
+
+        # Get everything needed for the Check In/Out window in one trip to the database.
+        submitted = self.__db_worker.submit('get_scan_snapshot', (barcode, ),
+                                            lambda result: self.__scan_snapshot_ready(barcode, result))
+        if not submitted:
+            self.__end_scan('Busy. Scan Again.', 3)
+
+    def __scan_snapshot_ready(self, barcode: str, result: tuple) -> None:
+        # "result" is a 6-tuple from DatabaseManager.get_scan_snapshot(),
+        #   or (False, error message) if the request raised an exception on the database thread.
+        if not result[0]:
+            # Display an error message on the Main window because of a Database error.
+            self.__end_scan('Database Error. See Admin.', 3)
+            return
+
+        success, message, barcode_type, student_data, hours_table, total_hours = result
+        # The "barcode_type" is either a Student, Admin, Invalid, or Error.
 
         if barcode_type == 'Student':
             # Display the Check In/Out window.
-            self.__in_out_window.show_window(self.__barcode)
+            self.__in_out_window.show_window(barcode, student_data, hours_table, total_hours)
 
         elif barcode_type == 'Admin':
             # Display a Number Pad dialog box for the user to enter their Admin PIN.
@@ -203,11 +312,21 @@ class MainWindow(qtw.QWidget, Ui_MainWindow):
 
         elif barcode_type == 'Invalid':
             # Display an error message on the Main window for an Invalid barcode.
-            self.refresh_window('Invalid Barcode. Try Again.', 3)
+            self.__end_scan('Invalid Barcode. Try Again.', 3)
 
-        elif barcode_type == 'Error':
+        else:
             # Display an error message on the Main window because of a Database error.
-            self.refresh_window('Database Error. See Admin.', 3)
+            self.__end_scan('Database Error. See Admin.', 3)
+
+    def __end_scan(self, message: str = '', seconds: float = 0.0) -> None:
+        # Finish the scan in progress, then start the next scan in the queue.
+        self.refresh_window(message, seconds)
+
+        if self.__scan_queue:
+            self.__scan_queue.popleft()
+
+        if self.__scan_queue:
+            self.__start_scan()
 
     @qtc.pyqtSlot(str)
     def admin_pin_dialog_box_closed(self, pin: str) -> None:
@@ -223,19 +342,29 @@ class MainWindow(qtw.QWidget, Ui_MainWindow):
         if pin:
 
             # Check if the Admin PIN is correct.
-            success, message, correct_pin = self.__db_manager.check_pin(self.__barcode, pin)
-            if correct_pin:
-                # Display the Admin window since the Admin PIN is correct.
-                self.__admin_window.show_window(self.__checked_in_list)
-
-            else:
-                # Display an error message on the Main window since the PIN was incorrect.
-                self.refresh_window('Incorrect PIN.', 3)
+            if not self.__db_worker.submit('check_pin', (self.__barcode, pin), self.__pin_checked):
+                self.__end_scan('Busy. Scan Again.', 3)
 
             pin = None
 
         else:  # if the 'Cancel' button was clicked (or any other reason)
-            self.refresh_window()
+            self.__end_scan()
+
+    def __pin_checked(self, result: tuple) -> None:
+        # "result" is a 3-tuple from DatabaseManager.check_pin(): (success, message, is the pin correct?),
+        #   or (False, error message) if the request raised an exception on the database thread.
+        if not result[0]:
+            self.__end_scan('Database Error. See Admin.', 3)
+            return
+
+        success, message, correct_pin = result
+        if correct_pin:
+            # Display the Admin window since the Admin PIN is correct.
+            self.__admin_window.show_window(self.__checked_in_list)
+
+        else:
+            # Display an error message on the Main window since the PIN was incorrect.
+            self.__end_scan('Incorrect PIN.', 3)
 
     @qtc.pyqtSlot(str, float)
     def refresh_window(self, message: str = '', seconds: float = 0.0) -> None:
@@ -251,8 +380,7 @@ class MainWindow(qtw.QWidget, Ui_MainWindow):
         self.__barcode = ''
 
         # Update the 'Checked In' list.
-        self.__checked_in_list = self.get_checked_in_list()
-        self.__checked_in_model.setStringList(self.__checked_in_list)
+        self.__update_checked_in_list()
 
         # Display the "message" for X seconds if one was passed, otherwise clear the message
         if message:
@@ -263,23 +391,52 @@ class MainWindow(qtw.QWidget, Ui_MainWindow):
         else:
             self.message.clear()
 
-        # print(len(gc.get_referrers(self.__checked_in_list)))
-        gc.enable()
-        gc.collect()
+        # Garbage collection is done when the kiosk is idle, rather than here, so it never delays a scan.
+        self.__gc_manager.scan_finished()
+
+    def __update_checked_in_list(self) -> None:
+        # Ask the database worker for the students that are checked in. If the worker is too busy,
+        # the list is updated the next time the Main window is refreshed.
+        self.__db_worker.submit('get_checked_in_list', (), self.__checked_in_list_ready)
 
-    def get_checked_in_list(self) -> list:
+    def __checked_in_list_ready(self, result: tuple) -> None:
+        # The QStringListModel requires a list of strings, so the result is formatted for that.
+        self.__checked_in_list = self.__format_checked_in_list(result)
+        self.__checked_in_model.setStringList(self.__checked_in_list)
+
+    @qtc.pyqtSlot(bool)
+    def __busy_changed(self, busy: bool) -> None:
+        # Only show the busy state if the database is slow, so a normal scan does not flicker.
+        if busy:
+            self.__busy_timer.start()
+        else:
+            self.__busy_timer.stop()
+            if self.__busy:
+                self.__busy = False
+                qtw.QApplication.restoreOverrideCursor()
+                if self.message.text() == 'Working. Please Wait.':
+                    self.message.clear()
+
+    def __show_busy(self) -> None:
+        self.__busy = True
+        qtw.QApplication.setOverrideCursor(qtc.Qt.WaitCursor)
+        if not self.message.text():
+            self.message.setText('Working. Please Wait.')
+
+    def __format_checked_in_list(self, result: tuple) -> list:
         """
-        This method returns the 'Checked In' list to display on the Main window.
-        The QStringListModel requires a list of strings, so this method formats the data for that.
+        This *private* method formats the 'Checked In' list to display on the Main window.
 
+        :param result: the 3-tuple from DatabaseManager.get_checked_in_list()
         :return: a list of strings: ['<id>  lastname, firstname', ... ]
         """
 
         format_data = list()
 
         # "data" is a list of tuples: [('id', 'firstname', 'lastname'), ... ]
-        success, message, data = self.__db_manager.get_checked_in_list()
-        if success:
+        # If the request raised an exception on the database thread, "result" is only (False, error message).
+        if result[0]:
+            data = result[2]
             # Concatenate each tuple of strings into a single formatted string
             # "format_data" is a list of strings: ['<id>  lastname, firstname', ... ]
             for tup in data:
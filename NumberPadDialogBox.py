@@ -1,5 +1,3 @@
-import gc
-
 from PyQt5 import QtWidgets as qtw
 from PyQt5 import QtCore as qtc
 from gui.Ui_NumberPadDialogBox import Ui_NumberPadDialogBox
@@ -96,9 +94,7 @@ class NumberPadDialogBox(qtw.QDialog, Ui_NumberPadDialogBox):
             self.clear.setEnabled(False)
 
     def __clean_up(self):
-        gc.enable()
         self.entry.clear()
         self.title.clear()
         self.buttonBox.button(qtw.QDialogButtonBox.Ok).setEnabled(False)
         self.clear.setEnabled(False)
-        gc.collect()
@@ -1,11 +1,14 @@
 import os
 import sys
+import csv
 import json
+import logging
 
 from PyQt5 import QtWidgets as qtw
 
 from GoogleSheetManager import GoogleSheetManager
 from DatabaseManager import DatabaseManager
+from HoursReport import HoursReport, PERIODS
 from MainWindow import MainWindow
 
 
@@ -36,9 +39,19 @@ def get_database_file(config_file: str) -> tuple:
 
             folder, file = os.path.split(database_config['filename'])
             db_file = os.path.join(THIS_DIRECTORY, folder, file)
-            return True, '', db_file
+            return True, '', db_file, database_config
         except Exception as e:
-            return False, 'Google config file is unreadable.', ''
+            return False, 'Google config file is unreadable.', '', {}
+
+
+def get_gc_config(config_file: str) -> dict:
+    # The "gc config" is optional, so the default settings are used if it is missing or unreadable.
+    with open(config_file, 'r') as fh:
+        try:
+            config = json.load(fh)
+            return config.get('gc config', {})
+        except Exception as e:
+            return {}
 
 
 def main() -> None:
@@ -47,16 +60,37 @@ def main() -> None:
     :return: None
     """
 
+    # The messages are written to the console, e.g. how long garbage collection paused each scan
+    #   and the Google Sheets calls that are tried again.
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
     # Check if the program was started with any options
     if len(sys.argv) > 1:
         if sys.argv[1] == '--upload':
 
+            if sys.argv[2:] not in ([], ['--full']):
+                sys.exit('Usage: python TimeTrack4237.py --upload [--full]')
+
             success, message, config_file = get_config_file()
             if success:
-                success, message, db_file = get_database_file(config_file)
+                success, message, db_file, database_config = get_database_file(config_file)
                 if success:
-                    gsm = GoogleSheetManager(db_file)
-                    gsm.upload_data()
+                    dbm = DatabaseManager(db_file, database_config)
+                    gsm = GoogleSheetManager(dbm)
+
+                    # This upload also completes any uploads waiting in the outbox.
+                    success, message, last_request_id, _, _, _ = dbm.get_upload_requests()
+                    if not success:
+                        sys.exit(message)
+
+                    success, title, message = gsm.upload_data(
+                        lambda stage, stage_number, stages: print(f'{stage}... ({stage_number} of {stages})'),
+                        full=sys.argv[2:] == ['--full'])
+                    if not success:
+                        sys.exit(message)
+                    if last_request_id:
+                        dbm.finish_upload_requests(last_request_id)
+                    print(message)
                     sys.exit(0)
 
         elif sys.argv[1] == '--logout':
@@ -65,15 +99,113 @@ def main() -> None:
             if not success:
                 sys.exit(message)
 
-            success, message, db_file = get_database_file(config_file)
+            success, message, db_file, database_config = get_database_file(config_file)
+            if not success:
+                sys.exit(message)
+
+            with DatabaseManager(db_file, database_config) as dbm:
+                success, message, count, seconds = dbm.checkout_all()
+            if not success:
+                sys.exit(message)
+
+            print(message)
+            sys.exit(0)
+
+        elif sys.argv[1] == '--import':
+
+            historical = sys.argv[4:] == ['--historical']
+            if len(sys.argv) != 4 + historical or sys.argv[2] not in ('student', 'activity'):
+                sys.exit('Usage: python TimeTrack4237.py --import student|activity FILE [--historical]')
+
+            table, csv_filename = sys.argv[2], sys.argv[3]
+            if not os.path.isfile(csv_filename):
+                sys.exit('The file "' + csv_filename + '" does not exist.')
+
+            success, message, config_file = get_config_file()
+            if not success:
+                sys.exit(message)
+
+            success, message, db_file, database_config = get_database_file(config_file)
+            if not success:
+                sys.exit(message)
+
+            # The records are streamed from the csv file into the database in chunks.
+            with open(csv_filename, 'r', newline='') as fh, DatabaseManager(db_file, database_config) as dbm:
+                success, message, count, errors, seconds = dbm.import_records(table, csv.reader(fh), historical=historical)
+
+            for row_number, record, error in errors:
+                print(f'Row {row_number}: {",".join(field or "" for field in record)} -- {error}')
+
+            if not success:
+                sys.exit(message)
+
+            print(message)
+            sys.exit(0)
+
+        elif sys.argv[1] == '--report':
+
+            if len(sys.argv) != 3 or sys.argv[2] not in PERIODS:
+                sys.exit('Usage: python TimeTrack4237.py --report ' + '|'.join(PERIODS))
+
+            success, message, config_file = get_config_file()
+            if not success:
+                sys.exit(message)
+
+            success, message, db_file, database_config = get_database_file(config_file)
+            if not success:
+                sys.exit(message)
+
+            with DatabaseManager(db_file, database_config) as dbm:
+                success, message, students, daily_hours = dbm.get_hours_report_data()
+            if not success:
+                sys.exit(message)
+
+            # One row for each student with the total hours, then the hours for each period (blank if none).
+            dates, rows = HoursReport(students, daily_hours).get_rows(sys.argv[2], total=True)
+
+            writer = csv.writer(sys.stdout)
+            writer.writerow(['Last Name', 'First Name', 'Barcode', 'Hours'] + [date.isoformat() for date in dates])
+            writer.writerows(rows)
+            sys.exit(0)
+
+        elif sys.argv[1] == '--rebuild-totals':
+
+            success, message, config_file = get_config_file()
+            if not success:
+                sys.exit(message)
+
+            success, message, db_file, database_config = get_database_file(config_file)
+            if not success:
+                sys.exit(message)
+
+            with DatabaseManager(db_file, database_config) as dbm:
+                success, message = dbm.rebuild_totals()
             if not success:
                 sys.exit(message)
 
-            dbm = DatabaseManager(db_file)
-            success, message = dbm.logout_all()
+            print(message)
+            sys.exit(0)
+
+        elif sys.argv[1] == '--upgrade':
+
+            success, message, config_file = get_config_file()
+            if not success:
+                sys.exit(message)
+
+            success, message, db_file, database_config = get_database_file(config_file)
+            if not success:
+                sys.exit(message)
+
+            with DatabaseManager(db_file, database_config) as dbm:
+                success, message, results = dbm.upgrade_database()
+
+            for version, description, seconds in results:
+                print(f'Version {version}: {description} ({seconds:.3f} seconds)')
+
             if not success:
                 sys.exit(message)
 
+            print(message)
             sys.exit(0)
 
     else:
@@ -83,10 +215,11 @@ def main() -> None:
         success, message, config_file = get_config_file()
 
         if success:
-            success, message, db_file = get_database_file(config_file)
+            success, message, db_file, database_config = get_database_file(config_file)
 
             if success:
-                mw = MainWindow(db_file)
+                gc_config = get_gc_config(config_file)
+                mw = MainWindow(db_file, database_config, gc_config)
                 sys.exit(app.exec_())
 
             else:
@@ -0,0 +1,186 @@
+import threading
+
+from PyQt5 import QtCore as qtc
+
+from DatabaseManager import DatabaseManager
+from GoogleSheetClient import GoogleSheetClient
+from GoogleSheetManager import GoogleSheetManager
+
+# After a failed upload, the outbox is tried again after RETRY_SECONDS, then twice as long after each failure,
+#   up to MAX_RETRY_SECONDS, until the upload reaches the Google Sheet.
+RETRY_SECONDS = 60
+MAX_RETRY_SECONDS = 3600
+
+
+class UploadWorker(qtc.QThread):
+    """This class uploads the data to the Google Sheet on a separate thread, so the kiosk keeps accepting scans
+    while the upload is in progress. Only one upload can run at a time.
+
+    Every upload that is requested is first saved in the upload_outbox table, and only removed once it has
+    reached the Google Sheet. If the network is down, the outbox is tried again later with a growing delay,
+    and also when the program starts. All the uploads waiting in the outbox are done by one upload, because
+    an upload always sends everything in the database.
+    """
+
+    # Signal to report the stage that is starting: (stage description, stage number, number of stages)
+    progress = qtc.pyqtSignal(str, int, int)
+
+    # Signal to indicate that the upload has finished: (success, title, message)
+    upload_finished = qtc.pyqtSignal(bool, str, str)
+
+    def __init__(self, db_manager: DatabaseManager):
+        super().__init__()
+
+        self.__db_manager = db_manager
+
+        # The same GoogleSheetManager is used for every upload, so the config, the credentials, and the spreadsheet
+        #   are only set up once, and the rate limits count the calls made by earlier uploads.
+        self.__google_sheet_manager = GoogleSheetManager(db_manager, GoogleSheetClient())
+
+        # The uploads requested on the GUI thread are saved in the outbox by the upload thread,
+        #   so the GUI thread never waits for the database. [ (reason, full), ... ]
+        self.__requests = []
+        self.__requests_lock = threading.Lock()
+
+        # The number of failed attempts for the uploads in the outbox, set by the upload thread.
+        # If the requests could not be saved in the outbox, they are kept and saved on the next try.
+        self.__failures = 0
+        self.__save_failed = False
+
+        self.__retry_timer = qtc.QTimer()
+        self.__retry_timer.setSingleShot(True)
+        self.__retry_timer.timeout.connect(self.flush)
+
+        self.finished.connect(self.__run_finished)
+
+    def start_upload(self, reason: str = 'admin', full: bool = False) -> bool:
+        """
+        This method adds an upload to the outbox and starts it, unless an upload is already in progress.
+        In that case, the upload is started as soon as the one in progress has finished.
+
+        :param reason: why the upload was requested, e.g. 'nightly' or 'admin'
+        :param full: should every worksheet be rewritten?
+        :return: True if the upload was started now
+        """
+
+        with self.__requests_lock:
+            self.__requests.append((reason, full))
+
+        return self.flush()
+
+    @qtc.pyqtSlot()
+    def flush(self) -> bool:
+        """
+        This slot starts an upload of everything in the outbox, unless an upload is already in progress.
+        It is called by the retry timer, and can be called when the program starts to finish any uploads
+        that were still waiting when it stopped.
+
+        :return: True if the upload thread was started
+        """
+
+        if self.isRunning():
+            return False
+
+        self.__retry_timer.stop()
+        self.start()
+        return True
+
+    def cancel(self) -> None:
+        """
+        This method asks the upload to stop. The stage in progress is finished first.
+        The upload stays in the outbox, so it is tried again later.
+
+        :return: None
+        """
+
+        self.requestInterruption()
+
+    def stop(self) -> None:
+        """
+        This method stops the upload and the retry timer when the program closes.
+        Anything still in the outbox is uploaded the next time the program starts.
+
+        :return: None
+        """
+
+        self.__retry_timer.stop()
+
+        # The retry timer must not be started again once the program is closing.
+        #   The signal is already disconnected if stop() was called before.
+        try:
+            self.finished.disconnect(self.__run_finished)
+        except TypeError:
+            pass
+
+        self.cancel()
+        self.wait()
+
+    def run(self) -> None:
+        """
+        This method overrides the run method in the parent class. It runs on the upload thread.
+
+        :return: None, emits the "upload_finished" signal if there was anything to upload
+        """
+
+        try:
+            # Save the new requests in the outbox before anything else, so they are not lost if the upload fails.
+            with self.__requests_lock:
+                requests, self.__requests = self.__requests, []
+
+            self.__save_failed = False
+            for index, (reason, full) in enumerate(requests):
+                success, message = self.__db_manager.add_upload_request(reason, full)
+                if not success:
+                    with self.__requests_lock:
+                        self.__requests[:0] = requests[index:]
+                    self.__save_failed = True
+                    self.__failures += 1
+                    return
+
+            # If the outbox cannot be read, it is tried again later, the same as a failed upload.
+            success, message, last_request_id, count, full, attempts = self.__db_manager.get_upload_requests()
+            if not success:
+                self.__failures += 1
+                return
+
+            if not last_request_id or self.isInterruptionRequested():
+                return
+
+            try:
+                success, title, message = self.__google_sheet_manager.upload_data(self.progress.emit,
+                                                                                  self.isInterruptionRequested,
+                                                                                  full=full)
+            except Exception as e:
+                success, title, message = False, 'Google Sheets Error', str(e)
+
+            if success:
+                self.__db_manager.finish_upload_requests(last_request_id)
+                self.__failures = 0
+                if count > 1:
+                    message += f' {count} uploads that were waiting were done at once.'
+            else:
+                self.__db_manager.fail_upload_requests(last_request_id, message)
+                self.__failures = attempts + 1
+                message += ' The upload will be tried again later.'
+        finally:
+            self.__db_manager.close_thread_connection()
+
+        self.upload_finished.emit(success, title, message)
+
+    @qtc.pyqtSlot()
+    def __run_finished(self) -> None:
+        """
+        This *private* slot is called on the GUI thread when the upload thread stops.
+        It starts the uploads requested during the upload, or schedules the next try after a failure.
+
+        :return: None
+        """
+
+        with self.__requests_lock:
+            requested = bool(self.__requests)
+
+        if requested and not self.__save_failed:
+            self.flush()
+        elif requested or self.__failures:
+            delay = min(RETRY_SECONDS * 2 ** (self.__failures - 1), MAX_RETRY_SECONDS)
+            self.__retry_timer.start(int(1000 * delay))
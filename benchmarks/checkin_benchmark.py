@@ -0,0 +1,124 @@
+"""
+This script measures how long it takes to check in a student on a database with a lot of activity records,
+first with the old COUNT(*) trigger checks and then with the EXISTS trigger checks (database version 5).
+
+Usage: python benchmarks/checkin_benchmark.py [number of activity records] [number of check ins]
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+import statistics
+
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from DatabaseManager import DatabaseManager
+
+
+STUDENTS = 200
+
+# These are the triggers from before database version 5.
+COUNT_TRIGGERS = {
+    'insert_activity': '''CREATE TRIGGER insert_activity BEFORE INSERT ON activity
+        BEGIN
+            SELECT CASE
+                WHEN (SELECT COUNT(*) FROM activity WHERE NEW.id=id AND NEW.checkout IS NULL AND checkout IS NULL) >0
+                THEN RAISE(ABORT, "Student already Checked In. Must include a Check Out time.")
+            END;
+        END;''',
+    'update_activity': '''CREATE TRIGGER update_activity BEFORE UPDATE ON activity
+        BEGIN
+            SELECT CASE
+                WHEN (SELECT COUNT(*) FROM activity
+                      WHERE NEW.rowid!=rowid AND NEW.id=id AND NEW.checkout IS NULL AND checkout IS NULL) >0
+                THEN RAISE(ABORT, "Student already Checked In. Must include a Check Out time.")
+            END;
+        END;'''
+}
+
+
+def create_database(filename: str, activity_records: int) -> DatabaseManager:
+    # Create the database with the students and their past sessions.
+    db_manager = DatabaseManager(filename)
+    db_manager.create_database()
+    db_manager.import_records('student', [(f'{i:04d}', 'First', 'Last') for i in range(STUDENTS)])
+
+    records = []
+    checkin = datetime(2000, 1, 1, 15, 0, 0)
+    for i in range(activity_records):
+        if i % STUDENTS == 0:
+            checkin += timedelta(days=1)
+        checkout = checkin + timedelta(hours=2)
+        records.append((f'{i % STUDENTS:04d}', f'{checkin:%Y-%m-%d %H:%M:%S}', f'{checkout:%Y-%m-%d %H:%M:%S}'))
+
+    success, message, count, errors, seconds = db_manager.import_records('activity', records, historical=True)
+    print(message)
+
+    return db_manager
+
+
+def use_count_triggers(filename: str) -> None:
+    # Put the old COUNT(*) triggers back in place of the EXISTS triggers.
+    db_conn = sqlite3.connect(filename, isolation_level=None)
+    for name, sql in COUNT_TRIGGERS.items():
+        db_conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        db_conn.execute(sql)
+    db_conn.close()
+
+
+def measure(db_manager: DatabaseManager, check_ins: int) -> tuple:
+    # Time each check in, and each rejected second check in, for a random student.
+    random.seed(4237)
+    checkin_times = []
+    rejected_times = []
+
+    for i in range(check_ins):
+        barcode = f'{random.randrange(STUDENTS):04d}'
+
+        start_time = time.perf_counter()
+        db_manager.checkin_student(barcode)
+        checkin_times.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        db_manager.checkin_student(barcode)
+        rejected_times.append(time.perf_counter() - start_time)
+
+        db_manager.checkout_student(barcode)
+
+    return checkin_times, rejected_times
+
+
+def report(name: str, times: list) -> None:
+    times = sorted(times)
+    median = 1000000 * statistics.median(times)
+    p95 = 1000000 * times[int(0.95 * (len(times) - 1))]
+    print(f'  {name:<20} median {median:8.1f} us    95th percentile {p95:8.1f} us')
+
+
+def main() -> None:
+    activity_records = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    check_ins = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    with tempfile.TemporaryDirectory() as folder:
+        for triggers in ('COUNT(*)', 'EXISTS'):
+            filename = os.path.join(folder, triggers.strip('(*)') + '.db')
+
+            with create_database(filename, activity_records) as db_manager:
+                if triggers == 'COUNT(*)':
+                    db_manager.close()
+                    use_count_triggers(filename)
+
+                checkin_times, rejected_times = measure(db_manager, check_ins)
+
+            print(f'{triggers} triggers, {activity_records} activity records, {check_ins} check ins:')
+            report('check in', checkin_times)
+            report('second check in', rejected_times)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+import os
+import sys
+import time
+
+import pytest
+
+# The modules are in the top folder of the repository, and the windows are not shown while testing.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    from PyQt5 import QtWidgets as qtw
+
+    app = qtw.QApplication.instance() or qtw.QApplication([])
+    yield app
+
+
+def wait_until(app, condition, seconds: float = 5.0) -> bool:
+    """
+    This function processes the Qt events until the condition is true or the time runs out.
+
+    :param app: the QApplication
+    :param condition: a function that returns True once the test can continue
+    :param seconds: the most time to wait
+    :return: the last value of the condition
+    """
+
+    end_time = time.monotonic() + seconds
+    while not condition() and time.monotonic() < end_time:
+        app.processEvents()
+        time.sleep(0.01)
+
+    return condition()
@@ -0,0 +1,60 @@
+from conftest import wait_until
+from DatabaseManager import DatabaseManager
+
+
+def create_database(tmp_path) -> str:
+    filename = str(tmp_path / 'test.db')
+
+    db_manager = DatabaseManager(filename)
+    db_manager.create_database()
+    db_manager.new_record('student', ('0001', 'Ann', 'Lee'))
+    db_manager.new_record('activity', ('0001', '2021-01-02 09:00:00', None))
+    db_manager.close()
+
+    return filename
+
+
+def check_out_all(qapp, tmp_path, monkeypatch) -> tuple:
+    from AdminWindow import AdminWindow
+    from DatabaseWorker import DatabaseWorker
+    from UploadWorker import UploadWorker
+
+    db_manager = DatabaseManager(create_database(tmp_path))
+    db_worker = DatabaseWorker(db_manager)
+    upload_worker = UploadWorker(db_manager)
+    admin_window = AdminWindow(None, db_worker, upload_worker)
+
+    # The message box would wait for someone to click OK.
+    messages = []
+    monkeypatch.setattr(AdminWindow, '_AdminWindow__display', lambda self, title, text: messages.append(text))
+
+    try:
+        admin_window.show_window(['Lee, Ann'])
+        admin_window.clicked('Check Out ALL')
+
+        assert wait_until(qapp, lambda: not db_worker.is_busy())
+        _, _, checked_in_list = db_manager.get_checked_in_list()
+        return (admin_window.checkedInList.model().stringList(), admin_window.checkOutAllButton.isEnabled(),
+                checked_in_list, messages)
+    finally:
+        admin_window.hide()
+        upload_worker.stop()
+        db_worker.stop()
+        db_manager.close()
+
+
+def test_check_out_all_clears_the_list(qapp, tmp_path, monkeypatch):
+    string_list, enabled, checked_in_list, messages = check_out_all(qapp, tmp_path, monkeypatch)
+
+    assert (string_list, enabled, checked_in_list, messages) == ([], False, [], [])
+
+
+def test_check_out_all_keeps_the_list_when_it_fails(qapp, tmp_path, monkeypatch):
+    def checkout_all(self, policy='', cap_hours=None):
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(DatabaseManager, 'checkout_all', checkout_all)
+
+    string_list, enabled, checked_in_list, messages = check_out_all(qapp, tmp_path, monkeypatch)
+
+    assert (string_list, enabled, messages) == (['Lee, Ann'], True, ['database is locked'])
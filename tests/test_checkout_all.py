@@ -0,0 +1,88 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from DatabaseManager import DatabaseManager
+
+DATE_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+@pytest.fixture
+def db_manager(tmp_path):
+    # 0001 has been checked in for days, 0002 checked in half an hour ago, and 0003 is checked out.
+    recent = (datetime.now() - timedelta(minutes=30)).strftime(DATE_TIME_FORMAT)
+
+    db_manager = DatabaseManager(str(tmp_path / 'test.db'), {'logout policy': 'cap', 'logout cap hours': 2})
+    db_manager.create_database()
+    for record in (('0001', 'Ann', 'Lee'), ('0002', 'Bo', 'Ray'), ('0003', 'Cy', 'Abe')):
+        db_manager.new_record('student', record)
+    for record in (('0001', '2021-01-02 09:00:00', None),
+                   ('0002', recent, None),
+                   ('0003', '2021-01-02 09:00:00', '2021-01-02 10:00:00')):
+        db_manager.new_record('activity', record)
+
+    yield db_manager
+    db_manager.close()
+
+
+def get_sessions(tmp_path) -> dict:
+    db_conn = sqlite3.connect(str(tmp_path / 'test.db'))
+    try:
+        data = db_conn.execute('SELECT id, checkin, checkout FROM activity').fetchall()
+    finally:
+        db_conn.close()
+
+    # { barcode: (checkin, checkout) }
+    return {barcode: (datetime.strptime(checkin, DATE_TIME_FORMAT), datetime.strptime(checkout, DATE_TIME_FORMAT))
+            for barcode, checkin, checkout in data}
+
+
+def test_zero_counts_no_hours(db_manager, tmp_path):
+    success, message, count, seconds = db_manager.checkout_all('zero')
+    sessions = get_sessions(tmp_path)
+
+    assert (success, count) == (True, 2)
+    assert sessions['0001'][1] == sessions['0001'][0]
+    assert sessions['0002'][1] == sessions['0002'][0]
+    assert sessions['0003'][1] - sessions['0003'][0] == timedelta(hours=1)
+
+
+def test_cap_counts_at_most_the_cap_hours(db_manager, tmp_path):
+    before = datetime.now().replace(microsecond=0)
+    success, message, count, seconds = db_manager.checkout_all('cap', 2)
+    sessions = get_sessions(tmp_path)
+
+    # The session that started half an hour ago is checked out now, not 2 hours after it started.
+    assert (success, count) == (True, 2)
+    assert sessions['0001'][1] - sessions['0001'][0] == timedelta(hours=2)
+    assert before <= sessions['0002'][1] <= datetime.now()
+    assert sessions['0003'][1] - sessions['0003'][0] == timedelta(hours=1)
+
+
+def test_now_counts_the_hours_up_to_now(db_manager, tmp_path):
+    before = datetime.now().replace(microsecond=0)
+    success, message, count, seconds = db_manager.checkout_all('now')
+    sessions = get_sessions(tmp_path)
+
+    assert (success, count) == (True, 2)
+    assert before <= sessions['0001'][1] <= datetime.now()
+    assert before <= sessions['0002'][1] <= datetime.now()
+    assert sessions['0003'][1] - sessions['0003'][0] == timedelta(hours=1)
+
+
+def test_default_policy_comes_from_the_database_config(db_manager, tmp_path):
+    success, message, count, seconds = db_manager.checkout_all()
+    sessions = get_sessions(tmp_path)
+
+    assert (success, count) == (True, 2)
+    assert sessions['0001'][1] - sessions['0001'][0] == timedelta(hours=2)
+
+
+@pytest.mark.parametrize('policy, cap_hours, error', [('later', None, 'Invalid logout policy: later'),
+                                                      ('cap', 'two', 'Invalid logout cap hours: two')])
+def test_invalid_settings_check_out_nobody(db_manager, policy, cap_hours, error):
+    assert db_manager.checkout_all(policy, cap_hours) == (False, error, 0, 0.0)
+
+    success, message, data = db_manager.get_checked_in_list()
+    assert [record[0] for record in data] == ['0001', '0002']
@@ -0,0 +1,194 @@
+import sqlite3
+
+import pytest
+
+from DatabaseManager import DatabaseManager, SCHEMA_VERSION
+
+# The schema that the first version of this program created, before any upgrade step.
+DATE_TIME_FORMAT = '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-9][0-9]:[0-9][0-9]:[0-9][0-9]'
+BASELINE_SCHEMA = f'''
+    CREATE TABLE student
+        (id TEXT PRIMARY KEY NOT NULL,
+        firstname TEXT NOT NULL,
+        lastname TEXT NOT NULL);
+    CREATE TABLE activity
+        (id TEXT NOT NULL,
+        checkin TEXT NOT NULL CHECK(checkin GLOB "{DATE_TIME_FORMAT}"),
+        checkout TEXT CHECK(checkout GLOB "{DATE_TIME_FORMAT}"),
+        FOREIGN KEY (id) REFERENCES student(id) ON DELETE CASCADE ON UPDATE CASCADE);
+    CREATE TABLE admin
+        (id TEXT PRIMARY KEY NOT NULL,
+        firstname TEXT NOT NULL,
+        lastname TEXT NOT NULL,
+        pin TEXT NOT NULL);
+    CREATE INDEX activity_id ON activity(id);
+    CREATE TRIGGER insert_activity BEFORE INSERT ON activity
+        BEGIN
+            SELECT CASE
+                WHEN (SELECT COUNT(*) FROM activity WHERE NEW.id=id AND NEW.checkout IS NULL AND checkout IS NULL) >0
+                THEN RAISE(ABORT, "Student already Checked In. Must include a Check Out time.")
+            END;
+        END;'''
+
+STUDENTS = (('0001', 'Ann', 'Lee'),
+            ('0002', 'Bo', 'Ray'),
+            ('0003', 'Cy', 'Abe'))
+
+ACTIVITY = (('0001', '2021-01-02 09:00:00', '2021-01-02 12:40:00'),
+            ('0001', '2021-01-02 13:00:00', '2021-01-02 13:10:00'),
+            ('0001', '2021-01-19 18:00:00', '2021-01-19 21:00:17'),
+            ('0002', '2021-12-31 18:00:00', '2021-12-31 23:59:59'),
+            ('0002', '2022-01-01 08:00:00', None),
+            ('0003', '2022-01-03 08:00:00', '2022-01-03 08:00:59'))
+
+# The totals that the triggers keep, and the same totals added up from the activity table.
+TOTALS_SQL = 'SELECT id, total_seconds, sessions FROM student_totals WHERE sessions > 0 ORDER BY id'
+ACTIVITY_TOTALS_SQL = '''SELECT id, SUM(checkout_epoch - checkin_epoch), COUNT(*) FROM activity
+                         WHERE checkout IS NOT NULL GROUP BY id ORDER BY id'''
+
+DAILY_HOURS_SQL = 'SELECT id, checkin_day, centihours, sessions FROM daily_hours ORDER BY id, checkin_day'
+ACTIVITY_DAILY_HOURS_SQL = '''SELECT id, checkin_day, SUM(ROUND((checkout_epoch - checkin_epoch) / 36.0)), COUNT(*)
+                              FROM activity WHERE checkout IS NOT NULL
+                              GROUP BY id, checkin_day ORDER BY id, checkin_day'''
+
+# The changes made to the database after the upgrade, which the triggers must apply to the totals.
+CHANGES = (('INSERT INTO activity (id, checkin, checkout) VALUES (?, ?, ?)',
+            ('0003', '2022-01-04 08:00:00', '2022-01-04 09:30:00')),
+           ('UPDATE activity SET checkout=? WHERE id=? AND checkout IS NULL', ('2022-01-01 10:15:00', '0002')),
+           ('UPDATE activity SET checkin=? WHERE id=? AND checkin=?',
+            ('2021-01-18 17:00:00', '0001', '2021-01-19 18:00:00')),
+           ('DELETE FROM activity WHERE id=? AND checkin=?', ('0001', '2021-01-02 13:00:00')),
+           ('UPDATE student SET id=? WHERE id=?', ('0009', '0003')),
+           ('DELETE FROM student WHERE id=?', ('0002', )))
+
+
+def query(filename: str, sql: str) -> list:
+    db_conn = sqlite3.connect(filename)
+    try:
+        return db_conn.execute(sql).fetchall()
+    finally:
+        db_conn.close()
+
+
+def execute(filename: str, sql: str, parameters: tuple = ()) -> None:
+    db_conn = sqlite3.connect(filename)
+    try:
+        db_conn.execute('PRAGMA foreign_keys=ON')
+        db_conn.execute(sql, parameters)
+        db_conn.commit()
+    finally:
+        db_conn.close()
+
+
+@pytest.fixture
+def baseline_filename(tmp_path) -> str:
+    filename = str(tmp_path / 'baseline.db')
+
+    db_conn = sqlite3.connect(filename)
+    db_conn.executescript(BASELINE_SCHEMA)
+    db_conn.executemany('INSERT INTO student (id, firstname, lastname) VALUES (?, ?, ?)', STUDENTS)
+    db_conn.executemany('INSERT INTO activity (id, checkin, checkout) VALUES (?, ?, ?)', ACTIVITY)
+    db_conn.execute('INSERT INTO admin (id, firstname, lastname, pin) VALUES ("4237", "Sir", "Lance-A-Bot", "x")')
+    db_conn.commit()
+    db_conn.close()
+
+    return filename
+
+
+def test_upgrade_from_the_baseline_schema_keeps_the_records(baseline_filename):
+    db_manager = DatabaseManager(baseline_filename)
+    success, message, results = db_manager.upgrade_database()
+    db_manager.close()
+
+    assert success, message
+    assert [version for version, description, seconds in results] == list(range(1, SCHEMA_VERSION + 1))
+    assert query(baseline_filename, 'PRAGMA user_version') == [(SCHEMA_VERSION, )]
+
+    assert query(baseline_filename, 'SELECT id, firstname, lastname FROM student ORDER BY id') == list(STUDENTS)
+    assert query(baseline_filename, 'SELECT id, checkin, checkout FROM activity ORDER BY rowid') == list(ACTIVITY)
+
+
+def test_student_totals_match_the_activity_table(baseline_filename):
+    db_manager = DatabaseManager(baseline_filename)
+    db_manager.upgrade_database()
+    db_manager.close()
+
+    # The open session of 0002 is not counted until it is checked out.
+    assert query(baseline_filename, TOTALS_SQL) == query(baseline_filename, ACTIVITY_TOTALS_SQL)
+    assert query(baseline_filename, TOTALS_SQL)[0] == ('0001', 13200 + 600 + 10817, 3)
+
+    for sql, parameters in CHANGES:
+        execute(baseline_filename, sql, parameters)
+        assert query(baseline_filename, TOTALS_SQL) == query(baseline_filename, ACTIVITY_TOTALS_SQL), sql
+
+
+def test_daily_hours_match_the_activity_table(baseline_filename):
+    db_manager = DatabaseManager(baseline_filename)
+    db_manager.upgrade_database()
+    db_manager.close()
+
+    # The two sessions of 0001 on 2021-01-02 are one record, and each session is rounded to the hundredth of an hour.
+    assert query(baseline_filename, DAILY_HOURS_SQL) == query(baseline_filename, ACTIVITY_DAILY_HOURS_SQL)
+    assert query(baseline_filename, DAILY_HOURS_SQL)[:2] == [('0001', 18629, 367 + 17, 2), ('0001', 18646, 300, 1)]
+
+    # Moving the checkin of 0001 to the day before moves the session to that day.
+    for sql, parameters in CHANGES:
+        execute(baseline_filename, sql, parameters)
+        assert query(baseline_filename, DAILY_HOURS_SQL) == query(baseline_filename, ACTIVITY_DAILY_HOURS_SQL), sql
+
+
+def test_version_8_drops_the_weekly_hours_table(tmp_path):
+    filename = str(tmp_path / 'test.db')
+
+    db_manager = DatabaseManager(filename)
+    db_manager.create_database()
+    db_manager.new_record('student', ('0001', 'Ann', 'Lee'))
+    db_manager.close()
+
+    # Put the database back to version 7, where a trigger also kept the weekly_hours table current.
+    db_conn = sqlite3.connect(filename)
+    db_conn.executescript('''
+        CREATE TABLE weekly_hours
+            (id TEXT NOT NULL,
+            checkin_week INTEGER NOT NULL,
+            centihours INTEGER NOT NULL DEFAULT 0,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (id, checkin_week)) WITHOUT ROWID;
+        DROP TRIGGER insert_activity_rollups;
+        CREATE TRIGGER insert_activity_rollups AFTER INSERT ON activity
+            WHEN NEW.checkout IS NOT NULL
+            BEGIN
+                INSERT INTO weekly_hours (id, checkin_week, centihours, sessions)
+                    VALUES (NEW.id, NEW.checkin_week, ROUND((NEW.checkout_epoch - NEW.checkin_epoch) / 36.0), 1);
+            END;
+        PRAGMA user_version=7;''')
+    db_conn.close()
+
+    db_manager = DatabaseManager(filename)
+    success, message, results = db_manager.upgrade_database()
+    db_manager.new_record('activity', ('0001', '2021-01-02 09:00:00', '2021-01-02 12:40:00'))
+    db_manager.close()
+
+    assert success, message
+    assert [version for version, description, seconds in results] == [8]
+    assert query(filename, 'PRAGMA user_version') == [(SCHEMA_VERSION, )]
+    assert query(filename, '''SELECT name FROM sqlite_master WHERE name="weekly_hours"
+                              OR sql LIKE "%weekly_hours%"''') == []
+
+    # The new session is still added to the daily hours.
+    assert query(filename, 'SELECT id, centihours, sessions FROM daily_hours') == [('0001', 367, 1)]
+
+
+def test_create_database_reports_a_failed_upgrade(tmp_path, monkeypatch):
+    def upgrade_to_version_8(self, cursor):
+        return False, 'disk I/O error'
+
+    monkeypatch.setattr(DatabaseManager, '_DatabaseManager__upgrade_to_version_8', upgrade_to_version_8)
+
+    db_manager = DatabaseManager(str(tmp_path / 'test.db'))
+    success, message, counter, total = db_manager.create_database()
+    db_manager.close()
+
+    assert not success
+    assert message == 'Upgrade to version 8 failed: disk I/O error'
+    assert counter == total
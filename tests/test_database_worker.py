@@ -0,0 +1,91 @@
+import sys
+
+from conftest import wait_until
+from DatabaseManager import DatabaseManager
+
+
+def create_database(tmp_path) -> str:
+    filename = str(tmp_path / 'test.db')
+
+    db_manager = DatabaseManager(filename)
+    db_manager.create_database()
+    db_manager.new_record('student', ('0001', 'Ann', 'Lee'))
+    db_manager.close()
+
+    return filename
+
+
+def test_failed_request_returns_success_and_message(qapp, tmp_path, monkeypatch):
+    from DatabaseWorker import DatabaseWorker
+
+    def get_scan_snapshot(self, barcode):
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(DatabaseManager, 'get_scan_snapshot', get_scan_snapshot)
+
+    db_manager = DatabaseManager(create_database(tmp_path))
+    worker = DatabaseWorker(db_manager)
+    results = []
+
+    try:
+        assert worker.submit('get_scan_snapshot', ('0001', ), results.append)
+        assert wait_until(qapp, lambda: results and not worker.is_busy())
+        assert results == [(False, 'database is locked')]
+    finally:
+        worker.stop()
+        db_manager.close()
+
+
+def test_worker_is_not_busy_after_a_callback_fails(qapp, tmp_path):
+    from DatabaseWorker import DatabaseWorker
+
+    db_manager = DatabaseManager(create_database(tmp_path))
+    worker = DatabaseWorker(db_manager)
+    finished = []
+    worker.request_finished.connect(lambda request_id, method_name, result: finished.append(method_name))
+
+    def callback(result):
+        raise ValueError('not enough values to unpack')
+
+    # PyQt passes the exception raised by the slot to sys.excepthook, which would stop the test run.
+    excepthook = sys.excepthook
+    sys.excepthook = lambda *args: None
+
+    try:
+        assert worker.submit('get_checked_in_list', (), callback)
+        assert wait_until(qapp, lambda: finished)
+        assert not worker.is_busy()
+        assert worker.pending() == 0
+    finally:
+        sys.excepthook = excepthook
+        worker.stop()
+        db_manager.close()
+
+
+def test_scan_ends_when_the_worker_raises(qapp, tmp_path, monkeypatch):
+    from MainWindow import MainWindow
+
+    def get_scan_snapshot(self, barcode):
+        raise RuntimeError('database is locked')
+
+    filename = create_database(tmp_path)
+    monkeypatch.setattr(DatabaseManager, 'get_scan_snapshot', get_scan_snapshot)
+
+    main_window = MainWindow(filename)
+    db_worker = main_window._MainWindow__db_worker
+    scan_queue = main_window._MainWindow__scan_queue
+
+    try:
+        # The second scan waits in the queue, so it only starts if the first scan ends.
+        main_window.barcode_scanned('0001')
+        main_window.barcode_scanned('0001')
+
+        assert wait_until(qapp, lambda: not scan_queue and not db_worker.is_busy())
+        assert main_window.message.text() == 'Database Error. See Admin.'
+
+        # A new scan is accepted once the failed scans have ended.
+        monkeypatch.undo()
+        main_window.barcode_scanned('0001')
+        assert wait_until(qapp, lambda: main_window._MainWindow__in_out_window.isVisible())
+    finally:
+        main_window.close()
@@ -0,0 +1,151 @@
+import gspread
+import pytest
+import requests
+
+from GoogleSheetClient import GoogleSheetClient, TokenBucket
+
+
+def api_error(status_code: int) -> gspread.exceptions.APIError:
+    response = requests.models.Response()
+    response.status_code = status_code
+    response._content = b'{"error": {"code": %d, "message": "Try again later."}}' % status_code
+    return gspread.exceptions.APIError(response)
+
+
+class FlakyCall:
+    """This class is a gspread method that raises each of the errors in turn before it succeeds."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'done'
+
+
+class FakeTime:
+    """This class is a clock that only moves when something sleeps, so the waits can be checked exactly."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_time(monkeypatch) -> FakeTime:
+    fake_time = FakeTime()
+    monkeypatch.setattr('GoogleSheetClient.time', fake_time)
+    return fake_time
+
+
+@pytest.fixture
+def client(monkeypatch) -> GoogleSheetClient:
+    # The backoff is not waited for, so the tests do not sleep.
+    monkeypatch.setattr(GoogleSheetClient, '_GoogleSheetClient__sleep', lambda self, seconds, is_cancelled=None: True)
+    return GoogleSheetClient({'max retries': 3})
+
+
+def test_write_is_tried_again_after_a_timeout(client):
+    call = FlakyCall(requests.exceptions.Timeout('read timed out'))
+
+    assert client.write(call) == 'done'
+    assert call.calls == 2
+
+
+@pytest.mark.parametrize('error', [requests.exceptions.Timeout('read timed out'),
+                                   requests.exceptions.ConnectionError('connection reset'),
+                                   api_error(503)])
+def test_write_that_is_not_idempotent_is_not_tried_again_if_it_may_have_been_applied(client, error):
+    call = FlakyCall(error)
+
+    with pytest.raises(type(error)):
+        client.write(call, idempotent=False)
+    assert call.calls == 1
+    assert client.get_stats()['write']['failures'] == 1
+
+
+def test_write_that_is_not_idempotent_is_tried_again_after_a_429(client):
+    call = FlakyCall(api_error(429))
+
+    assert client.write(call, idempotent=False) == 'done'
+    assert call.calls == 2
+
+
+@pytest.mark.parametrize('status_code', [429, 500, 502, 503, 504])
+def test_read_is_tried_again_after_a_429_or_5xx(client, status_code):
+    call = FlakyCall(api_error(status_code), api_error(status_code))
+
+    assert client.read(call) == 'done'
+    assert call.calls == 3
+    assert client.get_stats()['read']['retries'] == 2
+
+
+@pytest.mark.parametrize('status_code', [400, 403, 404])
+def test_read_is_not_tried_again_after_a_client_error(client, status_code):
+    call = FlakyCall(api_error(status_code))
+
+    with pytest.raises(gspread.exceptions.APIError):
+        client.read(call)
+    assert call.calls == 1
+
+
+def test_read_stops_after_the_max_retries(client):
+    call = FlakyCall(*[api_error(503) for _ in range(4)])
+
+    with pytest.raises(gspread.exceptions.APIError):
+        client.read(call)
+    assert call.calls == 4
+    assert client.get_stats()['read']['failures'] == 1
+
+
+def test_backoff_doubles_and_follows_retry_after(client, monkeypatch):
+    delays = []
+    monkeypatch.setattr(GoogleSheetClient, '_GoogleSheetClient__sleep',
+                        lambda self, seconds, is_cancelled=None: delays.append(seconds) or True)
+
+    busy = api_error(429)
+    busy.response.headers['Retry-After'] = '30'
+    client.read(FlakyCall(api_error(503), api_error(503), busy))
+
+    # 1 and 2 seconds plus less than one second of jitter, and then the 30 seconds that Google asked for.
+    assert [int(delay) for delay in delays[:2]] == [1, 2]
+    assert delays[2] == 30
+
+
+def test_token_bucket_waits_once_the_requests_of_one_minute_are_used(fake_time):
+    bucket = TokenBucket(60)
+
+    assert [bucket.acquire() for _ in range(60)] == [0.0] * 60
+    assert bucket.acquire() == pytest.approx(1.0)
+
+    # A token is earned every second.
+    fake_time.sleep(5)
+    assert [bucket.acquire() for _ in range(5)] == [0.0] * 5
+    assert bucket.acquire() == pytest.approx(1.0)
+
+
+def test_client_keeps_to_the_write_requests_per_minute(fake_time):
+    client = GoogleSheetClient({'write requests per minute': 2})
+    call = FlakyCall()
+
+    for _ in range(3):
+        client.write(call)
+
+    # The third write waits 30 seconds for the bucket, and the reads use their own bucket.
+    assert fake_time.sleeps == [pytest.approx(30.0)]
+    assert client.get_stats()['write']['throttle ms'] == pytest.approx(30000.0)
+    client.read(call)
+    assert len(fake_time.sleeps) == 1
@@ -0,0 +1,227 @@
+import copy
+import json
+import os
+
+import gspread
+import pytest
+
+from DatabaseManager import DatabaseManager
+from GoogleSheetManager import GoogleSheetManager
+
+WORKSHEETS = {'worksheet name': 'Hours', 'raw data worksheet name': 'Raw Data', 'daily worksheet name': 'Daily'}
+
+
+class FakeSpreadsheet:
+    """This class is a spreadsheet that applies the batch_update() requests the upload sends to its own cells."""
+
+    def __init__(self, spreadsheet_id: str = 'book'):
+        self.id = spreadsheet_id
+        self.sheets = {0: {'sheetId': 0, 'title': 'Sheet1', 'gridProperties': {'rowCount': 1000, 'columnCount': 26}}}
+        self.cells = {0: {}}
+        self.batches = []
+        self.fail_on = set()
+
+    def fetch_sheet_metadata(self, params=None) -> dict:
+        return {'sheets': [{'properties': copy.deepcopy(properties)} for properties in self.sheets.values()]}
+
+    def batch_update(self, body: dict) -> dict:
+        self.batches.append(copy.deepcopy(body['requests']))
+        if len(self.batches) in self.fail_on:
+            raise RuntimeError('The service is currently unavailable.')
+
+        for request in body['requests']:
+            (kind, value), = request.items()
+            if kind == 'addSheet':
+                properties = copy.deepcopy(value['properties'])
+                assert properties['sheetId'] not in self.sheets
+                self.sheets[properties['sheetId']] = properties
+                self.cells[properties['sheetId']] = {}
+            elif kind == 'updateSheetProperties' and 'rowCount' in value['fields']:
+                grid = self.sheets[value['properties']['sheetId']]['gridProperties']
+                grid.update(value['properties']['gridProperties'])
+            elif kind == 'updateCells' and 'range' in value and value['fields'] == 'userEnteredValue':
+                self.cells[value['range']['sheetId']] = {}
+            elif kind == 'updateCells' and 'start' in value:
+                for (row_index, col_index), cell in self.written_cells(request).items():
+                    grid = self.sheets[value['start']['sheetId']]['gridProperties']
+                    assert row_index < grid['rowCount'] and col_index < grid['columnCount'], 'outside the grid'
+                    self.cells[value['start']['sheetId']][(row_index, col_index)] = cell
+            elif kind == 'appendDimension':
+                self.sheets[value['sheetId']]['gridProperties']['rowCount'] += value['length']
+
+        return {}
+
+    @staticmethod
+    def written_cells(request: dict) -> dict:
+        # { (row index, column index): value } for an updateCells request that enters values from a start cell
+        start = request['updateCells']['start']
+        return {(start['rowIndex'] + i, start['columnIndex'] + j): cell.get('userEnteredValue')
+                for i, row in enumerate(request['updateCells']['rows'])
+                for j, cell in enumerate(row['values'])}
+
+    def sheet_id(self, title: str) -> int:
+        return [sheet_id for sheet_id, properties in self.sheets.items() if properties['title'] == title][0]
+
+    def grid(self, title: str) -> list:
+        sheet_id = self.sheet_id(title)
+        grid = self.sheets[sheet_id]['gridProperties']
+        return [[self.cells[sheet_id].get((row_index, col_index)) for col_index in range(grid['columnCount'])]
+                for row_index in range(grid['rowCount'])]
+
+
+class FakeGspreadClient:
+    """This class is the gspread client, which opens the one fake spreadsheet."""
+
+    def __init__(self):
+        self.spreadsheet = FakeSpreadsheet()
+        self.opened = 0
+
+    def open_by_url(self, url: str) -> FakeSpreadsheet:
+        self.opened += 1
+        return self.spreadsheet
+
+
+def write_config(tmp_path, **google_config) -> None:
+    google_config = {'service account': 'service_account.json', 'spreadsheet url': 'https://example.com/book',
+                     **WORKSHEETS, **google_config}
+    (tmp_path / 'config.json').write_text(json.dumps({'google config': google_config}))
+
+
+@pytest.fixture
+def gspread_client(tmp_path, monkeypatch) -> FakeGspreadClient:
+    gspread_client = FakeGspreadClient()
+    gspread_client.created = 0
+
+    def service_account(filename):
+        gspread_client.created += 1
+        return gspread_client
+
+    (tmp_path / 'service_account.json').write_text('{}')
+    write_config(tmp_path)
+    monkeypatch.setattr('GoogleSheetManager.THIS_DIRECTORY', str(tmp_path))
+    monkeypatch.setattr(gspread, 'service_account', service_account)
+
+    return gspread_client
+
+
+@pytest.fixture
+def db_manager(tmp_path):
+    db_manager = DatabaseManager(str(tmp_path / 'test.db'))
+    db_manager.create_database()
+    for record in (('0001', 'Ann', 'Lee'), ('0002', 'Bo', 'Ray')):
+        db_manager.new_record('student', record)
+    for record in (('0001', '2021-01-04 09:00:00', '2021-01-04 12:00:00'),
+                   ('0002', '2021-01-05 09:00:00', '2021-01-05 10:00:00')):
+        db_manager.new_record('activity', record)
+
+    yield db_manager
+    db_manager.close()
+
+
+def full_upload_grids(db_manager, gspread_client) -> dict:
+    # The worksheets that a full upload to a new spreadsheet makes, to compare with the worksheets that were updated.
+    spreadsheet = gspread_client.spreadsheet
+    gspread_client.spreadsheet = FakeSpreadsheet('new book')
+    try:
+        assert GoogleSheetManager(db_manager).upload_data(full=True)[0]
+        return {title: gspread_client.spreadsheet.grid(title) for title in WORKSHEETS.values()}
+    finally:
+        gspread_client.spreadsheet = spreadsheet
+
+
+def test_delta_upload_only_enters_the_cells_that_changed(db_manager, gspread_client):
+    google_sheet_manager = GoogleSheetManager(db_manager)
+    spreadsheet = gspread_client.spreadsheet
+
+    assert google_sheet_manager.upload_data()[0]
+    before = {title: spreadsheet.grid(title) for title in WORKSHEETS.values()}
+
+    # A session that starts after the others changes the hours of 0001 and adds one row to the end of the raw data.
+    db_manager.new_record('activity', ('0001', '2021-01-05 13:00:00', '2021-01-05 14:30:00'))
+    success, title, message = google_sheet_manager.upload_data()
+
+    assert success, message
+    assert len(spreadsheet.batches) == 2
+    requests = spreadsheet.batches[1]
+    assert all('range' not in request.get('updateCells', {}) for request in requests)
+
+    written = {}
+    for request in requests:
+        if 'start' in request.get('updateCells', {}):
+            sheet_id = request['updateCells']['start']['sheetId']
+            written.update({(sheet_id, cell): value for cell, value in spreadsheet.written_cells(request).items()})
+
+    # Every cell that was entered has a new value.
+    for (sheet_id, (row_index, col_index)), value in written.items():
+        title = spreadsheet.sheets[sheet_id]['title']
+        if row_index < len(before[title]):
+            assert before[title][row_index][col_index] != value, (title, row_index, col_index)
+
+    assert {spreadsheet.sheets[sheet_id]['title'] for sheet_id, cell in written} == set(WORKSHEETS.values())
+    assert f' {len(written)} cells were updated.' in message
+
+    assert {title: spreadsheet.grid(title) for title in WORKSHEETS.values()} == \
+        full_upload_grids(db_manager, gspread_client)
+
+
+def test_upload_continues_the_raw_data_after_a_partial_write(db_manager, gspread_client, tmp_path):
+    for record in (('0001', '2021-01-11 09:00:00', '2021-01-11 12:00:00'),
+                   ('0002', '2021-01-12 09:00:00', '2021-01-12 10:00:00'),
+                   ('0001', '2021-01-18 09:00:00', '2021-01-18 12:00:00')):
+        db_manager.new_record('activity', record)
+
+    # The header and 5 rows of raw data are written 2 rows at a time, and the second write fails.
+    write_config(tmp_path, **{'rows per write': 2})
+    google_sheet_manager = GoogleSheetManager(db_manager)
+    spreadsheet = gspread_client.spreadsheet
+    spreadsheet.fail_on = {2}
+
+    assert not google_sheet_manager.upload_data()[0]
+    assert spreadsheet.grid('Raw Data')[0][0] == {'stringValue': 'Last Name'}
+    assert len(spreadsheet.grid('Raw Data')) == 2
+
+    success, title, message = google_sheet_manager.upload_data(full=True)
+    assert success, message
+
+    # Even a full upload continues from the rows that were written, and every row is entered once.
+    raw_data_sheet_id = spreadsheet.sheet_id('Raw Data')
+    row_indexes = [request['updateCells']['start']['rowIndex'] + i for requests in spreadsheet.batches[2:]
+                   for request in requests
+                   if request.get('updateCells', {}).get('start', {}).get('sheetId') == raw_data_sheet_id
+                   for i in range(len(request['updateCells']['rows']))]
+    assert row_indexes == [2, 3, 4, 5]
+
+    assert {title: spreadsheet.grid(title) for title in WORKSHEETS.values()} == \
+        full_upload_grids(db_manager, gspread_client)
+
+
+def test_spreadsheet_is_reused_until_an_upload_fails_or_the_config_changes(db_manager, gspread_client, tmp_path):
+    google_sheet_manager = GoogleSheetManager(db_manager)
+    spreadsheet = gspread_client.spreadsheet
+
+    def upload() -> tuple:
+        success, title, message = google_sheet_manager.upload_data()
+        return success, gspread_client.created, gspread_client.opened
+
+    assert upload() == (True, 1, 1)
+
+    # The next upload only reads the worksheet properties and writes the changes.
+    db_manager.new_record('activity', ('0001', '2021-01-05 13:00:00', '2021-01-05 14:30:00'))
+    success, title, message = google_sheet_manager.upload_data()
+    assert message.endswith('The upload used 2 Google Sheets API calls.')
+    assert (gspread_client.created, gspread_client.opened) == (1, 1)
+
+    # A failed write sets up the client and opens the spreadsheet again for the next upload.
+    spreadsheet.fail_on = {len(spreadsheet.batches) + 1}
+    db_manager.new_record('activity', ('0002', '2021-01-06 13:00:00', '2021-01-06 14:30:00'))
+    assert upload() == (False, 1, 1)
+    assert upload() == (True, 2, 2)
+
+    # A new spreadsheet url opens the spreadsheet again, and new credentials set up the client again.
+    write_config(tmp_path, **{'spreadsheet url': 'https://example.com/another/book'})
+    assert upload() == (True, 2, 3)
+
+    credential_file = tmp_path / 'service_account.json'
+    os.utime(credential_file, ns=(0, credential_file.stat().st_mtime_ns + 1000000000))
+    assert upload() == (True, 3, 4)
+    assert upload() == (True, 3, 4)
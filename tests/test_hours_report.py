@@ -0,0 +1,302 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from DatabaseManager import DatabaseManager
+from HoursReport import HoursReport
+
+# The students and their sessions, in the order of the student table. Two seasons cross a year boundary:
+#   2020-2021 (Jan 1 2021 is a Friday) and 2021-2022 (Jan 1 2022 is a Saturday), so the week that starts on the
+#   Sunday before Jan 1 is split across two years.
+STUDENTS = (('0001', 'Ann', 'Lee'),
+            ('0002', 'Bo', 'Ray'),
+            ('0003', 'Cy', 'Abe'),      # no hours at all
+            ('0004', 'Di', 'Zed'))
+
+ACTIVITY = (('0001', '2020-12-27 18:00:00', '2020-12-27 20:20:00'),
+            ('0001', '2020-12-31 18:00:00', '2020-12-31 19:05:00'),
+            ('0001', '2021-01-02 09:00:00', '2021-01-02 12:40:00'),
+            ('0001', '2021-01-02 13:00:00', '2021-01-02 13:10:00'),
+            ('0001', '2021-01-19 18:00:00', '2021-01-19 21:00:00'),
+            ('0002', '2020-12-30 17:30:00', '2020-12-30 19:45:00'),
+            ('0002', '2021-01-03 10:00:00', '2021-01-03 10:01:00'),
+            ('0002', '2021-12-31 18:00:00', '2021-12-31 23:59:00'),
+            ('0002', '2022-01-01 08:00:00', '2022-01-01 17:20:00'),
+            ('0002', '2022-01-08 08:00:00', '2022-01-08 09:00:00'),
+            ('0004', '2021-01-09 18:00:00', '2021-01-09 19:33:00'),
+            ('0004', '2021-12-26 18:00:00', '2021-12-26 18:40:00'))
+
+
+@pytest.fixture
+def filename(tmp_path) -> str:
+    filename = str(tmp_path / 'test.db')
+
+    db_manager = DatabaseManager(filename)
+    db_manager.create_database()
+    for record in STUDENTS:
+        db_manager.new_record('student', record)
+    for record in ACTIVITY:
+        db_manager.new_record('activity', record)
+    db_manager.close()
+
+    return filename
+
+
+@pytest.fixture
+def report(filename) -> HoursReport:
+    db_manager = DatabaseManager(filename)
+    success, message, students, daily_hours = db_manager.get_hours_report_data()
+    db_manager.close()
+
+    assert success, message
+    return HoursReport(students, daily_hours)
+
+
+def baseline_query(filename: str, sql: str) -> list:
+    db_conn = sqlite3.connect(filename)
+    try:
+        return db_conn.execute(sql).fetchall()
+    finally:
+        db_conn.close()
+
+
+def round_hours(row: list) -> list:
+    # The baseline adds up the hours as floats, and the HoursReport adds them up as centihours.
+    return [round(cell, 2) if isinstance(cell, float) else cell for cell in row]
+
+
+BASELINE_STUDENTS_SQL = '''SELECT lastname, firstname, id FROM student
+                           ORDER BY lastname ASC, firstname ASC, id ASC'''
+
+BASELINE_WEEKLY_SQL = '''SELECT student.lastname, student.firstname, student.id,
+                         STRFTIME('%Y', activity.checkin, '-6 days', 'weekday 0') year,
+                         CASE
+                             WHEN STRFTIME('%j', activity.checkin, '-6 days', 'weekday 0') % 7 == 0
+                                 THEN STRFTIME('%W', activity.checkin, '-6 days', 'weekday 0')
+                             ELSE STRFTIME('%W', activity.checkin, '-6 days', 'weekday 0') + 1
+                             END week,
+                         SUM(ROUND( (JULIANDAY(activity.checkout) - JULIANDAY(activity.checkin)) * 24.0, 2)) hours
+                         FROM student JOIN activity
+                         ON student.id = activity.id
+                         WHERE activity.checkout IS NOT NULL
+                         GROUP BY student.id, year, week
+                         ORDER BY student.lastname ASC, student.firstname ASC, year ASC, week ASC'''
+
+BASELINE_SESSIONS_SQL = '''SELECT student.lastname, student.firstname, student.id, DATE(activity.checkin),
+                           ROUND( (JULIANDAY(activity.checkout) - JULIANDAY(activity.checkin)) * 24.0, 2)
+                           FROM student JOIN activity
+                           ON student.id = activity.id
+                           WHERE activity.checkout IS NOT NULL
+                           ORDER BY student.lastname ASC, student.firstname ASC, activity.checkin ASC'''
+
+
+def calendar_weekly_hours(sessions: list) -> list:
+    """
+    This function adds up the hours by the week number within the calendar year of each session ('%U'), which
+    is week 0 for the days of the new year before its first Sunday. The baseline adds week 0 to the last week of
+    the year before.
+
+    :param sessions: [ (lastname, firstname, barcode, 'yyyy-mm-dd', hours), ... ]
+    :return: [ (lastname, firstname, barcode, year, week number, week hours), ... ]
+    """
+
+    weeks = dict()
+    for lastname, firstname, barcode, checkin_date, hours in sessions:
+        the_date = datetime.fromisoformat(checkin_date)
+        key = (lastname, firstname, barcode, the_date.strftime('%Y'), int(the_date.strftime('%U')))
+        weeks[key] = weeks.get(key, 0.0) + hours
+
+    return [key + (hours, ) for key, hours in weeks.items()]
+
+
+def baseline_weekly(students: list, student_hours_list: list) -> tuple:
+    """
+    This function creates the weekly header and rows the way the GoogleSheetManager did before the HoursReport,
+    by walking the (year, week number) of each week from the database along the header.
+
+    :return: (1) the Sunday of each week: ['mm/dd/yyyy', ... ]
+        (2) [ [lastname, firstname, barcode, total hours, week1 hours, '', week3 hours, ... ], ... ]
+    """
+
+    header_list = [['', '', '', ''], ['', '', '', ''], ['Last Name', 'First Name', 'Barcode', 'Hours']]
+
+    if student_hours_list:
+        first = min(student_hours_list, key=lambda x: int(x[3]) + int(x[4]) / 54)
+        last = max(student_hours_list, key=lambda x: int(x[3]) + int(x[4]) / 54)
+
+        start_year = int(first[3])
+        start_week = int(first[4])
+        end_year = int(last[3])
+        end_week = int(last[4])
+
+        start_sunday = (7 - int(datetime(start_year, 1, 1).strftime('%w'))) % 7
+        end_sunday = (7 - int(datetime(end_year, 1, 1).strftime('%w'))) % 7
+
+        start_date = datetime(start_year, 1, 1 + start_sunday) + timedelta(days=(start_week - 1) * 7)
+        end_date = datetime(end_year, 1, 1 + end_sunday) + timedelta(days=(end_week - 1) * 7)
+
+        while start_date.date() <= end_date.date():
+            header_list[0] += [start_date.strftime('%Y')]
+            header_list[1] += [start_date.strftime('%U')]
+            header_list[2] += [start_date.strftime('%m/%d/%Y')]
+            start_date += timedelta(days=7)
+
+    data_list = [list(record + (0.0,)) for record in students]
+
+    data_list_index = 0
+    header_list_index = 4
+
+    for record in student_hours_list:
+        while data_list_index < len(data_list) and record[2] != data_list[data_list_index][2]:
+            data_list_index += 1
+            header_list_index = 4
+
+        year = int(record[3])
+        week_num = int(record[4])
+        week_hours = record[5]
+        data_list[data_list_index][3] += week_hours
+
+        if week_num == 0:
+            year -= 1
+            week_num = int(datetime(year, 12, 31).strftime('%W'))
+
+            same_year = (str(year) == str(header_list[0][header_list_index-1]))
+            same_week = (str(week_num) == str(header_list[1][header_list_index-1]))
+
+            if same_year and same_week:
+                week_hours += data_list[data_list_index].pop()
+                header_list_index -= 1
+
+        while not (year == int(header_list[0][header_list_index]) and
+                   week_num == int(header_list[1][header_list_index])):
+            data_list[data_list_index] += ['']
+            header_list_index += 1
+        header_list_index += 1
+
+        data_list[data_list_index].append(week_hours)
+
+    return header_list[2][4:], data_list
+
+
+def test_week_rows_match_the_baseline(filename, report):
+    students = baseline_query(filename, BASELINE_STUDENTS_SQL)
+    student_hours_list = baseline_query(filename, BASELINE_WEEKLY_SQL)
+    baseline_header, baseline_rows = baseline_weekly(students, student_hours_list)
+
+    dates, rows = report.get_rows('week', total=True)
+
+    assert [the_date.strftime('%m/%d/%Y') for the_date in dates] == baseline_header
+    assert [round_hours(row) for row in rows] == [round_hours(row) for row in baseline_rows]
+
+    # The week of Sunday 12/27/2020 is split across two years, but it is one column.
+    assert dates[0].strftime('%m/%d/%Y') == '12/27/2020'
+    assert rows[1][4] == pytest.approx(2.33 + 1.08 + 3.67 + 0.17)
+
+
+def test_week_rows_match_the_baseline_with_week_0(filename, report):
+    students = baseline_query(filename, BASELINE_STUDENTS_SQL)
+    student_hours_list = calendar_weekly_hours(baseline_query(filename, BASELINE_SESSIONS_SQL))
+    assert [record[2:5] for record in student_hours_list if record[4] == 0] == [('0001', '2021', 0),
+                                                                                ('0002', '2022', 0)]
+
+    baseline_header, baseline_rows = baseline_weekly(students, student_hours_list)
+
+    dates, rows = report.get_rows('week', total=True)
+
+    assert [the_date.strftime('%m/%d/%Y') for the_date in dates] == baseline_header
+    assert [round_hours(row) for row in rows] == [round_hours(row) for row in baseline_rows]
+
+
+def test_week_rows_leave_blanks_for_weeks_without_hours(report):
+    dates, rows = report.get_rows('week', total=True)
+
+    # Students are in the order of lastname, firstname, barcode: Abe, Lee, Ray, Zed.
+    abe, lee, ray, zed = rows
+
+    assert abe == ['Abe', 'Cy', '0003', 0.0]
+    assert lee[5:7] == ['', '']
+    assert zed[4:6] == ['', 1.55]
+    assert len(ray) == 4 + len(dates)
+
+
+BASELINE_DAILY_SQL = '''SELECT student.lastname, student.firstname, student.id,
+                        DATE(activity.checkin) checkin_date,
+                        SUM(ROUND( (JULIANDAY(activity.checkout) - JULIANDAY(activity.checkin)) * 24.0, 2)) hours
+                        FROM student JOIN activity
+                        ON student.id = activity.id
+                        WHERE activity.checkout IS NOT NULL
+                        GROUP BY student.id, checkin_date
+                        ORDER BY student.lastname ASC, student.firstname ASC, checkin_date ASC'''
+
+
+def baseline_daily(students: list, daily_hours_list: list) -> tuple:
+    """
+    This function creates the daily header and rows the way the GoogleSheetManager did before the HoursReport,
+    by parsing the date of each header cell until it finds the date of each day from the database.
+
+    :return: (1) the date of each day: ['mm/dd/yyyy', ... ]
+        (2) [ [lastname, firstname, day1 hours, '', day3 hours, ... ], ... ]
+    """
+
+    daily_header_list = ['Last Name', 'First Name']
+
+    if daily_hours_list:
+        start_date = datetime.fromisoformat(min(daily_hours_list, key=lambda x: x[3])[3])
+        end_date = datetime.fromisoformat(max(daily_hours_list, key=lambda x: x[3])[3])
+
+        while start_date.date() <= end_date.date():
+            daily_header_list += [start_date.strftime('%m/%d/%Y')]
+            start_date += timedelta(days=1)
+
+    daily_data_list = [list(record) for record in students]
+
+    data_list_index = 0
+    header_list_index = 2
+
+    for record in daily_hours_list:
+        while data_list_index < len(daily_data_list) and record[2] != daily_data_list[data_list_index][2]:
+            data_list_index += 1
+            header_list_index = 2
+
+        the_date = datetime.fromisoformat(record[3])
+
+        while the_date != datetime.strptime(daily_header_list[header_list_index], '%m/%d/%Y'):
+            daily_data_list[data_list_index] += ['']
+            header_list_index += 1
+        header_list_index += 1
+
+        daily_data_list[data_list_index].append(record[4])
+
+    for record in daily_data_list:
+        record.pop(2)
+
+    return daily_header_list[2:], daily_data_list
+
+
+def test_day_rows_match_the_baseline(filename, report):
+    students = baseline_query(filename, BASELINE_STUDENTS_SQL)
+    daily_hours_list = baseline_query(filename, BASELINE_DAILY_SQL)
+    baseline_header, baseline_rows = baseline_daily(students, daily_hours_list)
+
+    dates, rows = report.get_rows('day')
+
+    # The daily worksheet does not have the barcode column.
+    assert [the_date.strftime('%m/%d/%Y') for the_date in dates] == baseline_header
+    assert [round_hours(row[:2] + row[3:]) for row in rows] == [round_hours(row) for row in baseline_rows]
+
+    # The season runs from 12/27/2020 to 01/08/2022, with a column for every day in between.
+    assert (dates[0].strftime('%m/%d/%Y'), dates[-1].strftime('%m/%d/%Y')) == ('12/27/2020', '01/08/2022')
+    assert len(dates) == (dates[-1] - dates[0]).days + 1
+
+
+def test_day_rows_add_up_the_sessions_of_each_day(report):
+    dates, rows = report.get_rows('day')
+    abe, lee, ray, zed = rows
+
+    # Lee logged two sessions on 01/02/2021, and Ray logged sessions on both sides of 01/01/2022.
+    assert abe == ['Abe', 'Cy', '0003']
+    assert lee[3 + dates.index(datetime(2021, 1, 2).date())] == pytest.approx(3.67 + 0.17)
+    assert ray[3 + dates.index(datetime(2021, 12, 31).date())] == pytest.approx(5.98)
+    assert ray[3 + dates.index(datetime(2022, 1, 1).date())] == pytest.approx(9.33)
+    assert ray[3 + dates.index(datetime(2021, 12, 30).date())] == ''
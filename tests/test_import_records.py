@@ -0,0 +1,117 @@
+import sqlite3
+
+import pytest
+
+from DatabaseManager import DatabaseManager
+
+
+@pytest.fixture
+def filename(tmp_path) -> str:
+    filename = str(tmp_path / 'test.db')
+
+    db_manager = DatabaseManager(filename)
+    db_manager.create_database()
+    for record in (('0001', 'Ann', 'Lee'), ('0002', 'Bo', 'Ray')):
+        db_manager.new_record('student', record)
+    db_manager.new_record('activity', ('0001', '2021-01-02 09:00:00', '2021-01-02 12:00:00'))
+    db_manager.close()
+
+    return filename
+
+
+def query(filename: str, sql: str) -> list:
+    db_conn = sqlite3.connect(filename)
+    try:
+        return db_conn.execute(sql).fetchall()
+    finally:
+        db_conn.close()
+
+
+def import_records(filename: str, table: str, records: list, **kwargs) -> tuple:
+    db_manager = DatabaseManager(filename)
+    try:
+        return db_manager.import_records(table, records, **kwargs)
+    finally:
+        db_manager.close()
+
+
+def test_import_skips_only_the_records_that_fail(filename):
+    records = [('0003', 'Cy', 'Abe'),
+               ('0001', 'Ann', 'Again'),        # the barcode is already in the student table
+               ('0004', 'Di'),                  # not enough fields
+               (),                              # a blank row is skipped without an error
+               ('0005', 'Ed', 'Fox')]
+    progress = []
+
+    success, message, count, errors, seconds = import_records(filename, 'student', records, chunk_size=2,
+                                                              progress_callback=progress.append)
+
+    assert (success, count) == (True, 2)
+    assert [(row_number, error.split(':')[0]) for row_number, record, error in errors] == \
+        [(2, 'UNIQUE constraint failed'), (3, 'A student record must be')]
+    assert query(filename, 'SELECT id FROM student ORDER BY id') == [('0001', ), ('0002', ), ('0003', ), ('0005', )]
+    assert progress[-1] == len(records)
+
+
+def test_import_rolls_back_every_chunk_when_it_stops(filename, monkeypatch):
+    import_chunk = DatabaseManager._DatabaseManager__import_chunk
+    chunks = []
+
+    def fail_second_chunk(self, cursor, sql, chunk, errors):
+        chunks.append(chunk)
+        if len(chunks) == 2:
+            return False, 'disk I/O error', 0
+        return import_chunk(self, cursor, sql, chunk, errors)
+
+    monkeypatch.setattr(DatabaseManager, '_DatabaseManager__import_chunk', fail_second_chunk)
+
+    records = [('0003', 'Cy', 'Abe'), ('0004', 'Di', 'Zed'), ('0005', 'Ed', 'Fox')]
+    success, message, count, errors, seconds = import_records(filename, 'student', records, chunk_size=2)
+
+    assert (success, message, count) == (False, 'FAIL: disk I/O error', 0)
+    assert query(filename, 'SELECT id FROM student ORDER BY id') == [('0001', ), ('0002', )]
+
+
+# The insert triggers are dropped during a historical import, so they must be there again afterwards.
+TRIGGERS_SQL = '''SELECT name FROM sqlite_master WHERE type="trigger"
+                  AND name IN ("insert_activity", "insert_activity_totals", "insert_activity_rollups") ORDER BY name'''
+TRIGGERS = [('insert_activity', ), ('insert_activity_rollups', ), ('insert_activity_totals', )]
+
+HISTORY = [('0002', '2021-01-05 09:00:00', '2021-01-05 10:00:00'),
+           ('0001', '2021-01-02 11:00:00', '2021-01-02 13:00:00'),     # overlaps the existing session
+           ('0009', '2021-01-05 09:00:00', '2021-01-05 10:00:00'),     # not in the student table
+           ('0002', '2021-01-05 09:30:00', '2021-01-05 11:00:00'),     # overlaps the first record
+           ('0001', '2021-01-03 09:00:00', '2021-01-03 09:45:00'),
+           ('0002', '2021-01-06 09:00:00', '')]                        # still checked in
+
+
+def test_historical_import_rejects_overlaps_and_unknown_barcodes(filename):
+    success, message, count, errors, seconds = import_records(filename, 'activity', HISTORY, historical=True)
+
+    assert (success, count) == (True, 3)
+    assert [(row_number, error) for row_number, record, error in errors] == \
+        [(2, 'The session overlaps an existing session.'),
+         (3, 'The barcode is not in the Student Table.'),
+         (4, 'The session overlaps another imported session.')]
+
+    assert query(filename, 'SELECT id, checkin, checkout FROM activity WHERE checkin > "2021-01-02 09:00:00" '
+                           'ORDER BY checkin') == [('0001', '2021-01-03 09:00:00', '2021-01-03 09:45:00'),
+                                                   ('0002', '2021-01-05 09:00:00', '2021-01-05 10:00:00'),
+                                                   ('0002', '2021-01-06 09:00:00', None)]
+    assert query(filename, 'SELECT id, total_seconds, sessions FROM student_totals ORDER BY id') == \
+        [('0001', 3 * 3600 + 45 * 60, 2), ('0002', 3600, 1)]
+    assert query(filename, TRIGGERS_SQL) == TRIGGERS
+
+
+def test_historical_import_rolls_back_when_it_fails(filename, monkeypatch):
+    def rebuild_totals(self, cursor, rollups=True):
+        return False, 'disk I/O error'
+
+    monkeypatch.setattr(DatabaseManager, '_DatabaseManager__rebuild_totals', rebuild_totals)
+
+    success, message, count, errors, seconds = import_records(filename, 'activity', HISTORY, historical=True)
+
+    # The records are not imported, and the triggers that were dropped are back.
+    assert (success, message, count) == (False, 'FAIL: disk I/O error', 0)
+    assert query(filename, 'SELECT COUNT(*) FROM activity') == [(1, )]
+    assert query(filename, TRIGGERS_SQL) == TRIGGERS
@@ -0,0 +1,121 @@
+import sqlite3
+
+from conftest import wait_until
+from DatabaseManager import DatabaseManager
+
+
+def test_stop_can_be_called_twice(qapp, tmp_path):
+    from UploadWorker import UploadWorker
+
+    db_manager = DatabaseManager(str(tmp_path / 'test.db'))
+    upload_worker = UploadWorker(db_manager)
+
+    upload_worker.stop()
+    upload_worker.stop()
+
+    assert not upload_worker.isRunning()
+    db_manager.close()
+
+
+def test_failed_outbox_read_is_tried_again(qapp, tmp_path, monkeypatch):
+    from UploadWorker import UploadWorker, RETRY_SECONDS
+
+    def get_upload_requests(self):
+        return False, 'database is locked', 0, 0, False, 0
+
+    monkeypatch.setattr(DatabaseManager, 'get_upload_requests', get_upload_requests)
+
+    db_manager = DatabaseManager(str(tmp_path / 'test.db'))
+    db_manager.create_database()
+    upload_worker = UploadWorker(db_manager)
+    retry_timer = upload_worker._UploadWorker__retry_timer
+
+    try:
+        assert upload_worker.start_upload('admin')
+        assert wait_until(qapp, lambda: upload_worker.isFinished() and retry_timer.isActive())
+        assert retry_timer.interval() == 1000 * RETRY_SECONDS
+    finally:
+        upload_worker.stop()
+        db_manager.close()
+
+
+def get_outbox(filename: str) -> list:
+    db_conn = sqlite3.connect(filename)
+    try:
+        sql = 'SELECT reason, full, attempts, last_error FROM upload_outbox ORDER BY request_id'
+        return db_conn.execute(sql).fetchall()
+    finally:
+        db_conn.close()
+
+
+def test_failed_upload_stays_in_the_outbox(qapp, tmp_path, monkeypatch):
+    from GoogleSheetManager import GoogleSheetManager
+    from UploadWorker import UploadWorker, RETRY_SECONDS
+
+    def upload_data(self, progress_callback=None, is_cancelled=None, full=False):
+        return False, 'Google Sheets Error', 'There was an error updating the Google Sheet.'
+
+    monkeypatch.setattr(GoogleSheetManager, 'upload_data', upload_data)
+
+    filename = str(tmp_path / 'test.db')
+    db_manager = DatabaseManager(filename)
+    db_manager.create_database()
+    upload_worker = UploadWorker(db_manager)
+    retry_timer = upload_worker._UploadWorker__retry_timer
+    finished = []
+    upload_worker.upload_finished.connect(lambda success, title, message: finished.append((success, message)))
+
+    try:
+        assert upload_worker.start_upload('admin')
+        assert wait_until(qapp, lambda: finished and retry_timer.isActive())
+        assert finished == [(False, 'There was an error updating the Google Sheet. '
+                                    'The upload will be tried again later.')]
+        assert get_outbox(filename) == [('admin', 0, 1, 'There was an error updating the Google Sheet.')]
+        assert retry_timer.interval() == 1000 * RETRY_SECONDS
+
+        # Each failure adds an attempt and waits twice as long before the next try.
+        assert upload_worker.flush()
+        assert wait_until(qapp, lambda: len(finished) == 2 and retry_timer.isActive())
+        assert get_outbox(filename)[0][2] == 2
+        assert retry_timer.interval() == 2000 * RETRY_SECONDS
+    finally:
+        upload_worker.stop()
+        db_manager.close()
+
+
+def test_successful_upload_clears_the_outbox(qapp, tmp_path, monkeypatch):
+    from GoogleSheetManager import GoogleSheetManager
+    from UploadWorker import UploadWorker
+
+    uploads = []
+
+    def upload_data(self, progress_callback=None, is_cancelled=None, full=False):
+        uploads.append(full)
+        return True, 'Upload Successful', 'The data was uploaded successfully to the Google Sheet.'
+
+    monkeypatch.setattr(GoogleSheetManager, 'upload_data', upload_data)
+
+    # Two uploads were still waiting when the program stopped, and one of them was a full upload.
+    filename = str(tmp_path / 'test.db')
+    db_manager = DatabaseManager(filename)
+    db_manager.create_database()
+    db_manager.add_upload_request('nightly')
+    db_manager.add_upload_request('admin', full=True)
+    upload_worker = UploadWorker(db_manager)
+    retry_timer = upload_worker._UploadWorker__retry_timer
+    finished = []
+    upload_worker.upload_finished.connect(lambda success, title, message: finished.append((success, message)))
+
+    try:
+        assert upload_worker.start_upload('admin')
+        assert wait_until(qapp, lambda: finished and upload_worker.isFinished())
+
+        # All of them are done by one full upload.
+        assert uploads == [True]
+        assert finished == [(True, 'The data was uploaded successfully to the Google Sheet. '
+                                   '3 uploads that were waiting were done at once.')]
+        assert get_outbox(filename) == []
+        assert not retry_timer.isActive()
+    finally:
+        upload_worker.stop()
+        db_manager.close()